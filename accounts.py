@@ -0,0 +1,157 @@
+import asyncio
+import time
+from collections import deque
+from telethon import errors
+import config
+
+class _Account:
+    __slots__ = ('client', 'name', 'primary', 'active', 'floods', 'cooldown_until',
+                 'removed', 'files')
+
+    def __init__(self, client, name, primary):
+        self.client = client
+        self.name = name
+        self.primary = primary
+        self.active = 0
+        self.floods = deque()
+        self.cooldown_until = 0
+        self.removed = False
+        self.files = 0
+
+class AccountPool:
+    """
+    User accounts that can all read the source. Each file is downloaded
+    by the least busy healthy account, and large files spread their byte
+    ranges over every healthy account. Accounts resolve the message
+    themselves, since file references are per account. An account that
+    keeps hitting FloodWait (ACCOUNT_MAX_FLOODS within ACCOUNT_FLOOD_WINDOW,
+    or one wait of ACCOUNT_MAX_FLOOD_SECONDS) is removed from the pool;
+    the main account is never removed because it also enumerates.
+    """
+    def __init__(self):
+        self.accounts = []
+
+    def bind(self, clients):
+        """`clients`: the main user client first, then the extra accounts"""
+        self.accounts = [
+            _Account(client, f"account {i}", i == 0) for i, client in enumerate(clients)
+        ]
+        if len(self.accounts) > 1:
+            config.logger.info(f"👥 Downloading with {len(self.accounts)} accounts")
+
+    def _find(self, client):
+        for account in self.accounts:
+            if account.client is client:
+                return account
+        return None
+
+    def _healthy(self):
+        now = time.time()
+        return [a for a in self.accounts if not a.removed and a.cooldown_until <= now]
+
+    def healthy(self, client):
+        account = self._find(client)
+        return account is None or (not account.removed and account.cooldown_until <= time.time())
+
+    async def _resolve(self, account, source_id, message):
+        """`message`'s media as seen by `account`, or None"""
+        if account.primary:
+            return message.document or message.photo
+        try:
+            copy, = await account.client.get_messages(source_id, ids=[message.id])
+            media = copy and (copy.document or copy.photo)
+            if media is None:
+                raise ValueError("media not visible to this account")
+            return media
+        except errors.FloodWaitError as e:
+            self.flood(account.client, e.seconds)
+        except Exception as e:
+            config.logger.warning(f"👥 {account.name} cannot read msg {message.id}: {e}")
+        return None
+
+    async def sources(self, default, source_id, message, spread):
+        """
+        (client, media) pairs to download `message` from, least busy first.
+        With `spread`, every healthy account is included so the stream
+        can stripe ranges across them; otherwise just the least busy one.
+        """
+        media = message.document or message.photo
+        if len(self.accounts) <= 1:
+            return [(default, media)]
+
+        candidates = sorted(self._healthy(), key=lambda a: (a.active, a.files))
+        if not spread:
+            candidates = candidates[:1]
+
+        resolved = await asyncio.gather(
+            *(self._resolve(account, source_id, message) for account in candidates)
+        )
+        pairs = [(a.client, m) for a, m in zip(candidates, resolved) if m is not None]
+        return pairs or [(default, media)]
+
+    def begin(self, sources):
+        for client, _ in sources:
+            account = self._find(client)
+            if account:
+                account.active += 1
+                account.files += 1
+
+    def end(self, sources):
+        for client, _ in sources:
+            account = self._find(client)
+            if account:
+                account.active -= 1
+
+    def flood(self, client, seconds):
+        """Record a FloodWait; removes accounts that keep hitting them"""
+        account = self._find(client)
+        if account is None:
+            return
+        now = time.time()
+        account.cooldown_until = max(account.cooldown_until, now + seconds)
+        account.floods.append(now)
+        while account.floods and now - account.floods[0] > config.ACCOUNT_FLOOD_WINDOW:
+            account.floods.popleft()
+
+        if account.primary or account.removed:
+            return
+        if (len(account.floods) >= config.ACCOUNT_MAX_FLOODS
+                or seconds >= config.ACCOUNT_MAX_FLOOD_SECONDS):
+            account.removed = True
+            config.logger.warning(
+                f"👥 Removed {account.name} from the download pool "
+                f"({len(account.floods)} FloodWaits, last {seconds}s)"
+            )
+
+    def limiter_flood(self, client, method, seconds):
+        """
+        A FloodWait the rate limiter would sleep through. Downloads are
+        raised instead while another account could take the lane over;
+        the stream records those itself. Anything else is recorded here.
+        """
+        if method == 'GetFileRequest' and any(
+            account.client is not client for account in self._healthy()
+        ):
+            return True
+        self.flood(client, seconds)
+        return False
+
+    def describe(self):
+        if len(self.accounts) <= 1:
+            return "👥 Accounts: **1**"
+        now = time.time()
+        lines = [f"👥 Accounts: **{len(self._healthy())}**/{len(self.accounts)} healthy"]
+        for account in self.accounts:
+            if account.removed:
+                state = "❌ removed"
+            elif account.cooldown_until > now:
+                state = f"⏳ {account.cooldown_until - now:.0f}s"
+            else:
+                state = f"⬇️ {account.active}"
+            lines.append(
+                f"• {account.name} {state} | {account.files} files | "
+                f"{len(account.floods)} recent floods"
+            )
+        return "\n".join(lines)
+
+account_pool = AccountPool()
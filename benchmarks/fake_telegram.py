@@ -0,0 +1,337 @@
+"""
+In-process stand-ins for the Telegram clients, for benchmarks and soak runs.
+Nothing here touches the network; latency and jitter are simulated with
+asyncio.sleep so the event loop behaves as it would against Telegram.
+"""
+import asyncio
+import hashlib
+import itertools
+import random
+from telethon import errors
+from telethon.tl.types import (
+    Document, DocumentAttributeFilename, InputDocument,
+    MessageActionChatEditTitle, MessageMediaDocument
+)
+
+BLOCK_SIZE = 1024 * 1024  # Every valid request size divides this
+
+class FakeDocument:
+    """Minimal stand-in for a Document as passed to iter_download"""
+    def __init__(self, id, size):
+        self.id = id
+        self.size = size
+
+def payload(file_id, offset, size):
+    """Deterministic bytes of file `file_id` at `offset`"""
+    block = _blocks.get(file_id % 16)
+    if block is None:
+        block = _blocks[file_id % 16] = random.Random(file_id % 16).randbytes(BLOCK_SIZE)
+    start = offset % BLOCK_SIZE
+    # Requests are aligned, so a chunk never wraps past the block end
+    return block[start:start + size]
+
+def content_digest(file_id, size):
+    """sha256 of the whole file `file_id` as served by FakeDownloadClient"""
+    digest = hashlib.sha256()
+    for offset in range(0, size, BLOCK_SIZE):
+        digest.update(payload(file_id, offset, min(BLOCK_SIZE, size - offset)))
+    return digest.hexdigest()
+
+_blocks = {}
+_sent_ids = itertools.count(10 ** 9)  # Unique across bots, like real documents
+
+class FakeDownloadClient:
+    """
+    Serves iter_download like Telethon: `request_size` chunks starting at
+    `offset`, advancing by `stride`, each after `latency` + up to
+    `jitter` seconds.
+    """
+    def __init__(self, latency=0.005, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    async def _delay(self):
+        delay = self.latency + self.random.random() * self.jitter
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def iter_download(self, file, offset=0, stride=None, limit=None,
+                      chunk_size=None, request_size=None, file_size=None, **kwargs):
+        size = request_size or chunk_size
+        stride = stride or size
+        end = file_size or file.size
+
+        async def chunks():
+            position, count = offset, 0
+            while position < end and (limit is None or count < limit):
+                await self._delay()
+                self.requests += 1
+                yield payload(file.id, position, min(size, end - position))
+                position += stride
+                count += 1
+
+        return chunks()
+
+async def fake_upload(stream, part_size, workers=4, latency=0.005, jitter=0.0, seed=0, sink=None):
+    """
+    Consume `stream` the way ParallelUploader does: sequential read()s of
+    `part_size`, each part then "sent" with up to `workers` in flight.
+    Returns the number of bytes uploaded; parts go to `sink(index, part)`.
+    """
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(workers)
+    pending = set()
+    total = 0
+    index = 0
+
+    async def send(index, part):
+        try:
+            await asyncio.sleep(latency + rng.random() * jitter)
+            if sink:
+                sink(index, part)
+        finally:
+            slots.release()
+
+    while True:
+        await slots.acquire()
+        part = await stream.read(part_size)
+        if not part:
+            slots.release()
+            break
+        total += len(part)
+        task = asyncio.create_task(send(index, part))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        index += 1
+
+    if pending:
+        await asyncio.gather(*pending)
+    return total
+
+class FaultPlan:
+    """
+    Which faults to inject and how often. Failures that our code retries
+    (FloodWait, dropped connections on uploads and posts) are injected at
+    most MAX_RETRIES - 1 times in a row per request, so a correct pipeline
+    always recovers. Download drops and FloodWaits on reads are absorbed by
+    Telethon itself, so they show up as stalls rather than exceptions.
+    """
+    def __init__(self, flood=0.0, drop=0.0, slow=0.0, flood_seconds=1,
+                 stall=0.2, slow_delay=0.5, max_in_a_row=2, seed=0):
+        self.flood = flood
+        self.drop = drop
+        self.slow = slow
+        self.flood_seconds = flood_seconds
+        self.stall = stall
+        self.slow_delay = slow_delay
+        self.max_in_a_row = max_in_a_row
+        self.random = random.Random(seed)
+        self.streaks = {}
+        self.injected = {}
+
+    def _count(self, kind):
+        self.injected[kind] = self.injected.get(kind, 0) + 1
+
+    def raise_maybe(self, key, where):
+        """Raise FloodWait or ConnectionError for request `key`, or not"""
+        roll = self.random.random()
+        if roll >= self.flood + self.drop or self.streaks.get(key, 0) >= self.max_in_a_row:
+            self.streaks.pop(key, None)
+            return
+        self.streaks[key] = self.streaks.get(key, 0) + 1
+        if roll < self.flood:
+            self._count(f"{where}_floodwait")
+            raise errors.FloodWaitError(None, capture=self.flood_seconds)
+        self._count(f"{where}_drop")
+        raise ConnectionError(f"Injected connection drop ({where})")
+
+    async def stall_maybe(self, where):
+        """Sleep like Telethon does while reconnecting or waiting out a flood"""
+        roll = self.random.random()
+        if roll < self.flood:
+            self._count(f"{where}_floodwait")
+            await asyncio.sleep(self.flood_seconds)
+        elif roll < self.flood + self.drop:
+            self._count(f"{where}_drop")
+            await asyncio.sleep(self.stall)
+        elif roll < self.flood + self.drop + self.slow:
+            self._count(f"{where}_slow")
+            await asyncio.sleep(self.slow_delay)
+
+class FakeFile:
+    def __init__(self, size, name, mime_type):
+        self.size = size
+        self.name = name
+        self.mime_type = mime_type
+
+class FakeMessage:
+    """Just enough of a Telethon Message for transfer.py"""
+    def __init__(self, id, text="", document=None, mime_type=None, action=None):
+        self.id = id
+        self.text = text
+        self.action = action
+        self.photo = None
+        self.document = document
+        self.media = MessageMediaDocument(document=document) if document else None
+        self.file = None
+        if document:
+            name = document.attributes[0].file_name
+            self.file = FakeFile(document.size, name, mime_type)
+
+MIME_TYPES = [
+    ("application/zip", "zip"),
+    ("application/pdf", "pdf"),
+    ("video/x-matroska", "mkv"),
+    ("audio/mpeg", "mp3"),
+]
+
+def make_channel(count, seed=0, max_size=40 * 1024 * 1024):
+    """
+    `count` synthetic messages: mostly small documents, some medium and a
+    few large enough for parallel ranges, plus text, service messages,
+    deleted ids and re-posted documents (cache hits).
+    """
+    rng = random.Random(seed)
+    messages = {}
+    documents = []
+    for msg_id in range(1, count + 1):
+        roll = rng.random()
+        if roll < 0.03:
+            continue  # deleted
+        if roll < 0.06:
+            messages[msg_id] = FakeMessage(msg_id, action=MessageActionChatEditTitle("t"))
+        elif roll < 0.18:
+            messages[msg_id] = FakeMessage(msg_id, text=f"text {msg_id}")
+        elif roll < 0.21 and documents:
+            document, mime = rng.choice(documents)
+            messages[msg_id] = FakeMessage(msg_id, f"repost {msg_id}", document, mime)
+        else:
+            size_roll = rng.random()
+            if size_roll < 0.65:
+                size = rng.randint(1, 1024 * 1024)
+            elif size_roll < 0.9:
+                size = rng.randint(1024 * 1024, 8 * 1024 * 1024)
+            else:
+                size = rng.randint(10 * 1024 * 1024, max_size)
+            size = min(size, max_size)
+            mime, ext = rng.choice(MIME_TYPES)
+            document = Document(
+                id=msg_id, access_hash=msg_id * 7, file_reference=b"", date=None,
+                mime_type=mime, size=size, dc_id=2,
+                attributes=[DocumentAttributeFilename(f"file_{msg_id}.{ext}")]
+            )
+            documents.append((document, mime))
+            messages[msg_id] = FakeMessage(msg_id, f"caption {msg_id}", document, mime)
+    return messages
+
+class FakeUserClient(FakeDownloadClient):
+    """The account that reads the source channel"""
+    def __init__(self, messages, faults, latency=0.005, jitter=0.005, seed=0):
+        super().__init__(latency, jitter, seed)
+        self.messages = messages
+        self.faults = faults
+
+    async def get_messages(self, chat, ids=None, min_id=0, max_id=0, limit=None, reverse=False, wait_time=None):
+        if ids is not None:
+            await self._delay()
+            await self.faults.stall_maybe('enumerate')
+            return [self.messages.get(i) for i in ids]
+
+        # GetHistory: only messages that exist, one request per page of 100
+        found = [self.messages[i] for i in sorted(self.messages) if min_id < i < max_id]
+        for _ in range(max(1, (len(found) + 99) // 100)):
+            await self._delay()
+            await self.faults.stall_maybe('enumerate')
+        return found if reverse else found[::-1]
+
+    async def download_media(self, message, file=None, thumb=None):
+        await self._delay()
+        self.faults.raise_maybe(('thumb', message.id), 'thumbnail')
+        return b"\xff\xd8thumb"
+
+    def iter_download(self, file, *args, **kwargs):
+        chunks = super().iter_download(file, *args, **kwargs)
+
+        async def faulty():
+            async for chunk in chunks:
+                await self.faults.stall_maybe('download')
+                yield chunk
+
+        return faulty()
+
+class FakeStatus:
+    """Status message; edits can hit FloodWait like the real thing"""
+    def __init__(self, faults):
+        self.faults = faults
+        self.edits = 0
+
+    async def edit(self, text, buttons=None):
+        self.edits += 1
+        if self.faults.random.random() < self.faults.flood:
+            self.faults._count('status_floodwait')
+            raise errors.FloodWaitError(None, capture=self.faults.flood_seconds)
+
+class FakeBotClient:
+    """
+    The bot that uploads and posts. Parts are hashed as soon as they are
+    contiguous, so checking content does not hold whole files in memory.
+    Everything posted to `dest` is recorded as (caption, size, sha256).
+    """
+    def __init__(self, dest, faults, latency=0.005, jitter=0.005, seed=0):
+        self.dest = dest
+        self.faults = faults
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.uploads = {}  # file_id -> [next part, held parts, digest, size]
+        self.documents = {}  # sent document id -> (size, sha256)
+        self.posted = []
+        self.statuses = []
+
+    async def _delay(self):
+        await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+
+    async def __call__(self, request):
+        await self._delay()
+        self.faults.raise_maybe(('part', request.file_id, request.file_part), 'upload_part')
+
+        upload = self.uploads.setdefault(request.file_id, [0, {}, hashlib.sha256(), 0])
+        upload[1][request.file_part] = request.bytes
+        while upload[0] in upload[1]:
+            part = upload[1].pop(upload[0])
+            upload[2].update(part)
+            upload[3] += len(part)
+            upload[0] += 1
+        return True
+
+    async def send_message(self, chat, text, buttons=None, **kwargs):
+        if chat != self.dest:
+            status = FakeStatus(self.faults)
+            self.statuses.append(status)
+            return status
+        await self._delay()
+        self.posted.append((text, None, None))
+
+    async def send_file(self, chat, file, caption=None, **kwargs):
+        await self._delay()
+        key = getattr(file, 'id', None)
+        self.faults.raise_maybe(('post', key, caption), 'post')
+
+        if isinstance(file, InputDocument):
+            size, digest = self.documents[file.id]
+        else:
+            next_part, held, hashed, size = self.uploads.pop(file.id)
+            if held or next_part != file.parts:
+                raise ValueError(f"File {file.id}: {next_part}/{file.parts} parts received")
+            digest = hashed.hexdigest()
+
+        self.posted.append((caption, size, digest))
+        sent = FakeStatus(self.faults)
+        sent.document = Document(
+            id=next(_sent_ids), access_hash=1, file_reference=b"", date=None,
+            mime_type="application/octet-stream", size=size, dc_id=2, attributes=[]
+        )
+        self.documents[sent.document.id] = (size, digest)
+        return sent
@@ -0,0 +1,150 @@
+"""
+Benchmark for the compiled caption/filename rule engine.
+
+Rewrites synthetic captions with rule sets of increasing size, once with
+the compiled single-pass RuleSet and once applying the same rules one
+after another (a str.replace or re.sub pass per rule, as before), and
+prints one JSON document with captions/s for each. Also checks that both
+give the same output where the rules do not overlap, and that regex rules
+with backreferences, named groups or flags behave as if applied alone;
+exits non-zero if that check fails.
+
+    python -m benchmarks.rules_bench --captions 100000 --out rules.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rules import RuleSet
+
+RULE_COUNTS = [1, 10, 50, 100]
+
+WORDS = [
+    "episode", "season", "movie", "full", "hd", "1080p", "720p", "x264", "hevc",
+    "audio", "dual", "hindi", "english", "subs", "join", "now", "for", "more",
+    "the", "new", "release", "watch", "download", "fast", "link", "channel",
+]
+
+def make_captions(count, seed):
+    """Captions of 5-60 words with tags, mentions, links and SxxEyy markers"""
+    rng = random.Random(seed)
+    captions = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice([
+                f"@chan{rng.randint(0, 199):03d}",
+                f"#tag{rng.randint(0, 199):03d}",
+                f"S{rng.randint(1, 12):02d}E{rng.randint(1, 24):02d}",
+                f"https://t.me/chan{rng.randint(0, 199)}",
+            ]))
+        captions.append(" ".join(words))
+    return captions
+
+def make_rules(count, seed):
+    """A mix of literal, whole-word and regex rules with disjoint matches"""
+    rng = random.Random(seed)
+    rules = [
+        {'kind': 'regex', 'find': r"S(\d+)E(\d+)", 'replace': r"Season \1 Episode \2"},
+        {'kind': 'regex', 'find': r"https://t\.me/\w+", 'replace': "https://t.me/mine"},
+    ]
+    mentions = rng.sample(range(200), min(200, count))
+    for n in range(count - len(rules)):
+        if n % 3 == 0:
+            rules.append({'kind': 'word', 'find': f"#tag{mentions[n]:03d}", 'replace': ""})
+        else:
+            rules.append({'kind': 'text', 'find': f"@chan{mentions[n]:03d}", 'replace': "@mine"})
+    return rules[:count]
+
+def sequential(rules):
+    """Rules applied one pass each, the way single find/replace worked"""
+    steps = []
+    for rule in rules:
+        if rule['kind'] == 'text':
+            steps.append(lambda text, r=rule: text.replace(r['find'], r['replace']))
+        else:
+            pattern = rule['find'] if rule['kind'] == 'regex' else \
+                rf"(?<!\w){re.escape(rule['find'])}(?!\w)"
+            steps.append(lambda text, p=re.compile(pattern), r=rule: p.sub(r['replace'], text))
+
+    def apply(text):
+        for step in steps:
+            text = step(text)
+        return text
+    return apply
+
+# Rule lists whose regexes must not share group numbers or flags with others
+STANDALONE_CASES = [
+    ([{'kind': 'regex', 'find': r"(a)(b)", 'replace': "Y"},
+      {'kind': 'regex', 'find': r"(\w)\1", 'replace': "X"}], "hello ab book"),
+    ([{'kind': 'text', 'find': "foo", 'replace': "bar"},
+      {'kind': 'regex', 'find': r"(\w)\1", 'replace': "X"}], "foo hello"),
+    ([{'kind': 'regex', 'find': r"(?P<c>[a-z])(?P=c)", 'replace': r"<\g<c>>"},
+      {'kind': 'regex', 'find': r"(?P<c>\d)", 'replace': "#"}], "book 42"),
+    ([{'kind': 'word', 'find': "hd", 'replace': "HD"},
+      {'kind': 'regex', 'find': r"(?i)x264", 'replace': "H.264"}], "hd X264 hd"),
+]
+
+def check_standalone():
+    """Inputs of the cases where RuleSet differs from applying rules in order"""
+    return [
+        text for rules, text in STANDALONE_CASES
+        if RuleSet(rules).apply(text) != sequential(rules)(text)
+    ]
+
+def timed(apply, captions):
+    started = time.perf_counter()
+    out = [apply(caption) for caption in captions]
+    return time.perf_counter() - started, out
+
+def run(args):
+    captions = make_captions(args.captions, args.seed)
+    results = []
+    for count in RULE_COUNTS:
+        rules = make_rules(count, args.seed)
+        compile_started = time.perf_counter()
+        rule_set = RuleSet(rules)
+        compile_seconds = time.perf_counter() - compile_started
+
+        one_pass, compiled_out = timed(rule_set.apply, captions)
+        many_pass, sequential_out = timed(sequential(rules), captions)
+        results.append({
+            'rules': count,
+            'compile_ms': round(compile_seconds * 1000, 2),
+            'compiled_captions_per_s': round(len(captions) / one_pass),
+            'sequential_captions_per_s': round(len(captions) / many_pass),
+            'speedup': round(many_pass / one_pass, 2),
+            'same_output': compiled_out == sequential_out,
+        })
+        print(
+            f"{count:4d} rules  compiled {results[-1]['compiled_captions_per_s']:>9}/s  "
+            f"sequential {results[-1]['sequential_captions_per_s']:>9}/s  "
+            f"×{results[-1]['speedup']}",
+            file=sys.stderr
+        )
+    return {
+        'captions': len(captions), 'seed': args.seed, 'results': results,
+        'standalone_failures': check_standalone(),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--captions', type=int, default=100000, help="Synthetic captions")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    sys.exit(1 if report['standalone_failures'] else 0)
@@ -0,0 +1,213 @@
+"""
+End-to-end soak run of transfer_process against local Telegram stand-ins.
+
+Builds a synthetic source channel, runs the real scheduler/transfer/stream/
+uploader stack against fake clients with injected FloodWaits, dropped
+connections and slow chunks, then checks that the destination received
+every message in order with identical content, that no tasks, streams or
+budget reservations leaked, and how RSS grew over the run. Prints a JSON
+report and exits non-zero if any check failed.
+
+    python -m benchmarks.soak --messages 2000 --flood 0.02 --drop 0.02 --slow 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the cache and journal of a soak run away from the real ones
+_workdir = tempfile.mkdtemp(prefix="soak-")
+os.environ["CACHE_PATH"] = os.path.join(_workdir, "upload_cache.db")
+os.environ["JOURNAL_PATH"] = os.path.join(_workdir, "transfer_journal.jsonl")
+
+import config
+from transfer import transfer_process
+from scheduler import JobScheduler, Job
+from memory import budget
+from metrics import metrics
+from utils import current_rss, human_readable_size
+from benchmarks.fake_telegram import (
+    FaultPlan, FakeUserClient, FakeBotClient, make_channel, content_digest
+)
+
+SOURCE, DEST, CHAT = -1001, -1002, 42
+MB = 1024 * 1024
+
+def expected_posts(messages):
+    """What the destination should receive, in order"""
+    expected = []
+    for msg_id in sorted(messages):
+        message = messages[msg_id]
+        if message.action:
+            continue
+        if message.document:
+            size = message.document.size
+            expected.append((message.text, size, content_digest(message.document.id, size)))
+        else:
+            expected.append((message.text, None, None))
+    return expected
+
+class Sampler:
+    """Records RSS, live tasks, live streams and budget use over time"""
+    def __init__(self, bot, interval):
+        self.bot = bot
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    def sample(self, started):
+        self.samples.append({
+            't': round(time.monotonic() - started, 2),
+            'rss': current_rss(),
+            'tasks': len(asyncio.all_tasks()),
+            'streams': len(metrics.streams),
+            'reserved': budget.reserved,
+            'posted': len(self.bot.posted),
+        })
+
+    async def _run(self, started):
+        while True:
+            self.sample(started)
+            await asyncio.sleep(self.interval)
+
+    def start(self, started):
+        self._task = asyncio.create_task(self._run(started))
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def rss_growth(self):
+        """RSS slope (bytes/min) after the first quarter of the run"""
+        points = self.samples[len(self.samples) // 4:]
+        if len(points) < 2:
+            return 0
+        n = len(points)
+        mean_t = sum(p['t'] for p in points) / n
+        mean_r = sum(p['rss'] for p in points) / n
+        var = sum((p['t'] - mean_t) ** 2 for p in points)
+        if not var:
+            return 0
+        cov = sum((p['t'] - mean_t) * (p['rss'] - mean_r) for p in points)
+        return cov / var * 60
+
+def compare(expected, posted):
+    """First mismatches between expected and posted, as readable strings"""
+    problems = []
+    for index, (want, got) in enumerate(zip(expected, posted)):
+        if want != got:
+            problems.append(f"#{index}: expected {want[:2]}, got {got[:2]}")
+            if len(problems) >= 10:
+                break
+    if len(expected) != len(posted):
+        problems.append(f"expected {len(expected)} posts, got {len(posted)}")
+    return problems
+
+async def main(args):
+    faults = FaultPlan(
+        flood=args.flood, drop=args.drop, slow=args.slow,
+        flood_seconds=args.flood_seconds, seed=args.seed,
+        max_in_a_row=config.MAX_RETRIES - 1
+    )
+    messages = make_channel(args.messages, args.seed, args.max_size_mb * MB)
+    user = FakeUserClient(messages, faults, args.latency / 1000, args.jitter / 1000, args.seed)
+    bot = FakeBotClient(DEST, faults, args.latency / 1000, args.jitter / 1000, args.seed)
+    expected = expected_posts(messages)
+
+    scheduler = JobScheduler(1)
+    scheduler.bind(lambda job: transfer_process(
+        None, user, bot, job.source, job.dest, job.start, job.end, job.id, job
+    ))
+    session_id = "soak"
+    config.active_sessions[session_id] = {
+        'source': SOURCE, 'dest': DEST, 'settings': {}, 'chat_id': CHAT, 'step': 'running'
+    }
+
+    started = time.monotonic()
+    sampler = Sampler(bot, args.sample_interval)
+    sampler.start(started)
+    baseline_tasks = len(asyncio.all_tasks())
+
+    job = Job(session_id, CHAT, SOURCE, DEST, 1, args.messages)
+    scheduler.submit(job)
+    await job.task
+    elapsed = time.monotonic() - started
+
+    # Let cancelled stragglers unwind before looking for leaks
+    await asyncio.sleep(1)
+    sampler.sample(started)
+    await sampler.stop()
+
+    leftover = [
+        task for task in asyncio.all_tasks()
+        if task is not asyncio.current_task()
+    ]
+    moved = sum(size for _, size, _ in bot.posted if size)
+    growth = sampler.rss_growth()
+
+    failures = compare(expected, bot.posted)
+    if job.state != 'done':
+        failures.append(f"job ended as {job.state}")
+    if leftover:
+        failures.append(f"{len(leftover)} tasks leaked: {[t.get_coro() for t in leftover[:5]]}")
+    if metrics.streams:
+        failures.append(f"{len(metrics.streams)} streams never closed")
+    if budget.reserved or budget.waiting:
+        failures.append(f"budget not returned: {budget.reserved} bytes, {budget.waiting} waiting")
+    if bot.uploads:
+        failures.append(f"{len(bot.uploads)} uploads never posted")
+    if growth > args.max_rss_growth_mb * MB:
+        failures.append(f"RSS growing {human_readable_size(growth)}/min")
+
+    return {
+        'ok': not failures,
+        'failures': failures,
+        'messages': args.messages,
+        'posts': len(bot.posted),
+        'bytes': moved,
+        'seconds': round(elapsed, 2),
+        'mb_per_s': round(moved / elapsed / MB, 2) if elapsed else 0,
+        'rss_start': sampler.samples[0]['rss'],
+        'rss_peak': max(s['rss'] for s in sampler.samples),
+        'rss_end': sampler.samples[-1]['rss'],
+        'rss_growth_bytes_per_min': round(growth),
+        'tasks_during_run_baseline': baseline_tasks,
+        'injected': faults.injected,
+        'status_edits': sum(status.edits for status in bot.statuses),
+        'budget_peak': budget.peak,
+        'samples': sampler.samples if args.samples else len(sampler.samples),
+        'workdir': _workdir,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500, help="Synthetic channel size")
+    parser.add_argument('--max-size-mb', type=int, default=40, help="Largest document")
+    parser.add_argument('--latency', type=float, default=5, help="Per-request latency (ms)")
+    parser.add_argument('--jitter', type=float, default=5, help="Extra random latency (ms)")
+    parser.add_argument('--flood', type=float, default=0.01, help="FloodWait rate per request")
+    parser.add_argument('--flood-seconds', type=int, default=1, help="FloodWait length")
+    parser.add_argument('--drop', type=float, default=0.01, help="Dropped connection rate")
+    parser.add_argument('--slow', type=float, default=0.01, help="Slow chunk rate")
+    parser.add_argument('--max-rss-growth-mb', type=float, default=32,
+                        help="Fail if RSS keeps growing faster than this per minute")
+    parser.add_argument('--sample-interval', type=float, default=2.0)
+    parser.add_argument('--samples', action='store_true', help="Include the RSS time series")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help="Keep the bot's INFO logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        config.logger.setLevel(logging.ERROR)
+    # Copy mode re-sends by reference and would bypass the streams under test
+    config.COPY_MODE = False
+
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['ok'] else 1)
@@ -0,0 +1,161 @@
+"""
+Micro-benchmark for ExtremeBufferedStream against a fake client.
+
+Runs a matrix of request (chunk) sizes, in-flight buffer (queue) sizes and
+uploader read sizes, and prints one JSON document with MB/s, bytes copied
+by ChunkBuffer, peak RSS and event-loop lag for each case. Save the output
+per commit and diff it to spot regressions:
+
+    python -m benchmarks.stream_bench --size-mb 64 --out bench.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from stream import ExtremeBufferedStream
+from tuner import tuner
+from memory import budget
+from utils import current_rss
+from benchmarks.fake_telegram import FakeDocument, FakeDownloadClient, fake_upload
+
+KB = 1024
+MB = 1024 * 1024
+
+CHUNK_SIZES = [64 * KB, 256 * KB, 512 * KB]
+INFLIGHT_SIZES = [4 * MB, 32 * MB]
+READ_SIZES = [128 * KB, 512 * KB]
+
+class LoopMonitor:
+    """Samples event-loop lag and RSS every `interval` seconds"""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self.peak_rss = 0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def start(self):
+        self.peak_rss = current_rss()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def summary(self):
+        lags = sorted(self.lags) or [0.0]
+        return {
+            'loop_lag_ms_mean': round(sum(lags) / len(lags) * 1000, 3),
+            'loop_lag_ms_p99': round(lags[int(len(lags) * 0.99)] * 1000, 3),
+            'loop_lag_ms_max': round(lags[-1] * 1000, 3),
+            'peak_rss_bytes': self.peak_rss,
+        }
+
+async def run_case(args, chunk_size, inflight, read_size, seed):
+    """Stream one fake file through a fake uploader with the given sizes"""
+    tuner.request_size = lambda file_size: chunk_size
+    tuner.inflight_bytes = inflight
+    tuner.download_workers = args.workers
+
+    client = FakeDownloadClient(args.latency / 1000, args.jitter / 1000, seed)
+    document = FakeDocument(seed, args.size_mb * MB)
+    monitor = LoopMonitor()
+    monitor.start()
+
+    started = time.perf_counter()
+    stream = ExtremeBufferedStream(client, document, document.size, f"bench-{seed}", time.time())
+    try:
+        uploaded = await fake_upload(
+            stream, read_size, args.upload_workers,
+            args.latency / 1000, args.jitter / 1000, seed
+        )
+    finally:
+        await stream.close()
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    if uploaded != document.size:
+        raise RuntimeError(f"Short stream: {uploaded}/{document.size} bytes")
+
+    return {
+        'chunk_size': chunk_size,
+        'inflight_bytes': inflight,
+        'read_size': read_size,
+        'seconds': round(elapsed, 4),
+        'mb_per_s': round(uploaded / elapsed / MB, 2),
+        'bytes_copied': stream.buffer.bytes_copied,
+        'requests': client.requests,
+        'budget_peak_bytes': budget.peak,
+        **monitor.summary(),
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    results = []
+    cases = itertools.product(CHUNK_SIZES, INFLIGHT_SIZES, READ_SIZES)
+    for seed, (chunk_size, inflight, read_size) in enumerate(cases, 1):
+        budget.peak = budget.reserved
+        result = await run_case(args, chunk_size, inflight, read_size, seed)
+        results.append(result)
+        print(
+            f"chunk {chunk_size // KB:>4}KB  inflight {inflight // MB:>3}MB  "
+            f"read {read_size // KB:>4}KB  {result['mb_per_s']:>8} MB/s  "
+            f"lag p99 {result['loop_lag_ms_p99']}ms",
+            file=sys.stderr
+        )
+
+    return {
+        'commit': git_revision(),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'results': results,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=64, help="Fake file size per case")
+    parser.add_argument('--latency', type=float, default=5, help="Per-request latency (ms)")
+    parser.add_argument('--jitter', type=float, default=2, help="Extra random latency (ms)")
+    parser.add_argument('--workers', type=int, default=config.DOWNLOAD_WORKERS,
+                        help="Parallel download workers")
+    parser.add_argument('--upload-workers', type=int, default=config.UPLOAD_WORKERS,
+                        help="Parts in flight in the fake uploader")
+    parser.add_argument('--out', help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    # Per-file stream logs would dominate the timings
+    config.logger.setLevel(logging.WARNING)
+
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
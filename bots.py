@@ -0,0 +1,118 @@
+import asyncio
+import time
+import config
+
+class _Bot:
+    __slots__ = ('client', 'id', 'uploading', 'cooldown_until', 'floods', 'uploads')
+
+    def __init__(self, client, bot_id):
+        self.client = client
+        self.id = bot_id
+        self.uploading = 0
+        self.cooldown_until = 0
+        self.floods = 0
+        self.uploads = 0
+
+def token_bot_id(token):
+    """Bot user id from a token ("123456:ABC..." -> 123456), 0 if unknown"""
+    try:
+        return int((token or "").split(":", 1)[0])
+    except ValueError:
+        return 0
+
+class BotPool:
+    """
+    Spreads uploads across several bot accounts, all admins in the
+    destination. Each file goes to the ready bot with the fewest uploads
+    in flight; a bot that hits FloodWait is skipped until its cooldown
+    ends. A file is posted by the bot that uploaded it, since uploaded
+    parts belong to that account; posting order is still decided by the
+    transfer. Without extra tokens this is just the main bot.
+    """
+    def __init__(self):
+        self.bots = []
+
+    def bind(self, clients_and_tokens):
+        """`clients_and_tokens`: (client, token) pairs, main bot first"""
+        self.bots = [_Bot(client, token_bot_id(token)) for client, token in clients_and_tokens]
+        if len(self.bots) > 1:
+            config.logger.info(f"🤖 Uploading with {len(self.bots)} bots")
+
+    def _find(self, client):
+        for bot in self.bots:
+            if bot.client is client:
+                return bot
+        return None
+
+    def _ready(self):
+        now = time.time()
+        return [bot for bot in self.bots if bot.cooldown_until <= now]
+
+    async def acquire(self, default):
+        """Reserve the least loaded ready bot for one upload"""
+        if not self.bots:
+            self.bots = [_Bot(default, 0)]
+
+        while True:
+            ready = self._ready()
+            if ready:
+                bot = min(ready, key=lambda b: (b.uploading, b.uploads))
+                bot.uploading += 1
+                bot.uploads += 1
+                return bot
+            wait = min(bot.cooldown_until for bot in self.bots) - time.time()
+            config.logger.warning(f"⏳ All bots cooling down, waiting {wait:.0f}s")
+            await asyncio.sleep(max(wait, 0.1))
+
+    def release(self, bot):
+        bot.uploading -= 1
+
+    def pick(self, default):
+        """Client for a one-off call (text posts): least loaded ready bot"""
+        ready = self._ready()
+        if not ready:
+            return default
+        return min(ready, key=lambda b: b.uploading).client
+
+    def owner(self, client):
+        """Id stored with cached uploads so they are re-sent by the same bot"""
+        bot = self._find(client)
+        return bot.id if bot else 0
+
+    def by_owner(self, owner, default):
+        """Client that can re-send a cached upload from `owner`"""
+        for bot in self.bots:
+            if bot.id == owner and owner:
+                return bot.client
+        return default
+
+    def flood(self, client, seconds):
+        """Record a FloodWait so new uploads avoid this bot for a while"""
+        bot = self._find(client)
+        if bot is None:
+            return
+        bot.floods += 1
+        bot.cooldown_until = max(bot.cooldown_until, time.time() + seconds)
+        if len(self.bots) > 1:
+            config.logger.info(f"🤖 Bot {bot.id} cooling down {seconds}s")
+
+    def limiter_flood(self, client, method, seconds):
+        """
+        A FloodWait the rate limiter sleeps through. The request in flight
+        has to finish on this bot anyway, but new uploads go elsewhere.
+        """
+        self.flood(client, seconds)
+        return False
+
+    def describe(self):
+        if len(self.bots) <= 1:
+            return "🤖 Bots: **1**"
+        now = time.time()
+        lines = [f"🤖 Bots: **{len(self.bots)}**"]
+        for bot in self.bots:
+            cooling = bot.cooldown_until - now
+            state = f"⏳ {cooling:.0f}s" if cooling > 0 else f"⬆️ {bot.uploading}"
+            lines.append(f"• `{bot.id}` {state} | {bot.uploads} files | {bot.floods} floods")
+        return "\n".join(lines)
+
+bot_pool = BotPool()
@@ -0,0 +1,100 @@
+import sqlite3
+import time
+from telethon.tl.types import InputDocument
+import config
+
+class UploadCache:
+    """
+    SQLite map from a source file (+ the name/mode it was sent with) to
+    the document the bot uploaded for it. Repeats are re-sent by
+    reference instead of being downloaded and uploaded again.
+    Least recently used entries are evicted past `max_entries`.
+    """
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "key TEXT PRIMARY KEY, "
+                "doc_id INTEGER, access_hash INTEGER, file_reference BLOB, "
+                "last_used REAL)"
+            )
+            try:
+                # Which bot uploaded it; 0 means the main bot
+                self._conn.execute("ALTER TABLE uploads ADD COLUMN owner INTEGER DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(media, size, file_name, force_document):
+        """Source identity plus everything that changes the uploaded file"""
+        return f"{media.id}:{media.access_hash}:{size}:{file_name}:{int(force_document)}"
+
+    def get(self, key):
+        """(InputDocument, owner bot id) for a previous upload of `key`, or None"""
+        if not config.CACHE_ENABLED:
+            return None
+        try:
+            db = self._db()
+            row = db.execute(
+                "SELECT doc_id, access_hash, file_reference, owner FROM uploads WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            db.execute("UPDATE uploads SET last_used = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            self.hits += 1
+            return InputDocument(id=row[0], access_hash=row[1], file_reference=row[2]), row[3]
+
+        except sqlite3.Error as e:
+            config.logger.warning(f"Upload cache read failed: {e}")
+            return None
+
+    def put(self, key, document, owner=0):
+        """Remember the document bot `owner` just sent for `key`"""
+        if not config.CACHE_ENABLED or document is None:
+            return
+        try:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?)",
+                (key, document.id, document.access_hash, document.file_reference,
+                 time.time(), owner)
+            )
+            db.execute(
+                "DELETE FROM uploads WHERE key IN ("
+                "SELECT key FROM uploads ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            config.logger.warning(f"Upload cache write failed: {e}")
+
+    def discard(self, key):
+        """Forget an entry Telegram no longer accepts"""
+        try:
+            db = self._db()
+            db.execute("DELETE FROM uploads WHERE key = ?", (key,))
+            db.commit()
+        except sqlite3.Error as e:
+            config.logger.warning(f"Upload cache delete failed: {e}")
+
+    def __len__(self):
+        try:
+            return self._db().execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+upload_cache = UploadCache(config.CACHE_PATH, config.CACHE_MAX_ENTRIES)
@@ -6,18 +6,136 @@ API_ID = int(os.environ.get("API_ID", 0))
 API_HASH = os.environ.get("API_HASH")
 STRING_SESSION = os.environ.get("STRING_SESSION") 
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
+# Extra bots (comma separated tokens) that share uploads; all must be dest admins
+BOT_TOKENS = [t.strip() for t in os.environ.get("BOT_TOKENS", "").split(",") if t.strip()]
+# Extra user sessions (comma separated string sessions) that can read the source
+DOWNLOAD_SESSIONS = [s.strip() for s in os.environ.get("DOWNLOAD_SESSIONS", "").split(",") if s.strip()]
 PORT = int(os.environ.get("PORT", 8080))
 
 # --- OPTIMIZED SETTINGS FOR RENDER FREE TIER ---
-# Reduced from 32MB to 8MB chunks (better for 512MB RAM limit)
-CHUNK_SIZE = 8 * 1024 * 1024  # 8MB chunks
-QUEUE_SIZE = 10  # 80MB buffer (8MB × 2) - Much safer for free tier
-UPLOAD_PART_SIZE = 8192  # 8MB upload parts (was 32MB)
-UPDATE_INTERVAL = 5  # Progress update interval (seconds)
+# Request, part and buffer sizes are chosen per file by tuner.py within
+# Telegram's limits (512KB GetFile requests, 512KB upload parts); these
+# are the starting points it adapts from
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 4))  # Parts in flight
+UPDATE_INTERVAL = 5  # Minimum seconds between status edits
 MAX_RETRIES = 3  # Retry attempts per file (reduced from 4)
 FLOOD_SLEEP_THRESHOLD = 120
 REQUEST_RETRIES = 10  # Reduced from 20
 
+# --- PARALLEL DOWNLOAD ---
+# Files above PARALLEL_MIN_SIZE are fetched as interleaved 512KB ranges
+# by DOWNLOAD_WORKERS concurrent requests, reordered before read()
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 4))  # 1 = sequential
+DOWNLOAD_INFLIGHT_BYTES = int(os.environ.get("DOWNLOAD_INFLIGHT_MB", 32)) * 1024 * 1024
+PARALLEL_MIN_SIZE = 10 * 1024 * 1024  # Small files stay sequential
+
+# --- MEMORY BUDGET ---
+# Every stream buffer and thumbnail reserves bytes from this shared budget
+# before allocating; producers wait instead of the process running out
+MEMORY_BUDGET_BYTES = int(os.environ.get("MEMORY_BUDGET_MB", 160)) * 1024 * 1024
+
+# --- SPILL TO DISK ---
+# Files of SPILL_MIN_SIZE and up download into a memory-mapped ring file
+# of SPILL_WINDOW_BYTES instead of the in-memory queue, so downloads run
+# ahead of stalled uploads and resumed uploads re-read local bytes.
+# Spill files together stay under SPILL_DISK_BYTES (others use RAM)
+SPILL_ENABLED = os.environ.get("SPILL_ENABLED", "false").lower() == "true"
+SPILL_MIN_SIZE = 64 * 1024 * 1024
+SPILL_WINDOW_BYTES = int(os.environ.get("SPILL_WINDOW_MB", 256)) * 1024 * 1024
+SPILL_DISK_BYTES = int(os.environ.get("SPILL_DISK_MB", 1024)) * 1024 * 1024
+SPILL_DIR = os.environ.get("SPILL_DIR")  # Default: the system temp dir
+
+# --- AUTO-TUNER ---
+TUNER_ENABLED = os.environ.get("TUNER_ENABLED", "true").lower() == "true"
+MEMORY_CEILING_BYTES = int(os.environ.get("MEMORY_CEILING_MB", 400)) * 1024 * 1024
+TUNER_MAX_WORKERS = 8  # Upper bound for download and upload workers
+TUNER_MIN_SAMPLE_BYTES = 4 * 1024 * 1024  # Smaller files are not measured
+
+# --- PIPELINE ---
+# Files downloaded/uploaded concurrently; posting stays in source order.
+# 1 = one file at a time (previous behaviour)
+PIPELINE_FILES = int(os.environ.get("PIPELINE_FILES", 3))
+PIPELINE_MEMORY_BYTES = int(os.environ.get("PIPELINE_MEMORY_MB", 128)) * 1024 * 1024
+
+# --- SENDER POOL ---
+# Authorized connections to foreign DCs, kept open and shared across files
+SENDER_POOL_ENABLED = os.environ.get("SENDER_POOL_ENABLED", "true").lower() == "true"
+SENDER_POOL_SIZE = int(os.environ.get("SENDER_POOL_SIZE", 2))  # Senders per DC
+SENDER_IDLE_SECONDS = int(os.environ.get("SENDER_IDLE_SECONDS", 300))
+# DCs to authorize at startup, e.g. "1,4,5" (others connect on first use)
+SENDER_WARM_DCS = [int(dc) for dc in os.environ.get("SENDER_WARM_DCS", "").split(",") if dc.strip()]
+
+# --- ACCOUNT POOL ---
+# Downloads are spread over STRING_SESSION and DOWNLOAD_SESSIONS; an extra
+# account is dropped after ACCOUNT_MAX_FLOODS FloodWaits within
+# ACCOUNT_FLOOD_WINDOW seconds, or one wait of ACCOUNT_MAX_FLOOD_SECONDS
+ACCOUNT_MAX_FLOODS = int(os.environ.get("ACCOUNT_MAX_FLOODS", 3))
+ACCOUNT_FLOOD_WINDOW = 600
+ACCOUNT_MAX_FLOOD_SECONDS = 300
+
+# --- RATE LIMITER ---
+# Every request of every client is paced by a per-client bucket and a
+# per-method bucket (requests/second). A FloodWait blocks that method
+# until it ends and cuts its rate by RATE_BACKOFF; successful calls
+# win the rate back a little at a time
+RATE_LIMITER_ENABLED = os.environ.get("RATE_LIMITER_ENABLED", "true").lower() == "true"
+RATE_CLIENT_PER_SECOND = 150
+RATE_METHOD_PER_SECOND = 10  # Methods not listed below
+RATE_METHODS = {
+    'SendMessageRequest': 1,
+    'SendMediaRequest': 1,
+    'EditMessageRequest': 0.5,
+    'GetMessagesRequest': 5,
+    'GetHistoryRequest': 5,
+    'GetFileRequest': 100,
+    'SaveFilePartRequest': 100,
+    'SaveBigFilePartRequest': 100,
+}
+RATE_MIN_PER_SECOND = 0.05
+RATE_BACKOFF = 0.5
+RATE_RECOVERY = 0.02  # Share of the base rate regained per successful call
+
+# --- RANGE ENUMERATION ---
+# Message ids are fetched in batches ahead of the transfer instead of
+# loading the whole range up front. Small ranges ask for their ids
+# directly; larger ones page GetHistory windows, which skip deleted ids
+ENUM_BATCH_SIZE = 100  # Telegram maximum ids per GetMessages
+ENUM_HISTORY_MIN_IDS = int(os.environ.get("ENUM_HISTORY_MIN_IDS", 500))
+ENUM_HISTORY_WINDOW = 2000  # Ids per GetHistory window (≤20 pages of 100)
+ENUM_CONCURRENCY = 3  # Batches fetched in parallel
+ENUM_QUEUE_BATCHES = 4  # Fetched batches waiting for the transfer
+
+# --- THUMBNAILS ---
+THUMB_CACHE_SIZE = 64  # Recently used thumbnails kept in memory
+THUMB_RESERVE_BYTES = 256 * 1024  # Budget held while a thumbnail downloads
+
+# --- COPY MODE ---
+# Re-send unchanged documents by reference as the user (no download or
+# upload); falls back to streaming through the bot when rejected
+COPY_MODE = os.environ.get("COPY_MODE", "true").lower() == "true"
+
+# --- JOB SCHEDULER ---
+# Transfers running at once across all users; the rest wait in per-user queues
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", 2))
+
+# --- UPLOAD CACHE ---
+# Remembers what the bot already uploaded so repeats are sent by reference
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+CACHE_PATH = os.environ.get("CACHE_PATH", "upload_cache.db")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 50000))
+
+# --- RESUME JOURNAL ---
+JOURNAL_PATH = os.environ.get("JOURNAL_PATH", "transfer_journal.jsonl")
+# Progress records reach the OS at once but are fsynced at most this often
+JOURNAL_SYNC_SECONDS = float(os.environ.get("JOURNAL_SYNC_SECONDS", 1.0))
+AUTO_RESUME = os.environ.get("AUTO_RESUME", "true").lower() == "true"
+
+# --- TRACING ---
+# Per-session Chrome trace JSON of every file's stages (chrome://tracing)
+TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "false").lower() == "true"
+TRACE_DIR = os.environ.get("TRACE_DIR", "traces")
+TRACE_MAX_EVENTS = 500000  # Spans kept per session before dropping
+
 # --- LOGGING SETUP ---
 logging.basicConfig(
     level=logging.INFO, 
@@ -28,8 +146,3 @@ logger = logging.getLogger(__name__)
 # --- RUNTIME STATE ---
 pending_requests = {}
 active_sessions = {}
-is_running = False
-status_message = None
-last_update_time = 0
-current_task = None
-stop_flag = False  # NEW: Global stop flag
@@ -1,16 +1,134 @@
-import asyncio
+import re
 import uuid
 from telethon import events
 import config
 from keyboards import (
-    get_settings_keyboard, get_confirm_keyboard,
-    get_skip_keyboard, get_clone_info_keyboard
+    get_settings_keyboard, get_confirm_keyboard, get_rules_keyboard,
+    get_skip_keyboard, get_clone_info_keyboard, get_plan_keyboard,
+    RULE_TARGETS, RULES_PER_PAGE
 )
-from transfer import transfer_process
+from rules import parse_rules, compile_rules, session_rules, MAX_RULES
+from transfer import transfer_process, build_manifest, plan_speed
+from cache import upload_cache
+from journal import journal
+from tuner import tuner
+from memory import budget
+from scheduler import scheduler, Job
+from senders import sender_pool
+from bots import bot_pool
+from accounts import account_pool
+from ratelimit import limiter
+
+def stats_text():
+    """Shared body of /stats and the stats button"""
+    return (
+        f"📊 **Bot Statistics**\n"
+        f"━━━━━━━━━━━━━━━━━━━━\n"
+        f"{tuner.describe()}\n"
+        f"{budget.describe()}\n"
+        f"{sender_pool.describe()}\n"
+        f"{bot_pool.describe()}\n"
+        f"{account_pool.describe()}\n"
+        f"{limiter.describe()}\n"
+        f"🔄 Retries: **{config.MAX_RETRIES}**\n"
+        f"━━━━━━━━━━━━━━━━━━━━\n"
+        f"{scheduler.describe()}\n"
+        f"📊 Sessions: **{len(config.active_sessions)}**\n"
+        f"━━━━━━━━━━━━━━━━━━━━\n"
+        f"🗃️ Cache: **{len(upload_cache)}** files | "
+        f"Hits **{upload_cache.hits}** / Misses **{upload_cache.misses}**"
+    )
+
+RULES_HELP = (
+    "Send rules, one per line:\n"
+    "`find => replace` - plain text\n"
+    "`w:find => replace` - whole words only\n"
+    "`re:pattern => replace` - regex (`\\1` for groups)\n"
+    "An empty replacement deletes the match."
+)
+
+RULES_ORDER = (
+    "Where rules match at the same spot, regex rules win, then whole "
+    "words, then plain text (longest first)."
+)
+
+def editable_rules(session, target):
+    """The session's rules for `target`, with the older single find/replace folded in"""
+    settings = session['settings']
+    rules = session_rules(settings, target)
+    settings.pop(f'find_{target}', None)
+    settings.pop(f'replace_{target}', None)
+    settings[f'{target}_rules'] = rules
+    return rules
+
+def rules_text(target, rules):
+    return (
+        f"{RULE_TARGETS[target]} **Rules** ({len(rules)}/{MAX_RULES})\n"
+        f"━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"{RULES_ORDER if rules else 'No rules yet.'}\n"
+        f"Tap a rule to delete it.\n\n"
+        f"{RULES_HELP}"
+    )
+
+def resume_session(session_id, state, event=None):
+    """Queue a journaled session from the message after its last one"""
+    config.active_sessions[session_id] = {
+        'source': state['source'],
+        'dest': state['dest'],
+        'settings': state.get('settings', {}),
+        'chat_id': state['chat_id'],
+        'step': 'running'
+    }
+    position = scheduler.submit(Job(
+        session_id, state['chat_id'], state['source'], state['dest'],
+        state['last'] + 1, state['end'], event
+    ))
+    config.logger.info(
+        f"♻️ Resuming {session_id[:8]} from msg {state['last'] + 1} to {state['end']}"
+    )
+    return position
+
+def parse_range(text):
+    """Start and end ids from `link1 - link2`; raises ValueError"""
+    parts = text.strip().split("-")
+    if len(parts) != 2:
+        raise ValueError("Need exactly 2 links separated by -")
+    
+    msg1 = int(parts[0].strip().split("/")[-1])
+    msg2 = int(parts[1].strip().split("/")[-1])
+    
+    if msg1 > msg2: 
+        msg1, msg2 = msg2, msg1
+    
+    if msg1 == msg2:
+        raise ValueError("Start and end must be different!")
+    return msg1, msg2
+
+def queued_text(position):
+    return (
+        f"⏳ **Queued** (#{position} in your queue)\n"
+        f"{scheduler.describe()}\n\n"
+        f"Use `/status` to check on it."
+    )
 
 def register_handlers(user_client, bot_client):
     """Register all bot handlers - FIXED VERSION"""
     
+    async def run_job(job):
+        await transfer_process(
+            job.event,
+            user_client,
+            bot_client,
+            job.source,
+            job.dest,
+            job.start,
+            job.end,
+            job.id,
+            job
+        )
+    
+    scheduler.bind(run_job)
+    
     @bot_client.on(events.NewMessage(pattern='/start'))
     async def start_handler(event):
         await event.respond(
@@ -28,8 +146,11 @@ def register_handlers(user_client, bot_client):
             "**Commands:**\n"
             "`/clone SOURCE_ID DEST_ID` - Start transfer\n"
             "`/stats` - Bot statistics\n"
+            "`/resume` - Continue an interrupted transfer\n"
+            "`/status` - Your queued and running transfers\n"
+            "`/plan link1 - link2` - Dry run: sizes and ETA first\n"
             "`/help` - Usage guide\n"
-            "`/stop` - Stop transfer",
+            "`/stop [id]` - Stop your transfers",
             buttons=get_clone_info_keyboard()
         )
     
@@ -41,8 +162,8 @@ def register_handlers(user_client, bot_client):
             "**Step 1:** Use `/clone` command\n"
             "`/clone -1001234567 -1009876543`\n\n"
             "**Step 2:** Configure (optional)\n"
-            "• Filename Find & Replace\n"
-            "• Caption Find & Replace\n"
+            "• Filename rules (text, whole word, regex)\n"
+            "• Caption rules (text, whole word, regex)\n"
             "• Add Extra Caption\n\n"
             "**Step 3:** Click '✅ Done'\n\n"
             "**Step 4:** Send message range\n"
@@ -55,12 +176,6 @@ def register_handlers(user_client, bot_client):
     
     @bot_client.on(events.NewMessage(pattern='/clone'))
     async def clone_init(event):
-        if config.is_running: 
-            return await event.respond(
-                "⚠️ **Transfer in progress!**\n"
-                "Use `/stop` to cancel it first."
-            )
-        
         try:
             args = event.text.split()
             if len(args) < 3:
@@ -125,51 +240,77 @@ def register_handlers(user_client, bot_client):
     @bot_client.on(events.CallbackQuery(pattern=b'bot_stats'))
     async def stats_callback(event):
         await event.answer()
-        await event.respond(
-            f"📊 **Bot Statistics**\n"
-            f"━━━━━━━━━━━━━━━━━━━━\n"
-            f"⚡ Chunk Size: **8MB**\n"
-            f"💾 Queue: **2 chunks**\n"
-            f"📦 Buffer: **16MB**\n"
-            f"📤 Upload Parts: **8MB**\n"
-            f"🔄 Max Retries: **{config.MAX_RETRIES}**\n"
-            f"━━━━━━━━━━━━━━━━━━━━\n"
-            f"🚀 Status: **{'🟢 Running' if config.is_running else '🔴 Idle'}**\n"
-            f"📊 Sessions: **{len(config.active_sessions)}**"
-        )
+        await event.respond(stats_text())
     
-    @bot_client.on(events.CallbackQuery(pattern=r'set_fname_(.+)'))
-    async def set_filename_callback(event):
-        session_id = event.data.decode().split('_')[2]
+    @bot_client.on(events.CallbackQuery(pattern=r'rules_(name|cap)_(.+)'))
+    async def rules_callback(event):
+        _, target, session_id = event.data.decode().split('_', 2)
         if session_id not in config.active_sessions:
             return await event.answer("❌ Session expired! Start over with /clone", alert=True)
         
-        config.active_sessions[session_id]['step'] = 'fname_find'
+        session = config.active_sessions[session_id]
+        session['step'] = 'settings'
+        rules = editable_rules(session, target)
+        await event.edit(rules_text(target, rules), buttons=get_rules_keyboard(session_id, target, rules))
+    
+    @bot_client.on(events.CallbackQuery(pattern=r'radd_(name|cap)_(.+)'))
+    async def add_rules_callback(event):
+        _, target, session_id = event.data.decode().split('_', 2)
+        if session_id not in config.active_sessions:
+            return await event.answer("❌ Session expired! Start over", alert=True)
+        
+        config.active_sessions[session_id]['step'] = f'rules_{target}'
         await event.edit(
-            "📝 **Filename: Find Text**\n"
+            f"{RULE_TARGETS[target]} **Add Rules**\n"
             "━━━━━━━━━━━━━━━━━━━━\n\n"
-            "Type the text to FIND in filenames:\n\n"
-            "Example: `S01E` or `720p`\n\n"
+            f"{RULES_HELP}\n\n"
+            "Example:\n"
+            "`720p => 1080p`\n"
+            "`w:HD => FHD`\n"
+            "`re:@\\w+ => @MyChannel`\n\n"
             "(Or click Skip)",
             buttons=get_skip_keyboard(session_id)
         )
     
-    @bot_client.on(events.CallbackQuery(pattern=r'set_fcap_(.+)'))
-    async def set_caption_find_callback(event):
-        session_id = event.data.decode().split('_')[2]
+    @bot_client.on(events.CallbackQuery(pattern=r'rdel_(name|cap)_(\d+)_(.+)'))
+    async def delete_rule_callback(event):
+        _, target, index, session_id = event.data.decode().split('_', 3)
         if session_id not in config.active_sessions:
-            return await event.answer("❌ Session expired! Start over", alert=True)
+            return await event.answer("❌ Session expired!", alert=True)
         
-        config.active_sessions[session_id]['step'] = 'cap_find'
+        rules = editable_rules(config.active_sessions[session_id], target)
+        index = int(index)
+        if index < len(rules):
+            del rules[index]
+        # Stay on the page the rule was on
+        page = min(index, max(len(rules) - 1, 0)) // RULES_PER_PAGE
+        await event.answer("🗑️ Rule deleted!")
         await event.edit(
-            "💬 **Caption: Find Text**\n"
-            "━━━━━━━━━━━━━━━━━━━━\n\n"
-            "Type the text to FIND in captions:\n\n"
-            "Example: `@OldChannel`\n\n"
-            "(Or click Skip)",
-            buttons=get_skip_keyboard(session_id)
+            rules_text(target, rules), buttons=get_rules_keyboard(session_id, target, rules, page)
+        )
+    
+    @bot_client.on(events.CallbackQuery(pattern=r'rpage_(name|cap)_(\d+)_(.+)'))
+    async def rules_page_callback(event):
+        _, target, page, session_id = event.data.decode().split('_', 3)
+        if session_id not in config.active_sessions:
+            return await event.answer("❌ Session expired!", alert=True)
+        
+        rules = editable_rules(config.active_sessions[session_id], target)
+        await event.edit(
+            rules_text(target, rules), buttons=get_rules_keyboard(session_id, target, rules, int(page))
         )
     
+    @bot_client.on(events.CallbackQuery(pattern=r'rclr_(name|cap)_(.+)'))
+    async def clear_rules_callback(event):
+        _, target, session_id = event.data.decode().split('_', 2)
+        if session_id not in config.active_sessions:
+            return await event.answer("❌ Session expired!", alert=True)
+        
+        rules = editable_rules(config.active_sessions[session_id], target)
+        rules.clear()
+        await event.answer("🧹 Rules cleared!")
+        await event.edit(rules_text(target, rules), buttons=get_rules_keyboard(session_id, target, rules))
+    
     @bot_client.on(events.CallbackQuery(pattern=r'set_xcap_(.+)'))
     async def set_extra_caption_callback(event):
         session_id = event.data.decode().split('_')[2]
@@ -267,7 +408,8 @@ def register_handlers(user_client, bot_client):
             "2. Right-click on message\n"
             "3. Copy message link\n"
             "4. Do this for start & end messages\n"
-            "5. Send both with '-' between them"
+            "5. Send both with '-' between them\n\n"
+            "💡 `/plan link1 - link2` shows sizes and ETA before starting"
         )
     
     @bot_client.on(events.CallbackQuery(pattern=r'cancel_(.+)'))
@@ -278,70 +420,48 @@ def register_handlers(user_client, bot_client):
         await event.answer("❌ Cancelled!")
         await event.edit("❌ **Cancelled**\n\nUse `/clone` to start again.")
     
-    @bot_client.on(events.CallbackQuery(pattern=b'stop_transfer'))
+    @bot_client.on(events.CallbackQuery(pattern=r'stop_(.+)'))
     async def stop_transfer_callback(event):
-        if not config.is_running:
+        session_id = event.data.decode().split('_')[1]
+        if not scheduler.stop(session_id):
             return await event.answer("No transfer running!", alert=True)
         
-        config.stop_flag = True
-        config.is_running = False
         await event.answer("🛑 Stopping...", alert=True)
-        
-        if config.current_task and not config.current_task.done():
-            config.current_task.cancel()
     
     @bot_client.on(events.NewMessage())
     async def message_handler(event):
-        # Find active session
+        # Find the newest session still being set up
         session_id = None
         for sid, data in config.active_sessions.items():
-            if data['chat_id'] == event.chat_id:
+            if data['chat_id'] == event.chat_id and data.get('step') != 'running':
                 session_id = sid
-                break
         
-        if not session_id:
+        if not session_id or event.raw_text.startswith('/plan'):
             return
         
         session = config.active_sessions[session_id]
         step = session.get('step')
         
         # Handle steps
-        if step == 'fname_find':
-            session['settings']['find_name'] = event.text.strip()
-            session['step'] = 'fname_replace'
-            await event.respond(
-                f"✅ Find: `{event.text.strip()}`\n\n"
-                "Now type REPLACEMENT text:",
-                buttons=get_skip_keyboard(session_id)
-            )
-        
-        elif step == 'fname_replace':
-            session['settings']['replace_name'] = event.text.strip()
-            session['step'] = 'settings'
-            await event.respond(
-                "✅ **Filename rule set!**\n\n"
-                f"Find: `{session['settings']['find_name']}`\n"
-                f"Replace: `{event.text.strip()}`",
-                buttons=get_settings_keyboard(session_id)
-            )
-        
-        elif step == 'cap_find':
-            session['settings']['find_cap'] = event.text.strip()
-            session['step'] = 'cap_replace'
-            await event.respond(
-                f"✅ Find: `{event.text.strip()}`\n\n"
-                "Now type REPLACEMENT text:",
-                buttons=get_skip_keyboard(session_id)
-            )
-        
-        elif step == 'cap_replace':
-            session['settings']['replace_cap'] = event.text.strip()
+        if step in ('rules_name', 'rules_cap'):
+            target = step.split('_')[1]
+            try:
+                rules = editable_rules(session, target) + parse_rules(event.raw_text)
+                if len(rules) > MAX_RULES:
+                    raise ValueError(f"at most {MAX_RULES} rules")
+                # Rules must also compile together (e.g. no clashing group names)
+                compile_rules(rules)
+            except (ValueError, re.error) as e:
+                return await event.respond(
+                    f"❌ **Invalid rule:** `{e}`\n\nFix it and send again:",
+                    buttons=get_skip_keyboard(session_id)
+                )
+            
+            session['settings'][f'{target}_rules'] = rules
             session['step'] = 'settings'
             await event.respond(
-                "✅ **Caption rule set!**\n\n"
-                f"Find: `{session['settings']['find_cap']}`\n"
-                f"Replace: `{event.text.strip()}`",
-                buttons=get_settings_keyboard(session_id)
+                rules_text(target, rules),
+                buttons=get_rules_keyboard(session_id, target, rules)
             )
         
         elif step == 'extra_cap':
@@ -353,7 +473,7 @@ def register_handlers(user_client, bot_client):
                 buttons=get_settings_keyboard(session_id)
             )
         
-        elif step == 'range':
+        elif step in ('range', 'planned'):
             if "t.me" not in event.text:
                 return await event.respond(
                     "❌ Invalid format!\n\n"
@@ -361,34 +481,17 @@ def register_handlers(user_client, bot_client):
                 )
             
             try:
-                parts = event.text.strip().split("-")
-                if len(parts) != 2:
-                    raise ValueError("Need exactly 2 links separated by -")
-                
-                msg1 = int(parts[0].strip().split("/")[-1])
-                msg2 = int(parts[1].strip().split("/")[-1])
+                msg1, msg2 = parse_range(event.text)
                 
-                if msg1 > msg2: 
-                    msg1, msg2 = msg2, msg1
-                
-                if msg1 == msg2:
-                    return await event.respond("❌ Start and end must be different!")
-                
-                # Start transfer
-                config.is_running = True
-                config.stop_flag = False
-                config.current_task = asyncio.create_task(
-                    transfer_process(
-                        event, 
-                        user_client,
-                        bot_client,
-                        session['source'], 
-                        session['dest'], 
-                        msg1, 
-                        msg2,
-                        session_id
-                    )
-                )
+                # Queue transfer; it starts as soon as a slot is free
+                session.pop('plan', None)
+                session['step'] = 'running'
+                position = scheduler.submit(Job(
+                    session_id, event.chat_id, session['source'], session['dest'],
+                    msg1, msg2, event
+                ))
+                if position:
+                    await event.respond(queued_text(position))
                 
             except Exception as e: 
                 config.logger.error(f"Range parse error: {e}")
@@ -399,31 +502,122 @@ def register_handlers(user_client, bot_client):
                     f"Error: `{str(e)}`"
                 )
     
+    @bot_client.on(events.NewMessage(pattern='/plan'))
+    async def plan_handler(event):
+        # Plans the newest session waiting for its range
+        session_id = None
+        for sid, data in config.active_sessions.items():
+            if data['chat_id'] == event.chat_id and data.get('step') in ('range', 'planned'):
+                session_id = sid
+        if not session_id:
+            return await event.respond(
+                "⚠️ **Nothing to plan**\n\n"
+                "Set up a transfer with `/clone`, then send\n"
+                "`/plan link1 - link2` instead of the range."
+            )
+        
+        session = config.active_sessions[session_id]
+        try:
+            args = event.text.split(None, 1)
+            if len(args) < 2:
+                raise ValueError("Need two message links")
+            start, end = parse_range(args[1])
+        except ValueError as e:
+            return await event.respond(
+                f"❌ **Invalid Format**\n\n"
+                f"Expected:\n"
+                f"`/plan https://t.me/c/xxx/10 - https://t.me/c/xxx/20`\n\n"
+                f"Error: `{str(e)}`"
+            )
+        
+        status = await event.respond(f"🗺️ **Planning** `{start}` → `{end}`...")
+        try:
+            manifest = await build_manifest(
+                user_client, session['source'], start, end, session['settings']
+            )
+        except Exception as e:
+            config.logger.error(f"Plan failed: {e}")
+            return await status.edit(f"❌ **Plan failed:** `{str(e)[:100]}`")
+        
+        # Kept until started, so the transfer does not scan the range again
+        session['plan'] = manifest
+        session['step'] = 'planned'
+        await status.edit(manifest.describe(plan_speed()), buttons=get_plan_keyboard(session_id))
+    
+    @bot_client.on(events.CallbackQuery(pattern=r'runplan_(.+)'))
+    async def run_plan_callback(event):
+        session_id = event.data.decode().split('_')[1]
+        session = config.active_sessions.get(session_id)
+        if not session or 'plan' not in session:
+            return await event.answer("❌ Session expired!", alert=True)
+        
+        manifest = session.pop('plan')
+        session['step'] = 'running'
+        await event.answer("🚀 Starting...")
+        position = scheduler.submit(Job(
+            session_id, event.chat_id, session['source'], session['dest'],
+            manifest.start, manifest.end, None, manifest
+        ))
+        if position:
+            await event.respond(queued_text(position))
+    
     @bot_client.on(events.NewMessage(pattern='/stats'))
     async def stats_handler(event):
-        await event.respond(
-            f"📊 **Bot Statistics**\n"
-            f"━━━━━━━━━━━━━━━━━━━━\n"
-            f"⚡ Chunk: **8MB**\n"
-            f"💾 Buffer: **16MB** (8MB × 2)\n"
-            f"📤 Upload: **8MB parts**\n"
-            f"🔄 Retries: **{config.MAX_RETRIES}**\n"
-            f"━━━━━━━━━━━━━━━━━━━━\n"
-            f"Status: **{'🟢 Running' if config.is_running else '🔴 Idle'}**\n"
-            f"Sessions: **{len(config.active_sessions)}**"
-        )
+        await event.respond(stats_text())
+    
+    @bot_client.on(events.NewMessage(pattern='/resume'))
+    async def resume_handler(event):
+        sessions = {
+            sid: state for sid, state in journal.load().items()
+            if state['chat_id'] == event.chat_id and sid not in scheduler.jobs
+        }
+        if not sessions:
+            return await event.respond("✅ Nothing to resume!")
+        
+        # `/resume abcd` picks a session by id prefix, default is the newest
+        args = event.text.split()
+        if len(args) > 1:
+            matches = [sid for sid in sessions if sid.startswith(args[1])]
+            if not matches:
+                listing = "\n".join(
+                    f"`{sid[:8]}` {state['source']} → {state['dest']} "
+                    f"(next msg {state['last'] + 1}/{state['end']})"
+                    for sid, state in sessions.items()
+                )
+                return await event.respond(f"❌ No such session!\n\n{listing}")
+            session_id = matches[0]
+        else:
+            session_id = max(sessions, key=lambda sid: sessions[sid]['time'])
+        
+        position = resume_session(session_id, sessions[session_id], event)
+        if position:
+            await event.respond(queued_text(position))
     
     @bot_client.on(events.NewMessage(pattern='/stop'))
     async def stop_handler(event):
-        if not config.is_running:
+        # `/stop abcd` stops one job by id prefix, plain `/stop` all of yours
+        args = event.text.split()
+        jobs = scheduler.find(event.chat_id, args[1] if len(args) > 1 else "")
+        if not jobs:
             return await event.respond("⚠️ No transfer to stop!")
         
-        config.stop_flag = True
-        config.is_running = False
-        
-        if config.current_task and not config.current_task.done():
-            config.current_task.cancel()
+        for job in jobs:
+            scheduler.stop(job.id)
         
-        await event.respond("🛑 **Stopping...**\n\nPlease wait...")
+        await event.respond(
+            f"🛑 **Stopping {len(jobs)} transfer(s)...**\n\nPlease wait..."
+        )
+    
+    @bot_client.on(events.NewMessage(pattern='/status'))
+    async def status_handler(event):
+        jobs = scheduler.find(event.chat_id)
+        listing = "\n".join(job.describe() for job in jobs) or "No transfers queued."
+        await event.respond(
+            f"📋 **Your Transfers**\n"
+            f"━━━━━━━━━━━━━━━━━━━━\n"
+            f"{listing}\n"
+            f"━━━━━━━━━━━━━━━━━━━━\n"
+            f"{scheduler.describe()}"
+        )
     
     config.logger.info("✅ All handlers registered!")
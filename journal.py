@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import time
+import config
+
+class TransferJournal:
+    """
+    Append-only JSON-lines log of transfer sessions. Each session records
+    its parameters once, then the id of every message it finishes, so a
+    restarted process can continue from the next message.
+    Entry states: 'running' (resumable), 'stopped' (resumable on request),
+    'done' (finished, dropped on compaction).
+    The file stays open; every record is flushed to the OS right away,
+    but fsync runs in a thread at most every JOURNAL_SYNC_SECONDS, and
+    at once for session starts and ends.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._dirty = False
+        self._sync_task = None
+
+    def _append(self, record, sync=False):
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._dirty = True
+            if sync:
+                self._sync()
+            else:
+                self._sync_soon()
+        except OSError as e:
+            config.logger.warning(f"Journal write failed: {e}")
+
+    def _sync(self):
+        # Covers whatever a deferred sync was waiting for
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        if self._dirty and self._file is not None:
+            self._dirty = False
+            os.fsync(self._file.fileno())
+
+    def _sync_soon(self):
+        if self._sync_task is not None and not self._sync_task.done():
+            return
+        try:
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync_later())
+        except RuntimeError:
+            # No event loop to defer to
+            self._sync()
+
+    async def _sync_later(self):
+        await asyncio.sleep(config.JOURNAL_SYNC_SECONDS)
+        if self._dirty and self._file is not None:
+            self._dirty = False
+            try:
+                await asyncio.to_thread(os.fsync, self._file.fileno())
+            except (OSError, ValueError) as e:
+                config.logger.warning(f"Journal sync failed: {e}")
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._sync()
+            except OSError as e:
+                config.logger.warning(f"Journal sync failed: {e}")
+            self._file.close()
+            self._file = None
+
+    def start(self, session_id, session, start_msg, end_msg):
+        self._append({
+            'event': 'start',
+            'session': session_id,
+            'source': session['source'],
+            'dest': session['dest'],
+            'chat_id': session['chat_id'],
+            'settings': session.get('settings', {}),
+            'start': start_msg,
+            'end': end_msg,
+            'time': time.time()
+        }, sync=True)
+
+    def progress(self, session_id, msg_id):
+        self._append({'event': 'msg', 'session': session_id, 'id': msg_id})
+
+    def finish(self, session_id, state):
+        self._append({'event': state, 'session': session_id}, sync=True)
+
+    def load(self):
+        """Replay the log into {session_id: state} for unfinished sessions"""
+        sessions = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn last line from a crash mid-write
+                        continue
+
+                    sid = record.get('session')
+                    if record['event'] == 'start':
+                        sessions[sid] = dict(record, last=record['start'] - 1, state='running')
+                    elif sid in sessions:
+                        if record['event'] == 'msg':
+                            sessions[sid]['last'] = max(sessions[sid]['last'], record['id'])
+                        else:
+                            sessions[sid]['state'] = record['event']
+
+        except FileNotFoundError:
+            pass
+
+        return {
+            sid: state for sid, state in sessions.items()
+            if state['state'] != 'done' and state['last'] < state['end']
+        }
+
+    def compact(self):
+        """Rewrite the log keeping only resumable sessions"""
+        # The open handle would keep appending to the replaced file
+        self.close()
+        sessions = self.load()
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w') as f:
+                for sid, state in sessions.items():
+                    record = {k: v for k, v in state.items() if k not in ('last', 'state')}
+                    f.write(json.dumps(record) + "\n")
+                    if state['last'] >= state['start']:
+                        f.write(json.dumps({'event': 'msg', 'session': sid, 'id': state['last']}) + "\n")
+                    if state['state'] != 'running':
+                        f.write(json.dumps({'event': state['state'], 'session': sid}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            config.logger.warning(f"Journal compaction failed: {e}")
+        return sessions
+
+journal = TransferJournal(config.JOURNAL_PATH)
@@ -1,13 +1,17 @@
 from telethon import Button
+from rules import describe, session_rules
+
+RULE_TARGETS = {'name': "📝 Filename", 'cap': "💬 Caption"}
+RULES_PER_PAGE = 20
 
 def get_settings_keyboard(session_id):
     """Main settings keyboard for file manipulation"""
     return [
         [
-            Button.inline("📝 Filename: Find & Replace", f"set_fname_{session_id}"),
+            Button.inline("📝 Filename Rules", f"rules_name_{session_id}"),
         ],
         [
-            Button.inline("💬 Caption: Find & Replace", f"set_fcap_{session_id}"),
+            Button.inline("💬 Caption Rules", f"rules_cap_{session_id}"),
         ],
         [
             Button.inline("➕ Add Extra Caption", f"set_xcap_{session_id}"),
@@ -22,16 +26,19 @@ def get_confirm_keyboard(session_id, settings):
     """Show current settings and confirm"""
     settings_text = "**Current Settings:**\n\n"
     
-    if settings.get('find_name'):
-        settings_text += f"📝 Filename:\n`{settings['find_name']}` → `{settings.get('replace_name', '')}`\n\n"
-    
-    if settings.get('find_cap'):
-        settings_text += f"💬 Caption:\n`{settings['find_cap']}` → `{settings.get('replace_cap', '')}`\n\n"
+    for target, label in RULE_TARGETS.items():
+        rules = session_rules(settings, target)
+        if rules:
+            settings_text += f"{label}: {len(rules)} rules\n"
+            settings_text += "".join(f"`{describe(rule)[:60]}`\n" for rule in rules[:5])
+            if len(rules) > 5:
+                settings_text += f"… and {len(rules) - 5} more\n"
+            settings_text += "\n"
     
     if settings.get('extra_cap'):
         settings_text += f"➕ Extra Caption:\n`{settings['extra_cap'][:50]}...`\n\n"
     
-    if not any([settings.get('find_name'), settings.get('find_cap'), settings.get('extra_cap')]):
+    if not any([session_rules(settings, 'name'), session_rules(settings, 'cap'), settings.get('extra_cap')]):
         settings_text += "⚠️ No modifications set\n\n"
     
     return settings_text, [
@@ -45,6 +52,33 @@ def get_confirm_keyboard(session_id, settings):
         ]
     ]
 
+def get_rules_keyboard(session_id, target, rules, page=0):
+    """
+    Rules for `target` ('name' or 'cap'): tap a rule to delete it. Shown
+    RULES_PER_PAGE at a time to stay under Telegram's button limit.
+    """
+    pages = max(1, -(-len(rules) // RULES_PER_PAGE))
+    page = min(max(page, 0), pages - 1)
+    first = page * RULES_PER_PAGE
+    rows = [
+        [Button.inline(f"🗑️ {index + 1}. {describe(rule)[:40]}", f"rdel_{target}_{index}_{session_id}")]
+        for index, rule in enumerate(rules[first:first + RULES_PER_PAGE], first)
+    ]
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(Button.inline("◀️ Prev", f"rpage_{target}_{page - 1}_{session_id}"))
+        nav.append(Button.inline(f"📄 {page + 1}/{pages}", f"rpage_{target}_{page}_{session_id}"))
+        if page < pages - 1:
+            nav.append(Button.inline("Next ▶️", f"rpage_{target}_{page + 1}_{session_id}"))
+        rows.append(nav)
+    rows.append([
+        Button.inline("➕ Add Rules", f"radd_{target}_{session_id}"),
+        Button.inline("🧹 Clear Rules", f"rclr_{target}_{session_id}")
+    ])
+    rows.append([Button.inline("🔙 Back to Settings", f"back_{session_id}")])
+    return rows
+
 def get_skip_keyboard(session_id):
     """Skip option keyboard"""
     return [
@@ -52,10 +86,17 @@ def get_skip_keyboard(session_id):
         [Button.inline("❌ Cancel", f"cancel_{session_id}")]
     ]
 
-def get_progress_keyboard():
+def get_plan_keyboard(session_id):
+    """Start a planned transfer or drop the plan"""
+    return [
+        [Button.inline("🚀 Start Transfer", f"runplan_{session_id}")],
+        [Button.inline("❌ Cancel", f"cancel_{session_id}")]
+    ]
+
+def get_progress_keyboard(session_id):
     """Keyboard during transfer"""
     return [
-        [Button.inline("🛑 Stop Transfer", "stop_transfer")]
+        [Button.inline("🛑 Stop Transfer", f"stop_{session_id}")]
     ]
 
 def get_clone_info_keyboard():
@@ -12,7 +12,13 @@ from telethon.network import connection
 from aiohttp import web
 
 import config
-from handlers import register_handlers
+from handlers import register_handlers, resume_session
+from journal import journal
+from metrics import metrics
+from senders import sender_pool
+from bots import bot_pool
+from accounts import account_pool
+from ratelimit import limiter
 
 # --- EXTREME CLIENT SETUP ---
 user_client = TelegramClient(
@@ -27,17 +33,40 @@ user_client = TelegramClient(
     auto_reconnect=True
 )
 
-bot_client = TelegramClient(
-    'bot_session', 
-    config.API_ID, 
-    config.API_HASH,
-    connection=connection.ConnectionTcpFull,
-    use_ipv6=False,
-    connection_retries=None,
-    flood_sleep_threshold=120,
-    request_retries=20,
-    auto_reconnect=True
-)
+def make_bot_client(session_name):
+    return TelegramClient(
+        session_name, 
+        config.API_ID, 
+        config.API_HASH,
+        connection=connection.ConnectionTcpFull,
+        use_ipv6=False,
+        connection_retries=None,
+        flood_sleep_threshold=120,
+        request_retries=20,
+        auto_reconnect=True
+    )
+
+bot_client = make_bot_client('bot_session')
+
+# Extra upload bots from BOT_TOKENS
+extra_bots = [make_bot_client(f'bot_session_{i}') for i in range(1, len(config.BOT_TOKENS) + 1)]
+
+# Extra download accounts from DOWNLOAD_SESSIONS. FloodWaits are not
+# slept through here so the account pool can move ranges elsewhere.
+download_clients = [
+    TelegramClient(
+        StringSession(session),
+        config.API_ID,
+        config.API_HASH,
+        connection=connection.ConnectionTcpFull,
+        use_ipv6=False,
+        connection_retries=None,
+        flood_sleep_threshold=0,
+        request_retries=20,
+        auto_reconnect=True
+    )
+    for session in config.DOWNLOAD_SESSIONS
+]
 
 # --- WEB SERVER ---
 async def handle(request):
@@ -45,15 +74,41 @@ async def handle(request):
         text="🔥 EXTREME MODE v2.0 - 32MB×5 Active | File Manipulation Enabled"
     )
 
+async def handle_metrics(request):
+    return web.Response(
+        text=metrics.render(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
 async def start_web_server():
     app = web.Application()
     app.router.add_get('/', handle)
+    app.router.add_get('/metrics', handle_metrics)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', config.PORT)
     await site.start()
     config.logger.info(f"⚡ EXTREME MODE Web Server - Port {config.PORT}")
 
+# --- RESUME ---
+async def auto_resume():
+    """Re-queue every journaled transfer that was still running"""
+    pending = journal.compact()
+    running = {sid: state for sid, state in pending.items() if state['state'] == 'running'}
+    
+    # Oldest first, so the scheduler keeps their original order per user
+    for session_id in sorted(running, key=lambda sid: running[sid]['time']):
+        state = running[session_id]
+        try:
+            await bot_client.send_message(
+                state['chat_id'],
+                "♻️ **Bot restarted - resuming transfer...**"
+            )
+        except Exception as e:
+            config.logger.warning(f"Resume notice failed: {e}")
+        
+        resume_session(session_id, state)
+
 # --- MAIN ---
 if __name__ == '__main__':
     loop = asyncio.get_event_loop()
@@ -71,13 +126,35 @@ if __name__ == '__main__':
     # Start clients
     user_client.start()
     bot_client.start(bot_token=config.BOT_TOKEN)
+    for client, token in zip(extra_bots, config.BOT_TOKENS):
+        client.start(bot_token=token)
+    bot_pool.bind([(bot_client, config.BOT_TOKEN), *zip(extra_bots, config.BOT_TOKENS)])
+    for client in download_clients:
+        client.start()
+    account_pool.bind([user_client, *download_clients])
+    
+    # Every request of every client is paced by the shared rate limiter,
+    # which reports the FloodWaits it absorbs back to the client's pool
+    for client in (bot_client, *extra_bots):
+        limiter.install(client, bot_pool.limiter_flood)
+    for client in (user_client, *download_clients):
+        limiter.install(client, account_pool.limiter_flood)
     
     # Register all handlers
     register_handlers(user_client, bot_client)
     
+    # Foreign-DC downloads share pre-authorized senders
+    sender_pool.bind(user_client)
+    if config.SENDER_WARM_DCS:
+        loop.create_task(sender_pool.warm(config.SENDER_WARM_DCS))
+    
     # Start web server
     loop.create_task(start_web_server())
     
+    # Continue transfers interrupted by a restart
+    if config.AUTO_RESUME:
+        loop.create_task(auto_resume())
+    
     config.logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
     config.logger.info("✅ EXTREME MODE Active!")
     config.logger.info("🔥 Bot is ready for transfers!")
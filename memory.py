@@ -0,0 +1,80 @@
+import asyncio
+from collections import deque
+import config
+from utils import human_readable_size
+
+class ByteBudget:
+    """
+    Process-wide async semaphore counted in bytes. Buffers reserve what
+    they are about to allocate and release it once the data is handed
+    on, so producers slow down when memory is short instead of the
+    process getting OOM-killed. Waiters are served in FIFO order.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.reserved = 0
+        self.peak = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _grant(self, size):
+        self.reserved += size
+        self.peak = max(self.peak, self.reserved)
+
+    async def acquire(self, size):
+        """Reserve `size` bytes, waiting until they fit. Returns the amount reserved."""
+        # A single reservation larger than the budget could never fit
+        size = min(size, self.capacity)
+
+        if not self._waiters and self.reserved + size <= self.capacity:
+            self._grant(size)
+            return size
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (size, future)
+        self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled - hand it back
+                self.release(size)
+            else:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()
+            raise
+        return size
+
+    def try_acquire(self, size):
+        """Reserve `size` bytes only if they fit right now"""
+        if self._waiters or self.reserved + size > self.capacity:
+            return False
+        self._grant(size)
+        return True
+
+    def release(self, size):
+        self.reserved = max(0, self.reserved - size)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            size, future = self._waiters[0]
+            if self.reserved + size > self.capacity:
+                break
+            self._waiters.popleft()
+            if not future.done():
+                self._grant(size)
+                future.set_result(None)
+
+    def describe(self):
+        return (
+            f"🧮 Memory budget: `{human_readable_size(self.reserved)}` / "
+            f"`{human_readable_size(self.capacity)}` reserved "
+            f"(peak `{human_readable_size(self.peak)}`, {self.waiting} waiting)"
+        )
+
+budget = ByteBudget(config.MEMORY_BUDGET_BYTES)
@@ -0,0 +1,138 @@
+import bisect
+import config
+from utils import current_rss
+from memory import budget
+from scheduler import scheduler
+
+def _labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+class Counter:
+    """Monotonic counter; one value per label combination"""
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.items())
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_labels(key)} {value}"
+
+class Gauge:
+    """Value read from `fn` at scrape time, so nothing is paid on the hot path"""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        yield f"{self.name} {self.fn()}"
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions"""
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = sorted(buckets)
+        self.series = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.items())
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_labels(key + (('le', le),))} {cumulative}"
+            yield f"{self.name}_sum{_labels(key)} {series[-2]}"
+            yield f"{self.name}_count{_labels(key)} {series[-1]}"
+
+class Metrics:
+    """
+    Process-wide transfer metrics, rendered in Prometheus text format
+    for GET /metrics. Recording is plain dict arithmetic with no locks
+    (everything runs on one event loop), so it stays on in production.
+    """
+    def __init__(self):
+        self.streams = set()  # live ExtremeBufferedStreams, for queue depth
+
+        self.bytes_downloaded = Counter(
+            "tgbot_downloaded_bytes_total", "Bytes downloaded from the source")
+        self.bytes_uploaded = Counter(
+            "tgbot_uploaded_bytes_total", "Bytes uploaded as file parts")
+        self.throughput = Histogram(
+            "tgbot_file_throughput_bytes_per_second",
+            "Per-file throughput by direction",
+            [2 ** n * 1024 for n in range(6, 17)])  # 64KB/s .. 64MB/s
+        self.stage = Histogram(
+            "tgbot_stage_seconds",
+            "Latency of enumerate, thumbnail, first_byte, upload and post stages",
+            [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300])
+        self.floodwaits = Counter(
+            "tgbot_floodwait_total", "FloodWait errors received")
+        self.floodwait_seconds = Counter(
+            "tgbot_floodwait_seconds_total", "Seconds Telegram asked us to wait")
+        self.retries = Counter(
+            "tgbot_retries_total", "Requests retried after an error")
+        self.paced_seconds = Counter(
+            "tgbot_rate_limited_seconds_total", "Seconds requests waited in the rate limiter")
+
+        self.all = [
+            self.bytes_downloaded, self.bytes_uploaded, self.throughput, self.stage,
+            self.floodwaits, self.floodwait_seconds, self.retries, self.paced_seconds,
+            Gauge("tgbot_stream_queue_depth",
+                  "Downloaded chunks waiting in stream queues",
+                  self.queue_depth),
+            Gauge("tgbot_memory_budget_reserved_bytes",
+                  "Bytes reserved from the global memory budget",
+                  lambda: budget.reserved),
+            Gauge("tgbot_jobs_running", "Transfers running",
+                  lambda: len(scheduler.running)),
+            Gauge("tgbot_jobs_queued", "Transfers waiting for a slot",
+                  lambda: sum(len(q) for q in scheduler.queues.values())),
+            Gauge("process_resident_memory_bytes", "Resident set size",
+                  current_rss),
+        ]
+
+    def queue_depth(self):
+        return sum(
+            stream.queue.qsize() + sum(lane.qsize() for lane in stream.lanes)
+            for stream in self.streams
+        )
+
+    def floodwait(self, seconds, where):
+        self.floodwaits.inc(where=where)
+        self.floodwait_seconds.inc(seconds, where=where)
+
+    def render(self):
+        lines = []
+        for metric in self.all:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                config.logger.debug(f"Metric {metric.name} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
@@ -0,0 +1,132 @@
+from utils import (
+    human_readable_size, time_formatter,
+    get_target_info, apply_filename_manipulations, sanitize_filename
+)
+
+# Media kinds in the order a plan lists them
+KINDS = {'video': '🎬', 'photo': '🖼️', 'audio': '🎵', 'document': '📄', 'text': '💬'}
+
+class ManifestEntry:
+    """What a transfer needs to know about one message, without the message"""
+    __slots__ = ('id', 'kind', 'size', 'dc', 'grouped_id', 'file_name')
+
+    def __init__(self, id, kind, size, dc, grouped_id, file_name):
+        self.id = id
+        self.kind = kind
+        self.size = size
+        self.dc = dc
+        self.grouped_id = grouped_id
+        self.file_name = file_name
+
+def entry_for(message, settings):
+    """
+    The manifest entry for a message, or None if the transfer would send
+    nothing for it. Follows prepare_message: same text/media split, same
+    final filename.
+    """
+    if getattr(message, 'action', None):
+        return None
+
+    grouped_id = getattr(message, 'grouped_id', None)
+    if not message.media or not message.file:
+        if message.text:
+            return ManifestEntry(message.id, 'text', 0, 0, grouped_id, None)
+        return None
+
+    file_name, mime_type, is_video_mode = get_target_info(message)
+    if not file_name:
+        return None
+    file_name = sanitize_filename(apply_filename_manipulations(file_name, settings))
+
+    if is_video_mode:
+        kind = 'video'
+    elif message.photo or mime_type.startswith('image/'):
+        kind = 'photo'
+    elif (message.file.mime_type or '').startswith('audio/'):
+        kind = 'audio'
+    else:
+        kind = 'document'
+
+    media = message.document or message.photo
+    return ManifestEntry(
+        message.id, kind, message.file.size or 0, getattr(media, 'dc_id', 0) or 0,
+        grouped_id, file_name
+    )
+
+class Manifest:
+    """
+    Metadata-only plan of a message range: one ManifestEntry per message
+    worth sending, in id order, plus running totals. Built up front by
+    `/plan`, whose transfer then fetches only these ids as it goes, or
+    filled in by a transfer while it streams the range.
+    """
+    def __init__(self, source_id, start, end):
+        self.source_id = source_id
+        self.start = start
+        self.end = end
+        self.entries = []
+        self.total_bytes = 0
+        self.kinds = {}  # kind -> [count, bytes]
+        self.dcs = {}  # dc id -> [count, bytes]
+        self.albums = set()
+        self.largest = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self.total_bytes += entry.size
+        for totals, key in ((self.kinds, entry.kind), (self.dcs, entry.dc)):
+            counted = totals.setdefault(key, [0, 0])
+            counted[0] += 1
+            counted[1] += entry.size
+        if entry.grouped_id:
+            self.albums.add(entry.grouped_id)
+        if entry.size and (self.largest is None or entry.size > self.largest.size):
+            self.largest = entry
+
+    def ids(self):
+        return [entry.id for entry in self.entries]
+
+    def describe(self, speed):
+        """The plan for the user; `speed` is recent throughput in bytes/s, or 0"""
+        scanned = self.end - self.start + 1
+        lines = [
+            "🗺️ **Transfer Plan**",
+            "━━━━━━━━━━━━━━━━━━━━",
+            f"📍 Range: `{self.start}` → `{self.end}`",
+            f"📋 To send: **{len(self)}** of {scanned} ids "
+            f"({scanned - len(self)} empty, deleted or service)",
+            f"📦 Total: **{human_readable_size(self.total_bytes)}**",
+            "━━━━━━━━━━━━━━━━━━━━",
+        ]
+        for kind, emoji in KINDS.items():
+            if kind in self.kinds:
+                count, size = self.kinds[kind]
+                lines.append(f"{emoji} {kind.title()}: **{count}** ({human_readable_size(size)})")
+        if self.albums:
+            lines.append(f"🗂️ Albums: **{len(self.albums)}**")
+
+        files = {dc: totals for dc, totals in self.dcs.items() if dc}
+        if files:
+            lines.append("🌐 **Per DC:**")
+            for dc, (count, size) in sorted(files.items()):
+                lines.append(f"• DC{dc}: **{count}** files, {human_readable_size(size)}")
+        if self.largest:
+            lines.append(
+                f"🐘 Largest: `{self.largest.file_name[:30]}` "
+                f"({human_readable_size(self.largest.size)})"
+            )
+
+        lines.append("━━━━━━━━━━━━━━━━━━━━")
+        if not self.total_bytes:
+            lines.append("⏱️ ETA: `no files to transfer`")
+        elif speed > 0:
+            lines.append(
+                f"⏱️ ETA: `{time_formatter(self.total_bytes / speed)}` "
+                f"at `{human_readable_size(speed)}/s`"
+            )
+        else:
+            lines.append("⏱️ ETA: `unknown until a file has been transferred`")
+        return "\n".join(lines)
@@ -0,0 +1,130 @@
+import asyncio
+import time
+import math
+from telethon import errors
+import config
+from utils import human_readable_size, time_formatter
+from keyboards import get_progress_keyboard
+from metrics import metrics
+import tracing
+
+class ProgressReporter:
+    """
+    One background task per transfer that owns the status message.
+    Streams and pipeline stages only update plain attributes; the reporter
+    samples them, renders, and edits the message only when the text has
+    changed and UPDATE_INTERVAL has passed. FloodWait on edits pushes the
+    next edit back instead of stalling any transfer.
+    """
+    def __init__(self, status_msg, stats, total, session_id):
+        self.status_msg = status_msg
+        self.stats = stats
+        self.total = total
+        self.session_id = session_id
+        self.position = 0
+        self.total_bytes = 0  # From the manifest; grows while it is built
+        self.total_final = False  # Planned up front, so total_bytes is complete
+        self.bytes_done = 0
+        self.started = time.time()
+        self.streams = []
+        self.note = ""
+
+        self._task = None
+        self._last_text = None
+        self._last_edit = 0
+        self._resume_at = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def track(self, stream):
+        if stream not in self.streams:
+            self.streams.append(stream)
+
+    def untrack(self, stream):
+        if stream in self.streams:
+            self.streams.remove(stream)
+
+    def render(self):
+        now = time.time()
+        lines = ["📦 **Transferring...**"]
+
+        for stream in self.streams:
+            current, total = stream.current_bytes, stream.file_size
+            percentage = current * 100 / total if total > 0 else 0
+            elapsed = now - stream.start_time
+            speed = current / elapsed if elapsed > 0 else 0
+            eta = (total - current) / speed if speed > 0 else 0
+
+            filled = math.floor(percentage / 10)
+            bar = "█" * filled + "░" * (10 - filled)
+            lines.append(
+                f"📂 `{stream.name[:30]}...`\n"
+                f"**{bar} {round(percentage, 1)}%**\n"
+                f"⚡ `{human_readable_size(speed)}/s` | ETA: `{time_formatter(eta)}`\n"
+                f"💾 `{human_readable_size(current)} / {human_readable_size(total)}`"
+            )
+
+        lines.append(
+            f"📊 Progress: {self.position}/{self.total}\n"
+            f"✅ Success: {self.stats['success']} | ⏭️ Skip: {self.stats['skipped']}"
+        )
+        if self.total_bytes:
+            elapsed = now - self.started
+            speed = self.bytes_done / elapsed if elapsed > 0 else 0
+            if self.total_final:
+                eta = (self.total_bytes - self.bytes_done) / speed if speed > 0 else None
+                tail = f"ETA: `{time_formatter(eta)}`"
+            else:
+                tail = f"⚡ `{human_readable_size(speed)}/s`"
+            lines.append(
+                f"🗺️ Overall: `{human_readable_size(self.bytes_done)} / "
+                f"{human_readable_size(self.total_bytes)}{'' if self.total_final else '+'}` | {tail}"
+            )
+        if self.note:
+            lines.append(self.note)
+        return "\n".join(lines)
+
+    async def _edit(self, text, buttons):
+        try:
+            with tracing.span('status edit', tid=tracing.STATUS_TID):
+                await self.status_msg.edit(text, buttons=buttons)
+            self._last_text = text
+            self._last_edit = time.time()
+
+        except errors.MessageNotModifiedError:
+            self._last_text = text
+
+        except errors.FloodWaitError as e:
+            config.logger.warning(f"⏳ Status edit FloodWait {e.seconds}s")
+            metrics.floodwait(e.seconds, 'status_edit')
+            self._resume_at = time.time() + e.seconds
+
+        except Exception as e:
+            config.logger.debug(f"Progress update failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(1)
+            now = time.time()
+            if now < self._resume_at or now - self._last_edit < config.UPDATE_INTERVAL:
+                continue
+
+            text = self.render()
+            if text != self._last_text:
+                await self._edit(text, get_progress_keyboard(self.session_id))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def finish(self, text):
+        """Stop sampling and replace the status with a final message"""
+        self.stop()
+
+        # The final summary matters, so wait out a pending FloodWait
+        delay = self._resume_at - time.time()
+        if delay > 0:
+            await asyncio.sleep(min(delay, config.FLOOD_SLEEP_THRESHOLD))
+        await self._edit(text, None)
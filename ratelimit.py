@@ -0,0 +1,141 @@
+import asyncio
+import time
+from telethon import errors, utils
+import config
+from metrics import metrics
+
+class _Bucket:
+    """Token bucket whose rate is learned from the FloodWaits it causes"""
+    __slots__ = ('base', 'rate', 'tokens', 'stamp', 'blocked_until', 'floods')
+
+    def __init__(self, rate):
+        self.base = rate
+        self.rate = rate
+        self.tokens = max(1.0, rate)
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+        self.floods = 0
+
+    def delay(self, now):
+        """Seconds until a request may go out (0 = now)"""
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def success(self):
+        if self.rate < self.base:
+            self.rate = min(self.base, self.rate + self.base * config.RATE_RECOVERY)
+
+    def flood(self, seconds, backoff):
+        self.floods += 1
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.rate = max(config.RATE_MIN_PER_SECOND, self.rate * backoff)
+
+class RateLimiter:
+    """
+    Paces every request a client sends. Each request takes a token from
+    its client's bucket and from the (client, method) bucket; a FloodWait
+    blocks that method until the wait is over and lowers its rate, so the
+    next calls are spread out instead of hitting the limit again. Waits
+    up to the client's flood_sleep_threshold are retried here, after the
+    bucket has learned from them; longer ones reach the caller. A client's
+    pool is told about every wait retried here, so it can still cool the
+    account down or have the caller move the work elsewhere.
+    """
+    def __init__(self):
+        self.buckets = {}  # (client, method or None) -> _Bucket
+
+    def _bucket(self, client, method):
+        key = (client, method)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if method is None:
+                rate = config.RATE_CLIENT_PER_SECOND
+            else:
+                rate = config.RATE_METHODS.get(method, config.RATE_METHOD_PER_SECOND)
+            bucket = self.buckets[key] = _Bucket(rate)
+        return bucket
+
+    async def acquire(self, client, method):
+        """Wait until both of the request's buckets have a token"""
+        buckets = (self._bucket(client, None), self._bucket(client, method))
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            delay = max(bucket.delay(now) for bucket in buckets)
+            if delay <= 0:
+                for bucket in buckets:
+                    bucket.take()
+                if waited:
+                    metrics.paced_seconds.inc(waited, method=method)
+                return
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def success(self, client, method):
+        self._bucket(client, method).success()
+        self._bucket(client, None).success()
+
+    def flood(self, client, method, seconds):
+        """Learn from a FloodWait on `method`"""
+        self._bucket(client, method).flood(seconds, config.RATE_BACKOFF)
+        # The account as a whole slows down only a little
+        self._bucket(client, None).flood(0, (1 + config.RATE_BACKOFF) / 2)
+
+    def install(self, client, on_flood=None):
+        """
+        Route every request `client` sends through the limiter.
+        `on_flood(client, method, seconds)` is called for each FloodWait
+        about to be slept through; if it returns True the error is raised
+        to the caller instead.
+        """
+        if not config.RATE_LIMITER_ENABLED:
+            return client
+        call = client._call
+
+        async def paced_call(sender, request, ordered=False, flood_sleep_threshold=None):
+            first = request[0] if utils.is_list_like(request) else request
+            method = type(first).__name__
+            if flood_sleep_threshold is None:
+                flood_sleep_threshold = client.flood_sleep_threshold
+
+            while True:
+                await self.acquire(client, method)
+                try:
+                    result = await call(sender, request, ordered, flood_sleep_threshold=0)
+                except errors.FloodWaitError as e:
+                    self.flood(client, method, e.seconds)
+                    if e.seconds > flood_sleep_threshold:
+                        raise
+                    if on_flood and on_flood(client, method, e.seconds):
+                        raise
+                    config.logger.info(f"⏳ {method} FloodWait {e.seconds}s, pacing")
+                    metrics.floodwait(e.seconds, method)
+                    continue
+                self.success(client, method)
+                return result
+
+        client._call = paced_call
+        return client
+
+    def describe(self):
+        slowed = [
+            (method, bucket) for (_, method), bucket in self.buckets.items()
+            if method and bucket.rate < bucket.base
+        ]
+        if not slowed:
+            return "🚦 Rate limits: **base**"
+        return "🚦 Slowed: " + ", ".join(
+            f"{method.replace('Request', '')} {bucket.rate:.2g}/s"
+            for method, bucket in sorted(slowed, key=lambda mb: mb[1].rate)[:4]
+        )
+
+limiter = RateLimiter()
@@ -0,0 +1,223 @@
+import re
+from functools import lru_cache, partial
+
+# Rule kinds: plain text, whole words only, or a regular expression
+KINDS = {'text': '🔤', 'word': '🔠', 'regex': '🧩'}
+PREFIXES = {'w:': 'word', 're:': 'regex'}
+SEPARATOR = '=>'
+MAX_RULES = 100
+
+def parse_rules(text):
+    """
+    Rules from a message, one per line: `find => replace`, with `w:` for
+    whole words or `re:` for a regex before `find`. An empty replacement
+    deletes the match. Raises ValueError naming the first bad line.
+    """
+    rules = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        if SEPARATOR not in line:
+            raise ValueError(f"line {number}: expected `find {SEPARATOR} replace`")
+        find, replace = (part.strip() for part in line.split(SEPARATOR, 1))
+
+        kind = 'text'
+        for prefix, prefix_kind in PREFIXES.items():
+            if find.startswith(prefix):
+                kind, find = prefix_kind, find[len(prefix):].strip()
+                break
+        if not find:
+            raise ValueError(f"line {number}: nothing to find")
+
+        rule = {'kind': kind, 'find': find, 'replace': replace}
+        try:
+            _pattern(rule)
+            if kind == 'regex':
+                re.compile(find).sub(replace, "")
+        except re.error as e:
+            raise ValueError(f"line {number}: {e}")
+        rules.append(rule)
+    return rules
+
+def describe(rule):
+    """One line for a rule, e.g. '🔠 720p → 1080p'"""
+    return f"{KINDS[rule['kind']]} {rule['find']} → {rule['replace'] or '∅'}"
+
+def _pattern(rule):
+    if rule['kind'] == 'regex':
+        return rule['find']
+    escaped = re.escape(rule['find'])
+    if rule['kind'] == 'word':
+        return rf"(?<!\w){escaped}(?!\w)"
+    return escaped
+
+def _trie(words):
+    """
+    Regex matching any of `words`, built as a character trie so a failed
+    match costs one character test instead of one test per word. Longer
+    words win over their prefixes.
+    """
+    root = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if '' in node else body
+
+    return emit(root)
+
+_SPECIAL = set(".^$*+?{}[]\\|()")
+
+def _first_char(rule):
+    """The character every match of `rule` starts with, or None if unknown"""
+    find = rule['find']
+    if rule['kind'] != 'regex':
+        return find[0]
+    if '|' in find:
+        return None
+    if find[0] == '\\' and len(find) > 1 and not find[1].isalnum():
+        char, rest = find[1], find[2:]
+    elif find[0] not in _SPECIAL:
+        char, rest = find[0], find[1:]
+    else:
+        return None
+    # `a?b` or `a*b` may start without the `a`
+    if rest[:1] in ('?', '*', '{'):
+        return None
+    return char
+
+# Backreferences (\1, (?P=name)), named groups and global flags depend on
+# the regex being compiled alone
+_STANDALONE = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?[aiLmsux]+\)")
+
+def _combinable(rule):
+    return rule['kind'] != 'regex' or not _STANDALONE.search(rule['find'])
+
+def _replace_text(find, replace, text):
+    return text.replace(find, replace)
+
+class _Combined:
+    """
+    Rules compiled into one regex, so a string is rewritten in a single
+    left-to-right pass however many rules there are. Plain text and
+    whole-word rules are folded into one character trie each; regex rules
+    keep their own named groups. At a given position regex rules are tried
+    first, in order, then whole words, then plain text, longest match
+    first. Replaced text is not matched again by other rules.
+    """
+    __slots__ = ('pattern', 'texts', 'words', 'regexes', 'sub')
+
+    def __init__(self, rules):
+        self.texts = {}
+        self.words = {}
+        self.regexes = []
+        branches = []
+        for rule in rules:
+            if rule['kind'] == 'regex':
+                # Regex replacements can use the rule's own groups (\1, \g<name>)
+                own = re.compile(rule['find']) if '\\' in rule['replace'] else None
+                branches.append(f"(?P<r{len(self.regexes)}>{rule['find']})")
+                self.regexes.append((own, rule['replace']))
+            else:
+                target = self.words if rule['kind'] == 'word' else self.texts
+                target.setdefault(rule['find'], rule['replace'])
+
+        if self.words:
+            branches.append(rf"(?<!\w)(?P<word>{_trie(self.words)})(?!\w)")
+        if self.texts:
+            branches.append(f"(?P<text>{_trie(self.texts)})")
+
+        self.pattern = None
+        if branches:
+            pattern = "|".join(branches)
+            # A lookahead on the possible first characters lets the regex
+            # engine skip most positions without trying every branch
+            firsts = [_first_char(rule) for rule in rules]
+            if None not in firsts:
+                pattern = f"(?=[{''.join(re.escape(c) for c in sorted(set(firsts)))}])(?:{pattern})"
+            self.pattern = re.compile(pattern)
+
+        # One rule needs no dispatch: a plain str.replace or re.sub
+        self.sub = None
+        if len(rules) == 1:
+            rule = rules[0]
+            if rule['kind'] == 'text':
+                self.sub = partial(_replace_text, rule['find'], rule['replace'])
+            else:
+                template = rule['replace']
+                if rule['kind'] == 'word':
+                    template = template.replace('\\', '\\\\')
+                self.sub = partial(re.compile(_pattern(rule)).sub, template)
+        elif self.pattern is not None:
+            self.sub = partial(self.pattern.sub, self._replace)
+
+    def _replace(self, match):
+        group = match.lastgroup
+        if group == 'text':
+            return self.texts[match.group()]
+        if group == 'word':
+            return self.words[match.group()]
+        own, replace = self.regexes[int(group[1:])]
+        if own is None:
+            return replace
+        return own.match(match.string, match.start()).expand(replace)
+
+class RuleSet:
+    """
+    A list of rules as few passes over the text as possible: each run of
+    rules that can share a regex is one _Combined pass, and a regex that
+    must be compiled alone (backreferences, named groups, global flags)
+    is its own re.sub between them, so it still applies in list order.
+    """
+    __slots__ = ('passes',)
+
+    def __init__(self, rules):
+        self.passes = []
+        batch = []
+        for rule in rules:
+            if _combinable(rule):
+                batch.append(rule)
+                continue
+            self._add(batch)
+            batch = []
+            self.passes.append(partial(re.compile(rule['find']).sub, rule['replace']))
+        self._add(batch)
+
+    def _add(self, batch):
+        if batch:
+            sub = _Combined(batch).sub
+            if sub is not None:
+                self.passes.append(sub)
+
+    def apply(self, text):
+        if not text:
+            return text
+        for sub in self.passes:
+            text = sub(text)
+        return text
+
+@lru_cache(maxsize=64)
+def _compiled(key):
+    return RuleSet([{'kind': k, 'find': f, 'replace': r} for k, f, r in key])
+
+def compile_rules(rules):
+    """Compiled RuleSet for `rules`; identical rule lists share one"""
+    return _compiled(tuple((rule['kind'], rule['find'], rule['replace']) for rule in rules))
+
+def session_rules(settings, target):
+    """
+    The rules for `target` ('name' or 'cap') in a session's settings,
+    including a rule set with the older single find/replace fields
+    """
+    rules = list(settings.get(f'{target}_rules', []))
+    find, replace = settings.get(f'find_{target}'), settings.get(f'replace_{target}')
+    if find and replace:
+        rules.insert(0, {'kind': 'text', 'find': find, 'replace': replace})
+    return rules
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections import deque, OrderedDict
+import config
+
+class Job:
+    """One queued or running transfer and its stop flag"""
+    def __init__(self, session_id, user_id, source, dest, start, end, event=None, manifest=None):
+        self.id = session_id
+        self.user_id = user_id
+        self.source = source
+        self.dest = dest
+        self.start = start
+        self.end = end
+        self.event = event
+        self.manifest = manifest  # From /plan; the transfer builds one otherwise
+
+        self.state = 'queued'
+        self.stop_requested = False
+        self.reporter = None
+        self.task = None
+        self.created = time.time()
+
+    def describe(self):
+        line = f"`{self.id[:8]}` {self.source} → {self.dest} ({self.start}-{self.end})"
+        if self.state == 'running' and self.reporter:
+            stats = self.reporter.stats
+            line += (
+                f"\n   🟢 {self.reporter.position}/{self.reporter.total} | "
+                f"✅ {stats['success']} | ⏭️ {stats['skipped']}"
+            )
+        elif self.state == 'running':
+            line += "\n   🟢 starting"
+        else:
+            line += f"\n   ⏸️ {self.state}"
+        return line
+
+class JobScheduler:
+    """
+    Runs transfers as jobs. Each user has their own FIFO queue; free
+    slots are handed out round-robin across users so one long backlog
+    cannot starve anyone else, and at most MAX_CONCURRENT_JOBS run at once.
+    """
+    def __init__(self, max_running):
+        self.max_running = max_running
+        self.queues = OrderedDict()  # user_id -> deque of queued jobs
+        self.running = {}
+        self.jobs = {}
+        self._turn = deque()  # users in round-robin order
+        self._runner = None
+
+    def bind(self, runner):
+        """Set the coroutine function `runner(job)` that performs a job"""
+        self._runner = runner
+
+    def submit(self, job):
+        """Queue a job; returns its position in the user's queue (0 = started)"""
+        self.jobs[job.id] = job
+        queue = self.queues.setdefault(job.user_id, deque())
+        queue.append(job)
+        if job.user_id not in self._turn:
+            self._turn.append(job.user_id)
+
+        self._dispatch()
+        return 0 if job.state == 'running' else queue.index(job) + 1
+
+    def _next_job(self):
+        """
+        Pop the next job from the user with the fewest running jobs;
+        ties go to whoever has waited longest in the round-robin
+        """
+        while self._turn and not self.queues.get(self._turn[0]):
+            self.queues.pop(self._turn.popleft(), None)
+        if not self._turn:
+            return None
+
+        load = {}
+        for job in self.running.values():
+            load[job.user_id] = load.get(job.user_id, 0) + 1
+        user_id = min(
+            (u for u in self._turn if self.queues.get(u)),
+            key=lambda u: load.get(u, 0)
+        )
+
+        self._turn.remove(user_id)
+        queue = self.queues[user_id]
+        job = queue.popleft()
+        if queue:
+            self._turn.append(user_id)
+        else:
+            del self.queues[user_id]
+        return job
+
+    def _dispatch(self):
+        while len(self.running) < self.max_running:
+            job = self._next_job()
+            if job is None:
+                return
+            job.state = 'running'
+            self.running[job.id] = job
+            job.task = asyncio.create_task(self._run(job))
+            config.logger.info(
+                f"▶️ Job {job.id[:8]} started for {job.user_id} "
+                f"({len(self.running)}/{self.max_running} running)"
+            )
+
+    async def _run(self, job):
+        try:
+            await self._runner(job)
+            job.state = 'stopped' if job.stop_requested else 'done'
+        except asyncio.CancelledError:
+            job.state = 'stopped'
+        except Exception as e:
+            job.state = 'failed'
+            config.logger.error(f"Job {job.id[:8]} failed: {e}", exc_info=True)
+        finally:
+            self.running.pop(job.id, None)
+            self.jobs.pop(job.id, None)
+            self._dispatch()
+
+    def stop(self, job_id):
+        """Stop a running job or drop a queued one. Returns False if unknown."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False
+
+        job.stop_requested = True
+        if job.state == 'queued':
+            queue = self.queues.get(job.user_id)
+            if queue and job in queue:
+                queue.remove(job)
+            job.state = 'stopped'
+            del self.jobs[job_id]
+        elif job.task and not job.task.done():
+            job.task.cancel()
+        return True
+
+    def find(self, user_id, prefix=""):
+        """A user's jobs whose id starts with `prefix`, oldest first"""
+        return [
+            job for job in self.jobs.values()
+            if job.user_id == user_id and job.id.startswith(prefix)
+        ]
+
+    def describe(self):
+        queued = sum(len(q) for q in self.queues.values())
+        return (
+            f"🚀 Jobs: **{len(self.running)}**/{self.max_running} running, "
+            f"**{queued}** queued ({len(self.queues)} users waiting)"
+        )
+
+scheduler = JobScheduler(config.MAX_CONCURRENT_JOBS)
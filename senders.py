@@ -0,0 +1,183 @@
+import asyncio
+import time
+from telethon import errors, utils
+from telethon.tl import functions, types
+import config
+
+# Errors Telethon's own download loop knows how to recover from (moving
+# DC, re-fetching a document's file reference); the rest of the file
+# continues through client.iter_download when the pool sees one
+HANDOFF_ERRORS = (
+    errors.FileMigrateError,
+    errors.FileReferenceExpiredError,
+    errors.FilerefUpgradeNeededError,
+)
+
+class _Lease:
+    __slots__ = ('sender', 'borrows', 'idle_since')
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.borrows = 0
+        self.idle_since = time.monotonic()
+
+class SenderPool:
+    """
+    Authorized MTProto senders for the DCs other than the account's own,
+    kept connected between files. A sender multiplexes many requests, so
+    streams and range workers share them: each borrow takes the least busy
+    sender, and a new one is only authorized while every sender is in use
+    and the DC has fewer than SENDER_POOL_SIZE. Senders idle for longer
+    than SENDER_IDLE_SECONDS are disconnected. Telethon keeps just one
+    exported sender per DC, which every range worker would otherwise share.
+    """
+    def __init__(self, size, idle_seconds):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.client = None
+        self.leases = {}  # dc_id -> [_Lease]
+        self.created = 0
+        self.borrows = 0
+        self._evictor = None
+
+    def bind(self, client):
+        self.client = client
+
+    def location(self, client, media):
+        """(dc_id, InputFileLocation) if `media` should use the pool, else None"""
+        if not config.SENDER_POOL_ENABLED or client is not self.client:
+            return None
+        try:
+            dc_id, location = utils.get_input_location(media)
+        except TypeError:
+            return None
+        if not dc_id or dc_id == client.session.dc_id:
+            return None
+        return dc_id, location
+
+    async def _create(self, dc_id):
+        sender = await self.client._create_exported_sender(dc_id)
+        sender.dc_id = dc_id
+        self.created += 1
+        config.logger.info(f"🔌 Authorized sender #{len(self.leases.get(dc_id, [])) + 1} for DC {dc_id}")
+        return _Lease(sender)
+
+    async def borrow(self, dc_id):
+        """Least busy sender for `dc_id`, authorizing a new one if all are busy"""
+        if self._evictor is None:
+            self._evictor = asyncio.create_task(self._evict_idle())
+
+        leases = self.leases.setdefault(dc_id, [])
+        if self._needs_sender(leases):
+            # Telethon's exported-sender setup mutates shared client
+            # state, so authorizations take the lock its own borrows use
+            async with self.client._borrow_sender_lock:
+                if self._needs_sender(leases):
+                    leases.append(await self._create(dc_id))
+
+        lease = min(leases, key=lambda l: l.borrows)
+        lease.borrows += 1
+        self.borrows += 1
+        return lease
+
+    def _needs_sender(self, leases):
+        busiest = min((l.borrows for l in leases), default=None)
+        return busiest is None or (busiest > 0 and len(leases) < self.size)
+
+    def give_back(self, dc_id, lease, broken=False):
+        lease.borrows -= 1
+        lease.idle_since = time.monotonic()
+        if broken and lease.borrows == 0:
+            self._drop(dc_id, lease)
+
+    def _drop(self, dc_id, lease):
+        leases = self.leases.get(dc_id, [])
+        if lease in leases:
+            leases.remove(lease)
+            asyncio.create_task(lease.sender.disconnect())
+
+    async def warm(self, dc_ids):
+        """Authorize one sender per DC ahead of the first download"""
+        for dc_id in dc_ids:
+            if dc_id == self.client.session.dc_id or self.leases.get(dc_id):
+                continue
+            try:
+                async with self.client._borrow_sender_lock:
+                    self.leases.setdefault(dc_id, []).append(await self._create(dc_id))
+            except Exception as e:
+                config.logger.warning(f"Could not warm DC {dc_id}: {e}")
+
+    async def _evict_idle(self):
+        while True:
+            await asyncio.sleep(min(30, self.idle_seconds))
+            now = time.monotonic()
+            for dc_id, leases in self.leases.items():
+                for lease in list(leases):
+                    if not lease.borrows and now - lease.idle_since > self.idle_seconds:
+                        config.logger.info(f"🔌 Closing idle sender for DC {dc_id}")
+                        self._drop(dc_id, lease)
+
+    def iter_download(self, dc_id, location, offset, stride, limit, request_size):
+        """
+        GetFile requests over pooled senders, like client.iter_download
+        with `offset`/`stride`/`limit`, yielding one chunk per request.
+        CDN redirects and HANDOFF_ERRORS hand the remaining ranges to
+        client.iter_download, which handles them.
+        """
+        async def chunks():
+            position, count = offset, 0
+            handoff = None
+            lease = await self.borrow(dc_id)
+            broken = False
+            try:
+                while limit is None or count < limit:
+                    try:
+                        result = await self.client._call(
+                            lease.sender,
+                            functions.upload.GetFileRequest(location, position, request_size)
+                        )
+                    except HANDOFF_ERRORS as e:
+                        handoff = type(e).__name__
+                        break
+                    if not isinstance(result, types.upload.File):
+                        handoff = type(result).__name__
+                        break
+                    if not result.bytes:
+                        return
+                    yield result.bytes
+                    if len(result.bytes) < request_size:
+                        return
+                    position += stride
+                    count += 1
+            except (ConnectionError, asyncio.TimeoutError):
+                broken = True
+                raise
+            finally:
+                self.give_back(dc_id, lease, broken)
+
+            if handoff is None:
+                return
+            config.logger.info(f"🔌 {handoff} on DC {dc_id}, continuing with Telethon's download")
+            async for chunk in self.client.iter_download(
+                location,
+                offset=position,
+                stride=stride,
+                limit=None if limit is None else limit - count,
+                chunk_size=request_size,
+                request_size=request_size,
+                dc_id=dc_id
+            ):
+                yield chunk
+
+        return chunks()
+
+    def describe(self):
+        senders = ", ".join(
+            f"DC{dc}×{len(leases)}" for dc, leases in sorted(self.leases.items()) if leases
+        ) or "none"
+        return (
+            f"🔌 Senders: {senders} "
+            f"(authorized **{self.created}** for **{self.borrows}** downloads)"
+        )
+
+sender_pool = SenderPool(config.SENDER_POOL_SIZE, config.SENDER_IDLE_SECONDS)
@@ -0,0 +1,124 @@
+import asyncio
+import mmap
+import tempfile
+import config
+from memory import ByteBudget
+from utils import human_readable_size
+
+# Disk shared by every spill file
+disk_budget = ByteBudget(config.SPILL_DISK_BYTES)
+
+class SpillBuffer:
+    """
+    Ring of `window` bytes in a memory-mapped temp file, used by streams
+    instead of their in-memory queues. Download ranges are written at
+    their file offsets as soon as they are at most `window` bytes ahead
+    of the reader, so downloads keep going while uploads stall; reads
+    copy straight out of the mapping into the bytes the uploader sends.
+    The last `tail` consumed bytes are never overwritten, so seeking back
+    that far to resume an upload needs no download at all.
+    """
+    def __init__(self, file, window, tail=0):
+        self.file = file
+        self.window = window
+        self.tail = tail
+        self.map = mmap.mmap(file.fileno(), window)
+        self.start = 0  # Offset of the last reset; nothing below it is mapped
+        self.position = 0  # Next byte read() returns
+        self.written = 0  # Every byte below this has been downloaded
+        self.high = 0  # End of the furthest range written
+        self.ranges = {}  # offset -> end, for ranges written past `written`
+        self.lanes_open = 0
+        self.broken = False  # A downloader failed; its ranges will never arrive
+        self._changed = asyncio.Condition()
+
+    @classmethod
+    def open(cls, file_size, chunk_size, tail=0):
+        """
+        A spill buffer for a file keeping `tail` bytes behind the reader,
+        or None if disk budget or space is short
+        """
+        window = min(config.SPILL_WINDOW_BYTES, file_size)
+        window = max(window, chunk_size * config.TUNER_MAX_WORKERS * 2 + tail)
+        window += -window % chunk_size
+        if not disk_budget.try_acquire(window):
+            return None
+        try:
+            file = tempfile.TemporaryFile(prefix="spill-", dir=config.SPILL_DIR)
+            file.truncate(window)
+            spill = cls(file, window, tail)
+        except (OSError, ValueError) as e:
+            disk_budget.release(window)
+            config.logger.warning(f"💾 Spill file unavailable, buffering in memory: {e}")
+            return None
+        config.logger.info(f"💾 Spilling to disk: {human_readable_size(window)} window")
+        return spill
+
+    def reset(self, offset, lanes):
+        """Start over at `offset` (request aligned) with `lanes` downloaders"""
+        self.start = self.position = self.written = self.high = offset
+        self.ranges.clear()
+        self.lanes_open = lanes
+        self.broken = False
+
+    def seek(self, offset):
+        """Move the reader back to `offset` if those bytes are still mapped"""
+        lowest = max(self.high - self.window, self.start)
+        if not self.broken and lowest <= offset <= self.written:
+            self.position = offset
+            return True
+        return False
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def room(self, end):
+        """
+        Wait until bytes up to `end` can be written without overwriting
+        unread bytes or the tail kept for seeking back
+        """
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: end <= max(self.position - self.tail, self.start) + self.window
+            )
+
+    async def write(self, offset, chunk):
+        start = offset % self.window
+        self.map[start:start + len(chunk)] = chunk
+        end = offset + len(chunk)
+        self.high = max(self.high, end)
+        self.ranges[offset] = end
+        while self.written in self.ranges:
+            self.written = self.ranges.pop(self.written)
+        await self._notify()
+
+    async def lane_done(self, failed=False):
+        self.lanes_open -= 1
+        self.broken = self.broken or failed
+        await self._notify()
+
+    async def read(self, size, timeout):
+        """Up to `size` bytes at the read position; b"" once downloads ended short"""
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(
+                lambda: self.written >= self.position + size
+                or self.lanes_open <= 0 or self.broken
+            ), timeout)
+
+        size = min(size, self.written - self.position)
+        if size <= 0:
+            return b""
+        start = self.position % self.window
+        if start + size <= self.window:
+            data = self.map[start:start + size]
+        else:
+            data = self.map[start:] + self.map[:start + size - self.window]
+        self.position += size
+        await self._notify()
+        return data
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+        disk_budget.release(self.window)
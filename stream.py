@@ -1,85 +1,353 @@
 import asyncio
 import time
-import math
+from collections import deque
+from telethon import errors
 import config
-from utils import human_readable_size, time_formatter
-
-async def progress_callback(current, total, start_time, file_name, status_msg):
-    """Update progress with reduced frequency"""
-    now = time.time()
-    
-    # Update every UPDATE_INTERVAL seconds
-    if now - config.last_update_time < config.UPDATE_INTERVAL: 
-        return 
-    config.last_update_time = now
-    
-    percentage = current * 100 / total if total > 0 else 0
-    time_diff = now - start_time
-    speed = current / time_diff if time_diff > 0 else 0
-    eta = (total - current) / speed if speed > 0 else 0
-    
-    filled = math.floor(percentage / 10)
-    bar = "█" * filled + "░" * (10 - filled)
-    
-    try:
-        await status_msg.edit(
-            f"📦 **Transferring...**\n"
-            f"📂 `{file_name[:30]}...`\n"
-            f"**{bar} {round(percentage, 1)}%**\n"
-            f"⚡ `{human_readable_size(speed)}/s` | ETA: `{time_formatter(eta)}`\n"
-            f"💾 `{human_readable_size(current)} / {human_readable_size(total)}`"
-        )
-    except Exception as e:
-        config.logger.debug(f"Progress update failed: {e}")
+from utils import human_readable_size
+from tuner import tuner
+from metrics import metrics
+from senders import sender_pool
+from accounts import account_pool
+import tracing
+from memory import budget
+from spill import SpillBuffer
+
+class ChunkBuffer:
+    """
+    FIFO of downloaded chunks held as memoryviews.
+    Reads slice the head chunk instead of rebuilding one big bytes object,
+    so every byte is copied at most once on its way to the uploader.
+    """
+    def __init__(self):
+        self.chunks = deque()
+        self.size = 0
+        self.bytes_copied = 0  # Bytes duplicated while serving reads
+
+    def __len__(self):
+        return self.size
+
+    def feed(self, chunk):
+        """Append a downloaded chunk without copying it"""
+        if chunk:
+            self.chunks.append(memoryview(chunk))
+            self.size += len(chunk)
+
+    def take(self, size):
+        """Pop up to `size` bytes from the front of the buffer"""
+        if size <= 0 or not self.chunks:
+            return b""
+
+        head = self.chunks[0]
+
+        # Fast path: the read is served entirely by the head chunk
+        if len(head) >= size or len(self.chunks) == 1:
+            n = min(size, len(head))
+            if n == len(head):
+                self.chunks.popleft()
+                # Whole original chunk requested - hand it over untouched
+                if isinstance(head.obj, bytes) and len(head.obj) == n:
+                    self.size -= n
+                    return head.obj
+            else:
+                self.chunks[0] = head[n:]
+            self.size -= n
+            self.bytes_copied += n
+            return bytes(head[:n])
+
+        # Slow path: the read spans several chunks - join them once
+        parts = []
+        remaining = size
+        while remaining and self.chunks:
+            head = self.chunks[0]
+            if len(head) <= remaining:
+                parts.append(self.chunks.popleft())
+                remaining -= len(head)
+            else:
+                parts.append(head[:remaining])
+                self.chunks[0] = head[remaining:]
+                remaining = 0
+
+        data = b"".join(parts)
+        self.size -= len(data)
+        self.bytes_copied += len(data)
+        return data
+
+    def clear(self):
+        self.chunks.clear()
+        self.size = 0
 
 class ExtremeBufferedStream:
     """
-    Optimized streaming with 8MB chunks and 2-queue buffer (16MB total)
-    Perfect for Render free tier (512MB RAM)
+    Buffered download stream read by the uploader.
+    Request size and buffer depth are chosen by the auto-tuner so the
+    whole pipeline stays under the configured memory ceiling.
     """
-    def __init__(self, client, location, file_size, file_name, start_time, status_msg):
+    def __init__(self, client, location, file_size, file_name, start_time, reporter=None, sources=None):
         self.client = client
         self.location = location
+        # (client, media) pairs that can download this file; lane k uses
+        # source k % len(sources), so ranges spread across accounts
+        self.sources = sources or [(client, location)]
         self.file_size = file_size
         self.name = file_name
         self.start_time = start_time
-        self.status_msg = status_msg
+        self.reporter = reporter
         self.current_bytes = 0
         
-        # Optimized settings for free tier
-        self.chunk_size = config.CHUNK_SIZE
-        self.queue = asyncio.Queue(maxsize=config.QUEUE_SIZE)  # 16MB buffer
+        # Request size and buffer depth come from the auto-tuner
+        self.chunk_size = tuner.request_size(file_size)
+        self.queue = asyncio.Queue(maxsize=max(1, tuner.inflight_bytes // self.chunk_size))
+        self.read_wait = 0.0  # Seconds read() spent waiting for downloads
+        self.download_done = None
+        self.floods = 0  # FloodWaits hit by this file's downloads
         
         self.downloader_task = None
-        self.buffer = b""
+        self.range_tasks = []
+        self.lanes = []
+        self._lane = 0
+        self.buffer = ChunkBuffer()
         self.closed = False
         self._started = False
+        self._shut_down = False
+
+        # Where the download starts, in request-sized ranges, and how many
+        # leading bytes of that range read() drops (set by seek())
+        self._base = 0
+        self._skip = 0
+
+        # Memory-mapped disk tier replacing the queues for large files
+        self.spill = None
+
+        # Bytes held from the global memory budget. Ranges reserve in file
+        # order so the chunk read() needs next always has its reservation.
+        self.reserved = 0
+        self._next_reserve = 0
+        self._turn = asyncio.Condition()
         
         config.logger.info(f"📦 Stream initialized: {file_name} ({human_readable_size(file_size)})")
 
     async def _start_download(self):
-        """Start the download worker"""
+        """Start the download worker(s)"""
         if self._started:
             return
         self._started = True
-        self.downloader_task = asyncio.create_task(self._worker())
+        if self.reporter:
+            self.reporter.track(self)
+        metrics.streams.add(self)
+        self._opened = time.monotonic()
+
+        if self.spill is None and config.SPILL_ENABLED and self.file_size >= config.SPILL_MIN_SIZE:
+            # Keep every part the uploader may still have in flight, so a
+            # failed part is re-read from disk
+            tail = tuner.upload_workers * tuner.part_size_kb(self.file_size) * 1024
+            self.spill = SpillBuffer.open(self.file_size, self.chunk_size, tail)
+
+        workers = tuner.download_workers
+        if workers > 1 and self.file_size - self.current_bytes >= config.PARALLEL_MIN_SIZE:
+            self._start_range_workers(workers)
+        else:
+            self.downloader_task = asyncio.create_task(self._worker())
+
+        # The workers only start running at the next await
+        if self.spill:
+            self.spill.reset(self._base * self.chunk_size, len(self.range_tasks) or 1)
+            self.spill.position += self._skip
+            self._skip = 0
+
+    def _start_range_workers(self, workers):
+        """
+        Split the file into request-aligned ranges striped across workers.
+        Range k is fetched by worker k % workers, so reading the lanes
+        round-robin yields the file back in order. Each lane is bounded,
+        which caps the reorder buffer at the tuner's in-flight budget.
+        """
+        part = self.chunk_size
+        total_parts = (self.file_size + part - 1) // part - self._base
+        workers = min(workers, total_parts)
+        lane_depth = max(1, tuner.inflight_bytes // (part * workers))
+
+        self.lanes = [asyncio.Queue(maxsize=lane_depth) for _ in range(workers)]
+        self.range_tasks = [
+            asyncio.create_task(self._range_worker(
+                index,
+                workers,
+                (total_parts - index + workers - 1) // workers
+            ))
+            for index in range(workers)
+        ]
+        config.logger.info(
+            f"🔀 Parallel download: {workers} workers × {lane_depth} parts in flight"
+        )
+
+    async def _hold(self, index):
+        """
+        Wait until range `index` may be downloaded: room in the spill
+        file when spilling, memory budget otherwise
+        """
+        if self.spill:
+            await self.spill.room((self._base + index + 1) * self.chunk_size)
+        else:
+            await self._reserve(index)
+
+    async def _store(self, index, chunk, queue):
+        """Hand a downloaded range to the spill file or the reader's queue"""
+        if self.spill:
+            if not self.current_bytes:
+                metrics.stage.observe(time.monotonic() - self._opened, stage='first_byte')
+            await self.spill.write((self._base + index) * self.chunk_size, chunk)
+            self.current_bytes = self.spill.written
+            metrics.bytes_downloaded.inc(len(chunk))
+            return
+
+        # The last range is usually short
+        if len(chunk) < self.chunk_size:
+            self._unreserve(self.chunk_size - len(chunk))
+        await queue.put(chunk)
+
+    async def _reserve(self, index):
+        """Reserve budget for range `index` once every earlier range has"""
+        async with self._turn:
+            await self._turn.wait_for(lambda: self._next_reserve == index)
+
+        self.reserved += await budget.acquire(self.chunk_size)
+
+        async with self._turn:
+            self._next_reserve += 1
+            self._turn.notify_all()
+
+    def _unreserve(self, size):
+        size = min(size, self.reserved)
+        self.reserved -= size
+        budget.release(size)
+
+    def _downloads(self, source, offset, stride, limit):
+        """
+        Chunk iterator for the given ranges: pooled senders for media on
+        foreign DCs, otherwise the client's own iter_download
+        """
+        client, location = source
+        pooled = sender_pool.location(client, location)
+        if pooled:
+            dc_id, location = pooled
+            return sender_pool.iter_download(
+                dc_id, location, offset, stride, limit, self.chunk_size
+            ).__aiter__()
+
+        return client.iter_download(
+            location,
+            offset=offset,
+            stride=stride,
+            limit=limit,
+            chunk_size=self.chunk_size,
+            request_size=self.chunk_size,
+            file_size=self.file_size
+        ).__aiter__()
+
+    async def _flooded(self, source, seconds):
+        """
+        Where a lane continues after `source` hit FloodWait: another
+        healthy account of this file, or the same one once the wait is over
+        """
+        account_pool.flood(source[0], seconds)
+        metrics.floodwait(seconds, 'download')
+        self.floods += 1
+        for other in self.sources:
+            if other is not source and account_pool.healthy(other[0]):
+                config.logger.warning(f"⏳ Download FloodWait {seconds}s, switching account")
+                return other
+
+        config.logger.warning(f"⏳ Download FloodWait: sleeping {seconds}s")
+        with tracing.span('floodwait', overlap=True, seconds=seconds):
+            await asyncio.sleep(seconds)
+        return source
+
+    async def _fetch_ranges(self, lane, first, step, count, queue):
+        """
+        Pull `count` chunks (ranges first, first+step, ...) into `queue`,
+        holding memory or disk before each request. After a FloodWait the lane
+        resumes at the range it was on, possibly from another account.
+        Each iterator is closed when left so its sender is handed back.
+        """
+        part = self.chunk_size
+        source = self.sources[lane % len(self.sources)]
+        done = 0
+        held = False  # Budget for range `first + done*step` already reserved
+
+        while done < count:
+            downloads = self._downloads(
+                source, (self._base + first + done * step) * part, step * part, count - done
+            )
+            try:
+                while done < count:
+                    index = first + done * step
+                    if not held:
+                        with tracing.span('reserve', overlap=True, index=index):
+                            await self._hold(index)
+                        held = True
+                    try:
+                        with tracing.span('download', overlap=True, index=index):
+                            chunk = await downloads.__anext__()
+                    except StopAsyncIteration:
+                        self._unreserve(part)
+                        return
+                    held = False
+
+                    if self.closed:
+                        return
+
+                    await self._store(index, chunk, queue)
+                    done += 1
+
+            except errors.FloodWaitError as e:
+                source = await self._flooded(source, e.seconds)
+
+            finally:
+                close = getattr(downloads, 'aclose', None) or getattr(downloads, 'close', None)
+                if close:
+                    await close()
+
+    async def _range_worker(self, index, workers, parts):
+        """Fetch every `workers`-th range starting at range `index`"""
+        lane = self.lanes[index]
+        failed = False
+        try:
+            await self._fetch_ranges(index, index, workers, parts, lane)
+
+            self.download_done = time.time()
+            await lane.put(None)
+
+        except asyncio.CancelledError:
+            pass
+
+        except Exception as e:
+            # A lane ending early truncates the stream at that range
+            config.logger.error(f"⚠️ Range worker {index} error: {e}")
+            failed = True
+            await lane.put(None)
+
+        finally:
+            if self.spill:
+                await self.spill.lane_done(failed)
+
+    async def _next_chunk(self):
+        """Next chunk in file order, from the single queue or the lanes"""
+        if not self.lanes:
+            return await self.queue.get()
+
+        chunk = await self.lanes[self._lane].get()
+        self._lane = (self._lane + 1) % len(self.lanes)
+        return chunk
 
     async def _worker(self):
         """Background worker to download chunks"""
+        failed = False
         try:
             config.logger.info(f"📥 Starting download: {self.name}")
-            async for chunk in self.client.iter_download(
-                self.location, 
-                chunk_size=self.chunk_size,
-                request_size=self.chunk_size
-            ):
-                if self.closed:
-                    config.logger.info("Download worker: closed flag detected")
-                    break
-                    
-                await self.queue.put(chunk)
+            parts = (self.file_size + self.chunk_size - 1) // self.chunk_size - self._base
+            await self._fetch_ranges(0, 0, 1, parts, self.queue)
                 
             # Signal end of stream
+            self.download_done = time.time()
             await self.queue.put(None)
             config.logger.info(f"✅ Download complete: {self.name}")
             
@@ -89,8 +357,13 @@ class ExtremeBufferedStream:
             
         except Exception as e:
             config.logger.error(f"⚠️ Download error: {e}")
+            failed = True
             await self.queue.put(None)
 
+        finally:
+            if self.spill:
+                await self.spill.lane_done(failed)
+
     def __len__(self):
         return self.file_size
 
@@ -105,11 +378,17 @@ class ExtremeBufferedStream:
             
         if size == -1: 
             size = self.chunk_size
+
+        if self.spill:
+            return await self._read_spill(size)
             
         # Fill buffer to requested size
         while len(self.buffer) < size and not self.closed:
             try:
-                chunk = await asyncio.wait_for(self.queue.get(), timeout=30.0)
+                waited = time.monotonic()
+                with tracing.span('read wait'):
+                    chunk = await asyncio.wait_for(self._next_chunk(), timeout=30.0)
+                self.read_wait += time.monotonic() - waited
                 
                 if chunk is None:
                     # End of stream
@@ -120,17 +399,18 @@ class ExtremeBufferedStream:
                     self.closed = True
                     break
                 
-                self.buffer += chunk
+                # Progress is sampled from current_bytes by the reporter
+                if not self.current_bytes:
+                    metrics.stage.observe(time.monotonic() - self._opened, stage='first_byte')
+                self.buffer.feed(chunk)
                 self.current_bytes += len(chunk)
-                
-                # Update progress (fire-and-forget)
-                asyncio.create_task(progress_callback(
-                    self.current_bytes, 
-                    self.file_size, 
-                    self.start_time, 
-                    self.name,
-                    self.status_msg
-                ))
+                metrics.bytes_downloaded.inc(len(chunk))
+
+                # After a seek() the first range starts before the offset
+                if self._skip:
+                    dropped = len(self.buffer.take(self._skip))
+                    self._unreserve(dropped)
+                    self._skip -= dropped
                 
             except asyncio.TimeoutError:
                 config.logger.error("❌ Download timeout")
@@ -141,20 +421,13 @@ class ExtremeBufferedStream:
                 self.closed = True
                 break
             
-        # Return requested data
-        data = self.buffer[:size]
-        self.buffer = self.buffer[size:]
+        # Return requested data; its memory is the uploader's from here
+        data = self.buffer.take(size)
+        self._unreserve(len(data))
         return data
 
-    async def close(self):
-        """Clean shutdown of stream"""
-        if self.closed:
-            return
-            
-        config.logger.info(f"🔒 Closing stream: {self.name}")
-        self.closed = True
-        
-        # Cancel download task
+    async def _stop_download(self):
+        """Cancel the workers and hand back their buffers and reservations"""
         if self.downloader_task and not self.downloader_task.done():
             self.downloader_task.cancel()
             try:
@@ -162,14 +435,98 @@ class ExtremeBufferedStream:
             except (asyncio.CancelledError, asyncio.TimeoutError):
                 pass
         
-        # Clear buffer
-        self.buffer = b""
+        for task in self.range_tasks:
+            if not task.done():
+                task.cancel()
+        if self.range_tasks:
+            await asyncio.wait(self.range_tasks, timeout=2.0)
+
+        self.buffer.clear()
         
-        # Drain queue
-        while not self.queue.empty():
-            try:
-                self.queue.get_nowait()
-            except:
-                break
+        # Drain queues
+        for queue in [self.queue, *self.lanes]:
+            while not queue.empty():
+                try:
+                    queue.get_nowait()
+                except:
+                    break
+
+        # Hand back everything still reserved for buffered chunks
+        self._unreserve(self.reserved)
+
+    async def seek(self, offset):
+        """
+        Restart the download at byte `offset`, e.g. to resume an upload at
+        its first missing part. The download restarts at the request
+        boundary before `offset`, and read() drops the bytes before it.
+        Bytes still in the spill file are re-read without downloading.
+        """
+        if self.spill and self.spill.seek(offset):
+            self.closed = False
+            config.logger.info(f"⏩ Re-reading {self.name} from disk at {human_readable_size(offset)}")
+            return
+
+        self.closed = True
+        await self._stop_download()
+
+        aligned = offset - offset % self.chunk_size
+        self._base = aligned // self.chunk_size
+        self._skip = offset - aligned
+        self.current_bytes = aligned
+
+        self.queue = asyncio.Queue(maxsize=self.queue.maxsize)
+        self.lanes = []
+        self._lane = 0
+        self.range_tasks = []
+        self.downloader_task = None
+        self.download_done = None
+        self._next_reserve = 0
+        self._started = False
+        self.closed = False
+        config.logger.info(f"⏩ Resuming download of {self.name} at {human_readable_size(offset)}")
+
+    async def _read_spill(self, size):
+        """read() for spilled streams: copy straight out of the mapping"""
+        size = min(size, self.file_size - self.spill.position)
+        try:
+            waited = time.monotonic()
+            with tracing.span('read wait'):
+                data = await self.spill.read(size, 30.0)
+            self.read_wait += time.monotonic() - waited
+        except asyncio.TimeoutError:
+            config.logger.error("❌ Download timeout")
+            data = b""
+
+        if len(data) < size:
+            config.logger.warning(
+                f"⚠️ Incomplete transfer: {self.spill.position}/{self.file_size} bytes"
+            )
+            self.closed = True
+        return data
+
+    async def close(self):
+        """Clean shutdown of stream"""
+        if self.reporter:
+            self.reporter.untrack(self)
+        metrics.streams.discard(self)
+
+        # `closed` is also set by read() at end of stream or on errors;
+        # the workers and reservations still need tearing down then
+        if self._shut_down:
+            return
+        self._shut_down = True
+            
+        config.logger.info(f"🔒 Closing stream: {self.name}")
+        self.closed = True
+
+        if self.current_bytes:
+            config.logger.debug(
+                f"Buffer copies: {human_readable_size(self.buffer.bytes_copied)} "
+                f"for {human_readable_size(self.current_bytes)} read"
+            )
+        await self._stop_download()
+        if self.spill:
+            self.spill.close()
+            self.spill = None
         
         config.logger.info(f"✅ Stream closed: {self.name}")
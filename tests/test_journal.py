@@ -0,0 +1,29 @@
+import asyncio
+import os
+import journal as journal_module
+from journal import TransferJournal
+
+SESSION = {'source': -1, 'dest': -2, 'chat_id': 1}
+
+def test_progress_is_fsynced_in_batches(tmp_path, monkeypatch):
+    syncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(journal_module.config, 'JOURNAL_SYNC_SECONDS', 0.05)
+    monkeypatch.setattr(journal_module.os, 'fsync', lambda fd: (syncs.append(fd), real_fsync(fd)))
+
+    async def run():
+        journal = TransferJournal(str(tmp_path / "journal.jsonl"))
+        journal.start('s', SESSION, 1, 5000)
+        for msg_id in range(1, 2001):
+            journal.progress('s', msg_id)
+        # Every record is readable before any batched fsync
+        assert journal.load()['s']['last'] == 2000
+        await asyncio.sleep(0.2)
+        journal.finish('s', 'stopped')
+        journal.close()
+        return journal
+
+    journal = asyncio.run(run())
+    # start, one batch for the 2000 progress records, finish
+    assert len(syncs) == 3
+    assert journal.load()['s']['state'] == 'stopped'
@@ -0,0 +1,102 @@
+import asyncio
+import time
+import config
+from benchmarks.fake_telegram import FakeDocument, FakeDownloadClient
+from memory import ByteBudget, budget
+from stream import ExtremeBufferedStream
+from tuner import tuner
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+def waiter(budget, size, granted):
+    async def wait():
+        await budget.acquire(size)
+        granted.append(size)
+    return asyncio.create_task(wait())
+
+def test_waiters_are_served_in_fifo_order():
+    async def run():
+        budget, granted = ByteBudget(100), []
+        await budget.acquire(100)
+        tasks = [waiter(budget, size, granted) for size in (60, 10, 30)]
+        await settle()
+
+        # 10 would fit now, but not ahead of the 60 queued before it
+        budget.release(50)
+        await settle()
+        assert granted == [] and budget.waiting == 3
+
+        budget.release(50)
+        await asyncio.gather(*tasks)
+        assert granted == [60, 10, 30] and budget.reserved == 100
+
+    asyncio.run(run())
+
+def test_a_cancelled_waiter_neither_leaks_nor_blocks_those_behind_it():
+    async def run():
+        budget, granted = ByteBudget(100), []
+        await budget.acquire(50)
+        head, behind = waiter(budget, 80, granted), waiter(budget, 20, granted)
+        await settle()
+        assert budget.waiting == 2
+
+        head.cancel()
+        await behind
+        assert granted == [20] and budget.waiting == 0
+        assert budget.reserved == 70
+
+    asyncio.run(run())
+
+def test_a_waiter_cancelled_as_it_is_granted_hands_the_bytes_back():
+    async def run():
+        budget, granted = ByteBudget(100), []
+        await budget.acquire(100)
+        task = waiter(budget, 50, granted)
+        await settle()
+
+        budget.release(100)  # Grants the waiter...
+        task.cancel()  # ...which is cancelled before it runs again
+        await settle()
+        assert task.cancelled() and granted == []
+        assert budget.reserved == 0
+
+    asyncio.run(run())
+
+class BrokenDownloadClient(FakeDownloadClient):
+    """Fails every download after a few chunks"""
+    def iter_download(self, file, *args, **kwargs):
+        chunks = super().iter_download(file, *args, **kwargs)
+
+        async def broken():
+            count = 0
+            async for chunk in chunks:
+                count += 1
+                if count > 3:
+                    raise ConnectionError("connection reset")
+                yield chunk
+
+        return broken()
+
+def test_a_failed_download_returns_its_reservations(monkeypatch):
+    monkeypatch.setattr(config, 'PARALLEL_MIN_SIZE', 0)
+    monkeypatch.setattr(config, 'SPILL_ENABLED', False)
+    monkeypatch.setattr(tuner, 'download_workers', 3)
+    monkeypatch.setattr(tuner, 'inflight_bytes', 1024 * 1024)
+    monkeypatch.setattr(tuner, 'request_size', lambda file_size: 64 * 1024)
+
+    async def run():
+        before = budget.reserved
+        size = 4 * 1024 * 1024
+        stream = ExtremeBufferedStream(
+            BrokenDownloadClient(latency=0, jitter=0.002), FakeDocument(1, size), size, "file.bin", time.time()
+        )
+        try:
+            while await stream.read(100 * 1024):
+                pass
+        finally:
+            await stream.close()
+        assert budget.reserved == before and not budget.waiting
+
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+import asyncio
+import time
+import pytest
+from telethon import errors, functions
+from accounts import AccountPool
+from bots import BotPool
+from ratelimit import RateLimiter
+
+class StubClient:
+    """Only `_call`, failing with the given FloodWaits before succeeding"""
+    flood_sleep_threshold = 120
+
+    def __init__(self, waits=()):
+        self.waits = list(waits)
+        self.calls = 0
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        self.calls += 1
+        if self.waits:
+            raise errors.FloodWaitError(request=None, capture=self.waits.pop(0))
+        return True
+
+def upload_part():
+    return functions.upload.SaveFilePartRequest(file_id=1, file_part=0, bytes=b"x")
+
+def get_file():
+    return functions.upload.GetFileRequest(location=None, offset=0, limit=4096)
+
+def test_absorbed_flood_cools_the_bot_down():
+    flooded, spare = StubClient([1]), StubClient()
+    pool = BotPool()
+    pool.bind([(flooded, "1:a"), (spare, "2:b")])
+    RateLimiter().install(flooded, pool.limiter_flood)
+
+    assert asyncio.run(flooded._call(None, upload_part())) is True
+    assert flooded.calls == 2
+    assert pool.bots[0].floods == 1
+    assert pool.bots[0].cooldown_until > time.time() - 1
+
+    pool.bots[0].cooldown_until = time.time() + 60
+    assert asyncio.run(pool.acquire(flooded)).client is spare
+
+def test_download_flood_reaches_the_stream_when_another_account_can_take_over():
+    primary, extra = StubClient([1]), StubClient()
+    pool = AccountPool()
+    pool.bind([primary, extra])
+    RateLimiter().install(primary, pool.limiter_flood)
+
+    with pytest.raises(errors.FloodWaitError):
+        asyncio.run(primary._call(None, get_file()))
+    assert primary.calls == 1
+    # The stream records it when it switches the lane
+    assert not pool.accounts[0].floods
+
+def test_download_flood_is_absorbed_and_recorded_with_one_account():
+    primary = StubClient([1])
+    pool = AccountPool()
+    pool.bind([primary])
+    RateLimiter().install(primary, pool.limiter_flood)
+
+    assert asyncio.run(primary._call(None, get_file())) is True
+    assert primary.calls == 2
+    assert len(pool.accounts[0].floods) == 1
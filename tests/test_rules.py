@@ -0,0 +1,14 @@
+import pytest
+from rules import RuleSet, parse_rules
+
+@pytest.mark.parametrize("text, source, expected", [
+    ("re:(a)(b) => Y\nre:(\\w)\\1 => X", "hello ab book", "heXo Y bXk"),
+    ("foo => bar\nre:(\\w)\\1 => X", "foo hello", "bar heXo"),
+    ("re:(?i)x264 => H.264\nw:hd => HD", "hd X264", "HD H.264"),
+])
+def test_standalone_regexes_apply_as_if_alone(text, source, expected):
+    assert RuleSet(parse_rules(text)).apply(source) == expected
+
+def test_combined_rules_rewrite_in_one_pass():
+    rules = parse_rules("720p => 1080p\nw:HD => FHD\nre:@\\w+ => @mine")
+    assert RuleSet(rules).apply("HD 720p by @someone HDR") == "FHD 1080p by @mine HDR"
@@ -0,0 +1,91 @@
+import asyncio
+from scheduler import Job, JobScheduler
+
+class Runner:
+    """Job runner whose jobs block until finished (or failed) by the test"""
+    def __init__(self, scheduler):
+        self.started = []
+        self.gates = {}
+        scheduler.bind(self)
+
+    async def __call__(self, job):
+        self.started.append(job.id)
+        gate = self.gates[job.id] = asyncio.get_running_loop().create_future()
+        await gate
+
+    async def finish(self, job_id, error=None):
+        if error:
+            self.gates[job_id].set_exception(error)
+        else:
+            self.gates[job_id].set_result(None)
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+def job(user_id, n):
+    return Job(f"{user_id}-{n}", user_id, "src", "dest", 1, 10)
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+def test_one_users_backlog_cannot_starve_another():
+    async def run():
+        scheduler = JobScheduler(2)
+        runner = Runner(scheduler)
+        for n in range(5):
+            scheduler.submit(job("alice", n))
+        assert scheduler.submit(job("bob", 0)) == 1
+        await settle()
+        assert runner.started == ["alice-0", "alice-1"]
+
+        # The first free slot goes to bob, ahead of alice's third job
+        await runner.finish("alice-0")
+        assert runner.started[-1] == "bob-0"
+        await runner.finish("alice-1")
+        await runner.finish("bob-0")
+        assert runner.started == ["alice-0", "alice-1", "bob-0", "alice-2", "alice-3"]
+
+        for job_id in ("alice-2", "alice-3"):
+            await runner.finish(job_id)
+        await runner.finish("alice-4")
+        assert not scheduler.running and not scheduler.queues and not scheduler.jobs
+
+    asyncio.run(run())
+
+def test_stop_drops_queued_jobs_and_cancels_running_ones():
+    async def run():
+        scheduler = JobScheduler(1)
+        runner = Runner(scheduler)
+        running, queued, last = job("alice", 0), job("alice", 1), job("alice", 2)
+        for each in (running, queued, last):
+            scheduler.submit(each)
+        await settle()
+
+        assert scheduler.stop(queued.id)
+        assert queued.state == 'stopped'
+        assert [j.id for j in scheduler.queues["alice"]] == [last.id]
+        assert not scheduler.stop(queued.id)
+
+        assert scheduler.stop(running.id)
+        await settle()
+        assert running.state == 'stopped'
+        assert runner.started == [running.id, last.id]
+
+    asyncio.run(run())
+
+def test_failed_jobs_free_their_slot():
+    async def run():
+        scheduler = JobScheduler(1)
+        runner = Runner(scheduler)
+        failing, waiting = job("alice", 0), job("bob", 0)
+        scheduler.submit(failing)
+        scheduler.submit(waiting)
+        await settle()
+
+        await runner.finish(failing.id, RuntimeError("boom"))
+        assert failing.state == 'failed'
+        assert failing.id not in scheduler.jobs
+        assert list(scheduler.running) == [waiting.id]
+        assert runner.started == [failing.id, waiting.id]
+
+    asyncio.run(run())
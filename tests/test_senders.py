@@ -0,0 +1,50 @@
+import asyncio
+from telethon import errors
+from telethon.tl import types
+from senders import SenderPool
+
+KB = 1024
+
+class StubSender:
+    async def disconnect(self):
+        pass
+
+class StubClient:
+    """GetFile answers for a 10-part file; part `expire_at` needs a new file reference"""
+    def __init__(self, expire_at):
+        self.expire_at = expire_at
+        self._borrow_sender_lock = asyncio.Lock()
+        self.handed_off = None
+
+    async def _create_exported_sender(self, dc_id):
+        assert self._borrow_sender_lock.locked()
+        return StubSender()
+
+    async def _call(self, sender, request):
+        part = request.offset // (64 * KB)
+        if part == self.expire_at:
+            raise errors.FileReferenceExpiredError(request=request)
+        return types.upload.File(types.storage.FilePartial(), 0, bytes([part]) * request.limit)
+
+    def iter_download(self, location, offset, stride, limit, **kwargs):
+        self.handed_off = (offset, stride, limit, kwargs['dc_id'])
+
+        async def chunks():
+            for n in range(limit):
+                yield bytes([(offset + n * stride) // (64 * KB)]) * (64 * KB)
+        return chunks()
+
+def test_expired_file_reference_hands_the_rest_to_telethon():
+    async def run():
+        client = StubClient(expire_at=4)
+        pool = SenderPool(2, 60)
+        pool.bind(client)
+        parts = [
+            chunk async for chunk in pool.iter_download(4, object(), 0, 2 * 64 * KB, 5, 64 * KB)
+        ]
+        assert [chunk[0] for chunk in parts] == [0, 2, 4, 6, 8]
+        assert client.handed_off == (4 * 64 * KB, 2 * 64 * KB, 3, 4)
+        assert all(lease.borrows == 0 for lease in pool.leases[4])
+        pool._evictor.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,36 @@
+import asyncio
+import config
+import spill
+from spill import SpillBuffer
+
+CHUNK = 64 * 1024
+
+def test_seek_back_within_tail_after_download_ran_ahead(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'SPILL_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'SPILL_WINDOW_BYTES', 16 * CHUNK)
+    monkeypatch.setattr(spill, 'disk_budget', spill.ByteBudget(1 << 30))
+
+    async def run():
+        buffer = SpillBuffer.open(64 * CHUNK, CHUNK, tail=4 * CHUNK)
+        buffer.reset(0, 1)
+
+        async def download():
+            for index in range(64):
+                await buffer.room((index + 1) * CHUNK)
+                await buffer.write(index * CHUNK, bytes([index]) * CHUNK)
+            await buffer.lane_done()
+
+        writer = asyncio.create_task(download())
+        try:
+            for _ in range(4):
+                await buffer.read(CHUNK, 5)
+            await asyncio.sleep(0.05)
+            # The download got as far ahead as it may, yet the tail survives
+            assert buffer.written >= 16 * CHUNK
+            assert buffer.seek(buffer.position - 4 * CHUNK)
+            assert await buffer.read(CHUNK, 5) == bytes([0]) * CHUNK
+        finally:
+            writer.cancel()
+            buffer.close()
+
+    asyncio.run(run())
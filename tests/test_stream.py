@@ -0,0 +1,100 @@
+import asyncio
+import time
+import tracemalloc
+import pytest
+import config
+from benchmarks.fake_telegram import BLOCK_SIZE, FakeDocument, FakeDownloadClient, payload
+from stream import ChunkBuffer, ExtremeBufferedStream
+from tuner import tuner
+
+KB, MB, GB = 1024, 1024 * 1024, 1024 * 1024 * 1024
+CHUNK = bytes(8 * MB)  # Fed repeatedly: feeding never copies
+READ_SIZES = [512 * KB, 500 * KB, 3 * MB]  # Aligned to the chunk, and not
+
+def stream_through(read_size, total=GB, take=ChunkBuffer.take):
+    """Feed `total` bytes of 8MB chunks and drain them in `read_size` reads"""
+    buffer = ChunkBuffer()
+    transferred = 0
+    for _ in range(total // len(CHUNK)):
+        buffer.feed(CHUNK)
+        # Keep a little data queued, as the downloader runs ahead
+        while len(buffer) >= read_size * 2:
+            transferred += len(take(buffer, read_size))
+    while len(buffer):
+        transferred += len(take(buffer, read_size))
+    return buffer, transferred
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+def test_partial_reads_copy_each_byte_exactly_once_per_gb(read_size):
+    buffer, transferred = stream_through(read_size)
+    assert transferred == GB
+    assert buffer.bytes_copied == GB
+
+def test_reads_of_whole_chunks_copy_nothing():
+    buffer, transferred = stream_through(len(CHUNK))
+    assert transferred == GB
+    assert buffer.bytes_copied == 0
+
+@pytest.mark.parametrize("read_size", READ_SIZES + [len(CHUNK)])
+def test_each_read_allocates_no_more_than_its_own_bytes(read_size):
+    """Measured with tracemalloc, so an extra copy fails whatever bytes_copied says"""
+    slack = 64 * KB  # memoryview and deque bookkeeping
+    worst = []
+
+    def take(buffer, size):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        data = buffer.take(size)
+        peak = tracemalloc.get_traced_memory()[1] - before
+        copied = 0 if data is CHUNK else len(data)
+        worst.append(peak - copied)
+        return data
+
+    tracemalloc.start()
+    try:
+        _, transferred = stream_through(read_size, total=64 * MB, take=take)
+    finally:
+        tracemalloc.stop()
+    assert transferred == 64 * MB
+    assert max(worst) < slack
+
+REQUEST = 64 * KB
+
+def expected(file_id, size):
+    return b"".join(
+        payload(file_id, offset, min(BLOCK_SIZE, size - offset))
+        for offset in range(0, size, BLOCK_SIZE)
+    )
+
+async def read_all(stream, read_size):
+    reads = []
+    while True:
+        part = await stream.read(read_size)
+        if not part:
+            return reads
+        reads.append(part)
+
+@pytest.mark.parametrize("workers", [2, 3, 5])
+@pytest.mark.parametrize("size", [2 * MB + 1, 3 * MB - 4097, 40 * REQUEST + 12345])
+def test_parallel_ranges_read_back_in_order_despite_jitter(monkeypatch, workers, size):
+    monkeypatch.setattr(config, 'PARALLEL_MIN_SIZE', 0)
+    monkeypatch.setattr(config, 'SPILL_ENABLED', False)
+    monkeypatch.setattr(tuner, 'download_workers', workers)
+    monkeypatch.setattr(tuner, 'inflight_bytes', 8 * REQUEST)
+    monkeypatch.setattr(tuner, 'request_size', lambda file_size: REQUEST)
+    read_size = 100 * KB  # Neither a multiple nor a divisor of the request size
+
+    async def run():
+        client = FakeDownloadClient(latency=0, jitter=0.003, seed=size)
+        document = FakeDocument(workers, size)
+        stream = ExtremeBufferedStream(client, document, size, "file.bin", time.time())
+        try:
+            reads = await read_all(stream, read_size)
+        finally:
+            await stream.close()
+        assert len(stream.lanes) == workers
+        return reads
+
+    reads = asyncio.run(run())
+    assert all(len(part) == read_size for part in reads[:-1])
+    assert b"".join(reads) == expected(workers, size)
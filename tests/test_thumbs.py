@@ -0,0 +1,44 @@
+import asyncio
+from memory import budget
+from thumbs import ThumbnailPrefetcher
+
+class Media:
+    def __init__(self, id):
+        self.id = id
+
+class Message:
+    def __init__(self, id):
+        self.id = id
+        self.media = self.file = self.document = Media(id)
+        self.photo = None
+
+class SlowClient:
+    async def download_media(self, message, file=None, thumb=None):
+        await asyncio.sleep(0.05)
+        return b"t" * 1000
+
+def test_close_cancels_fetches_and_returns_the_budget():
+    async def run():
+        before = budget.reserved
+        thumbs = ThumbnailPrefetcher(SlowClient())
+        tasks = [thumbs.prefetch(Message(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        await thumbs.close()
+        await asyncio.sleep(0.1)
+        assert all(task.done() for task in tasks)
+        assert not thumbs.cache and not thumbs.tasks
+        assert budget.reserved == before
+
+    asyncio.run(run())
+
+def test_overlapping_fetches_of_one_media_reserve_it_once():
+    async def run():
+        before = budget.reserved
+        thumbs = ThumbnailPrefetcher(SlowClient())
+        first, second = thumbs.prefetch(Message(7)), thumbs.prefetch(Message(7))
+        assert await first == await second
+        assert budget.reserved - before == 1000
+        await thumbs.close()
+        assert budget.reserved == before
+
+    asyncio.run(run())
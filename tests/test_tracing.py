@@ -0,0 +1,26 @@
+import asyncio
+import config
+import tracing
+
+def test_file_tracks_never_share_a_fixed_track(monkeypatch):
+    monkeypatch.setattr(config, 'TRACE_ENABLED', True)
+
+    async def run():
+        trace = tracing.start("session")
+        for message_id in (0, 1, 2):
+            token = tracing.track(tracing.file_tid(message_id), f"{message_id} file")
+            with tracing.span('upload'):
+                pass
+            tracing.untrack(token)
+        return trace
+
+    trace = asyncio.run(run())
+    names = {}
+    for event in trace.events:
+        if event['name'] == 'thread_name':
+            assert event['tid'] not in names, "two tracks share a tid"
+            names[event['tid']] = event['args']['name']
+    assert names[tracing.ENUM_TID] == "enumerate"
+    assert names[tracing.STATUS_TID] == "status"
+    uploads = [event['tid'] for event in trace.events if event['name'] == 'upload']
+    assert [names[tid] for tid in uploads] == ["0 file", "1 file", "2 file"]
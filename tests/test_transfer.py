@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from telethon import errors
+import transfer
+from cache import upload_cache
+from benchmarks.fake_telegram import FakeUserClient, FakeMessage, FaultPlan
+
+class Reporter:
+    note = None
+
+class FlakyClient:
+    """Raises each of `failures` in turn from send_file, then succeeds"""
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.sent = 0
+
+    async def send_file(self, dest_id, file=None, caption=None):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent += 1
+
+def send_cached(client, monkeypatch, discarded=None):
+    discarded = [] if discarded is None else discarded
+    monkeypatch.setattr(upload_cache, 'discard', discarded.append)
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, 'sleep', lambda seconds: sleep(0))
+    payload = {'kind': 'cached', 'client': client, 'media': object(), 'caption': '', 'cache_key': 'k'}
+    sent = asyncio.run(transfer.post_by_reference(payload, 1, None, None, {'enabled': True}, Reporter()))
+    return sent, discarded
+
+def test_floodwait_and_transient_errors_are_retried_keeping_the_cache_entry(monkeypatch):
+    client = FlakyClient(errors.FloodWaitError(request=None, capture=3), ConnectionError("reset"))
+    assert send_cached(client, monkeypatch) == (True, [])
+    assert client.sent == 1
+
+def test_rejected_reference_discards_the_cache_entry_and_streams(monkeypatch):
+    client = FlakyClient(errors.FileReferenceExpiredError(request=None))
+    assert send_cached(client, monkeypatch) == (False, ['k'])
+    assert client.sent == 0
+
+def test_persistent_transient_errors_are_raised_not_discarded(monkeypatch):
+    client = FlakyClient(*[ConnectionError("reset")] * transfer.config.MAX_RETRIES)
+    discarded = []
+    with pytest.raises(ConnectionError):
+        send_cached(client, monkeypatch, discarded)
+    assert discarded == []
+
+class CountingUser(FakeUserClient):
+    def __init__(self, ids):
+        super().__init__({i: FakeMessage(i, text=f"text {i}") for i in ids}, FaultPlan(), latency=0, jitter=0.002)
+        self.calls = {'ids': 0, 'history': 0}
+
+    async def get_messages(self, chat, ids=None, **kwargs):
+        self.calls['ids' if ids is not None else 'history'] += 1
+        return await super().get_messages(chat, ids, **kwargs)
+
+async def enumerate_range(client, start, end):
+    return [message.id async for message in transfer.iter_range(client, 1, start, end)]
+
+def test_large_sparse_ranges_page_history_instead_of_every_id():
+    ids = list(range(1, 50001, 97)) + [50000]  # ~500 messages over 50k ids
+    client = CountingUser(ids)
+    assert asyncio.run(enumerate_range(client, 1, 50000)) == ids
+    assert client.calls['ids'] == 0
+    assert client.calls['history'] == -(-50000 // transfer.config.ENUM_HISTORY_WINDOW)
+
+def test_history_windows_keep_the_range_bounds():
+    client = CountingUser(range(1, 6001))
+    assert asyncio.run(enumerate_range(client, 1234, 5678)) == list(range(1234, 5679))
+
+def test_small_ranges_keep_id_batches():
+    client = CountingUser(range(1, 301))
+    assert asyncio.run(enumerate_range(client, 1, 300)) == list(range(1, 301))
+    assert client.calls == {'ids': 3, 'history': 0}
@@ -0,0 +1,47 @@
+import config
+import tuner as tuner_module
+from tuner import AutoTuner
+
+def tuned(monkeypatch, rss=0, **workers):
+    monkeypatch.setattr(tuner_module, 'current_rss', lambda: rss)
+    tuner = AutoTuner()
+    for name, count in workers.items():
+        setattr(tuner, name, count)
+    tuner.rss = rss
+    return tuner
+
+def test_floodwaits_drop_workers_on_the_side_that_hit_them(monkeypatch):
+    tuner = tuned(monkeypatch, download_workers=6, upload_workers=6)
+    tuner._adjust(starved=0.5, download_floods=2)
+    assert (tuner.download_workers, tuner.upload_workers) == (5, 6)
+    tuner._adjust(starved=0.0, upload_floods=1)
+    assert (tuner.download_workers, tuner.upload_workers) == (5, 5)
+
+def test_idle_side_drifts_back_to_its_configured_workers(monkeypatch):
+    tuner = tuned(monkeypatch, download_workers=3, upload_workers=config.UPLOAD_WORKERS + 2)
+    tuner._adjust(starved=0.5)  # Uploader starved
+    assert tuner.download_workers == 4
+    assert tuner.upload_workers == config.UPLOAD_WORKERS + 1
+
+    tuner = tuned(monkeypatch, download_workers=config.DOWNLOAD_WORKERS + 1, upload_workers=2)
+    tuner._adjust(starved=0.0)  # Downloads waiting on the uploader
+    assert tuner.upload_workers == 3
+    assert tuner.download_workers == config.DOWNLOAD_WORKERS
+    tuner._adjust(starved=0.0)
+    assert tuner.download_workers == config.DOWNLOAD_WORKERS
+
+def test_rss_pressure_drops_workers_once_the_buffer_is_at_its_floor(monkeypatch):
+    tuner = tuned(monkeypatch, rss=config.MEMORY_CEILING_BYTES, download_workers=2, upload_workers=2)
+    tuner.inflight_bytes = tuner_module.MAX_REQUEST_SIZE * 2 * 2
+    tuner._adjust(starved=0.5)
+    assert (tuner.download_workers, tuner.upload_workers) == (2, 1)
+    tuner._adjust(starved=0.5)
+    assert (tuner.download_workers, tuner.upload_workers) == (1, 1)
+
+def test_describe_shows_the_last_sizes_chosen(monkeypatch):
+    tuner = tuned(monkeypatch, upload_workers=4)
+    tuner.request_size(10 * 1024)
+    tuner.part_size_kb(1024 * 1024)
+    text = tuner.describe()
+    assert "**16.00KB** requests" in text
+    assert "**64KB**" in text
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import config
+from uploader import ParallelUploader
+
+MB = 1024 * 1024
+
+class MemoryStream:
+    """Seekable stream over bytes, as the uploader reads a download"""
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.seeks = []
+
+    async def read(self, size):
+        part = self.data[self.position:self.position + size]
+        self.position += len(part)
+        await asyncio.sleep(0)
+        return part
+
+    async def seek(self, offset):
+        self.seeks.append(offset)
+        self.position = offset
+
+class FlakyServer:
+    """Stores big file parts; part `broken` fails every retry of its first send"""
+    def __init__(self, broken):
+        self.broken = broken
+        self.failures = 0
+        self.parts = {}
+        self.sends = []  # Part indexes in the order they were accepted
+
+    async def __call__(self, request):
+        await asyncio.sleep(0.001 * (request.file_part % 3))
+        if request.file_part == self.broken and self.failures < config.MAX_RETRIES:
+            self.failures += 1
+            raise ConnectionError("connection reset")
+        self.parts[request.file_part] = request.bytes
+        self.sends.append(request.file_part)
+        return True
+
+def test_a_part_failing_for_good_resumes_from_the_first_unacknowledged_part(monkeypatch):
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, 'sleep', lambda seconds: sleep(min(seconds, 0.001)))
+    data = os.urandom(12 * MB + 12345)
+
+    async def run():
+        server, stream = FlakyServer(broken=10), MemoryStream(data)
+        uploader = ParallelUploader(server, stream, len(data), "file.bin")
+        await uploader.upload()
+        return uploader, server, stream
+
+    uploader, server, stream = asyncio.run(run())
+    assert uploader.is_big and server.failures == config.MAX_RETRIES
+
+    # One resume, from the broken part; parts acknowledged before it
+    # (including any after it that were in flight) are not sent again
+    assert stream.seeks == [server.broken * uploader.part_size]
+    assert sorted(server.sends[:10]) == list(range(10))
+    assert len(server.sends) == len(set(server.sends)) == uploader.part_count
+    assert b"".join(server.parts[i] for i in range(uploader.part_count)) == data
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from collections import OrderedDict
+import config
+from memory import budget
+from metrics import metrics
+import tracing
+
+class ThumbnailPrefetcher:
+    """
+    Fetches thumbnails into memory ahead of the transfer that needs them,
+    so the pipeline never waits on a separate thumbnail round trip.
+    Recently used thumbnails are kept in a small LRU keyed by media id;
+    cached bytes stay reserved in the memory budget until evicted.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.cache = OrderedDict()
+        self.tasks = set()
+
+    @staticmethod
+    def _key(message):
+        media = message.document or message.photo
+        return getattr(media, 'id', None)
+
+    def prefetch(self, message):
+        """Start fetching `message`'s thumbnail; returns an awaitable task"""
+        task = asyncio.create_task(self._fetch(message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _fetch(self, message):
+        if not message.media or not message.file:
+            return None
+
+        key = self._key(message)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        reserved = await budget.acquire(config.THUMB_RESERVE_BYTES)
+        started = time.monotonic()
+        try:
+            with tracing.span('thumbnail', tid=tracing.file_tid(message.id), overlap=True):
+                thumb = await self.client.download_media(message, file=bytes, thumb=-1)
+            metrics.stage.observe(time.monotonic() - started, stage='thumbnail')
+        except Exception as e:
+            config.logger.debug(f"Thumbnail fetch failed for {message.id}: {e}")
+            thumb = None
+        finally:
+            budget.release(reserved)
+
+        if thumb and key is not None:
+            # Re-reserve the real size for as long as the LRU holds it
+            await budget.acquire(len(thumb))
+            if key in self.cache:
+                # An overlapping fetch of the same media got there first
+                budget.release(len(thumb))
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.cache[key] = thumb
+            while len(self.cache) > config.THUMB_CACHE_SIZE:
+                _, evicted = self.cache.popitem(last=False)
+                budget.release(len(evicted))
+        return thumb or None
+
+    def clear(self):
+        """Drop the LRU and hand its bytes back to the memory budget"""
+        for thumb in self.cache.values():
+            budget.release(len(thumb))
+        self.cache.clear()
+
+    async def close(self):
+        """Cancel fetches still running, then clear(); nothing is cached after this"""
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.clear()
@@ -0,0 +1,141 @@
+import contextvars
+import itertools
+import json
+import os
+import time
+import config
+
+# Fixed tracks; every file gets its own track after them, see file_tid
+ENUM_TID = 0
+STATUS_TID = 1
+FIRST_FILE_TID = 2
+
+_trace = contextvars.ContextVar('trace', default=None)
+_track = contextvars.ContextVar('track', default=ENUM_TID)
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _NullSpan()
+
+class _Span:
+    """A timed stage; overlapping spans become async events so they can nest freely"""
+    __slots__ = ('trace', 'name', 'tid', 'overlap', 'args', 'start')
+
+    def __init__(self, trace, name, tid, overlap, args):
+        self.trace = trace
+        self.name = name
+        self.tid = tid
+        self.overlap = overlap
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.trace.now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.trace.add(self.name, self.tid, self.start, self.trace.now(), self.overlap, self.args)
+        return False
+
+class SessionTrace:
+    """
+    Spans recorded for one transfer session, exported as Chrome trace
+    JSON (chrome://tracing, Perfetto). Each file is a track named after
+    its message; stages that overlap within a file (download ranges,
+    upload parts) are recorded as async events.
+    """
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.origin = time.perf_counter()
+        self.events = []
+        self.dropped = 0
+        self._ids = itertools.count(1)
+        self.name_track(ENUM_TID, "enumerate")
+        self.name_track(STATUS_TID, "status")
+
+    def now(self):
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def name_track(self, tid, label):
+        self.events.append({
+            'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid,
+            'args': {'name': label}
+        })
+
+    def add(self, name, tid, start, end, overlap, args):
+        if len(self.events) >= config.TRACE_MAX_EVENTS:
+            self.dropped += 1
+            return
+        if not overlap:
+            self.events.append({
+                'name': name, 'ph': 'X', 'pid': 1, 'tid': tid,
+                'ts': start, 'dur': end - start, 'args': args
+            })
+            return
+        span_id = next(self._ids)
+        common = {'name': name, 'cat': name, 'pid': 1, 'tid': tid, 'id': span_id}
+        self.events.append({**common, 'ph': 'b', 'ts': start, 'args': args})
+        self.events.append({**common, 'ph': 'e', 'ts': end})
+
+    def export(self):
+        os.makedirs(config.TRACE_DIR, exist_ok=True)
+        path = os.path.join(
+            config.TRACE_DIR,
+            f"trace-{self.session_id[:8]}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        with open(path, 'w') as f:
+            json.dump({
+                'traceEvents': self.events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'session': self.session_id, 'dropped': self.dropped}
+            }, f)
+        return path
+
+def start(session_id):
+    """Begin tracing the calling task (and tasks it creates) if TRACE_ENABLED"""
+    if not config.TRACE_ENABLED:
+        return None
+    trace = SessionTrace(session_id)
+    _trace.set(trace)
+    return trace
+
+def finish(trace):
+    """Write `trace` out; returns the file path or None"""
+    if trace is None:
+        return None
+    try:
+        path = trace.export()
+        config.logger.info(f"🧵 Trace written: {path} ({len(trace.events)} events)")
+        return path
+    except OSError as e:
+        config.logger.warning(f"Trace export failed: {e}")
+        return None
+
+def file_tid(message_id):
+    """The track of the file sent for `message_id`, clear of the fixed tracks"""
+    return message_id + FIRST_FILE_TID
+
+def track(tid, label):
+    """Attribute following spans in this task to the file track `tid`"""
+    trace = _trace.get()
+    if trace is None:
+        return None
+    trace.name_track(tid, label)
+    return _track.set(tid)
+
+def untrack(token):
+    if token is not None:
+        _track.reset(token)
+
+def span(name, tid=None, overlap=False, **args):
+    """Context manager timing one stage; free when tracing is off"""
+    trace = _trace.get()
+    if trace is None:
+        return _NULL
+    return _Span(trace, name, _track.get() if tid is None else tid, overlap, args)
@@ -1,267 +1,640 @@
 import asyncio
 import time
-import os
+from collections import deque
+from functools import partial
 from telethon import errors
 from telethon.tl.types import (
-    DocumentAttributeFilename, 
-    DocumentAttributeVideo, 
-    DocumentAttributeAudio
+    DocumentAttributeFilename,
+    DocumentAttributeVideo,
+    DocumentAttributeAudio,
+    MessageMediaDocument
 )
 import config
 from utils import (
-    human_readable_size, time_formatter, 
+    human_readable_size, time_formatter,
     get_target_info, apply_filename_manipulations,
     apply_caption_manipulations, sanitize_filename
 )
 from stream import ExtremeBufferedStream
+from uploader import ParallelUploader
+from cache import upload_cache
+from journal import journal
 from keyboards import get_progress_keyboard
+from progress import ProgressReporter
+from thumbs import ThumbnailPrefetcher
+from tuner import tuner, MAX_PART_KB
+from metrics import metrics
+from bots import bot_pool
+from accounts import account_pool
+from planner import Manifest, entry_for
+import tracing
 
-async def transfer_process(event, user_client, bot_client, source_id, dest_id, start_msg, end_msg, session_id):
-    """Main transfer process with all features - FIXED VERSION"""
-    
-    settings = config.active_sessions.get(session_id, {}).get('settings', {})
-    
-    status_message = await event.respond(
+def build_attributes(message, file_name):
+    """Filename attribute plus the video/audio attributes worth keeping"""
+    attributes = [DocumentAttributeFilename(file_name=file_name)]
+
+    if hasattr(message, 'document') and message.document:
+        for attr in message.document.attributes:
+            if isinstance(attr, DocumentAttributeVideo):
+                attributes.append(DocumentAttributeVideo(
+                    duration=attr.duration,
+                    w=attr.w,
+                    h=attr.h,
+                    supports_streaming=True
+                ))
+            elif isinstance(attr, DocumentAttributeAudio):
+                attributes.append(attr)
+
+    return attributes
+
+# Errors meaning the user can never copy into this destination (or out of
+# this source), so copy mode is switched off for the rest of the transfer
+COPY_FORBIDDEN_ERRORS = (
+    errors.ChatWriteForbiddenError,
+    errors.ChatAdminRequiredError,
+    errors.ChatSendMediaForbiddenError,
+    errors.UserBannedInChannelError,
+    errors.ChannelPrivateError,
+    errors.ChatForwardsRestrictedError
+)
+
+# Errors meaning this particular file id or reference is no good any more;
+# anything else (FloodWait, dropped connections) is retried as it is
+REFERENCE_REJECTED_ERRORS = (
+    errors.FileReferenceEmptyError,
+    errors.FileReferenceExpiredError,
+    errors.FileReferenceInvalidError,
+    errors.FileIdInvalidError,
+    errors.MediaEmptyError,
+    errors.MediaInvalidError
+)
+
+def can_copy_by_reference(message, file_name):
+    """
+    A document can be re-sent by reference only if nothing about the file
+    itself changes - Telegram keeps the original attributes and filename.
+    """
+    return (
+        isinstance(message.media, MessageMediaDocument)
+        and message.document is not None
+        and message.file.name == file_name
+    )
+
+async def _iter_batches(batches):
+    """
+    Yield the messages of `batches`, (first id, coroutine function) pairs,
+    in order without loading them all first. Batches are fetched
+    ENUM_CONCURRENCY at a time ahead of the consumer, bounded by
+    ENUM_QUEUE_BATCHES.
+    """
+    queue = asyncio.Queue(maxsize=config.ENUM_QUEUE_BATCHES)
+
+    async def fetch(first, get):
+        started = time.monotonic()
+        with tracing.span('enumerate', tracing.ENUM_TID, overlap=True, first=first):
+            messages = await get()
+        metrics.stage.observe(time.monotonic() - started, stage='enumerate')
+        return messages
+
+    async def producer():
+        shards = deque()
+        try:
+            for first, get in batches:
+                shards.append(asyncio.create_task(fetch(first, get)))
+                if len(shards) >= config.ENUM_CONCURRENCY:
+                    await queue.put(await shards.popleft())
+            while shards:
+                await queue.put(await shards.popleft())
+            await queue.put(None)
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            await queue.put(e)
+
+        finally:
+            for task in shards:
+                task.cancel()
+
+    producer_task = asyncio.create_task(producer())
+    try:
+        while True:
+            messages = await queue.get()
+            if messages is None:
+                return
+            if isinstance(messages, Exception):
+                raise messages
+
+            # Deleted ids come back as None
+            for message in messages:
+                if message is not None:
+                    yield message
+            del messages
+
+    finally:
+        producer_task.cancel()
+
+def iter_ids(client, source_id, ids):
+    """Yield the messages with the given ids in order, ENUM_BATCH_SIZE ids per GetMessages"""
+    batch = config.ENUM_BATCH_SIZE
+    return _iter_batches(
+        (ids[first], partial(client.get_messages, source_id, ids=list(ids[first:first + batch])))
+        for first in range(0, len(ids), batch)
+    )
+
+def iter_range(client, source_id, start_msg, end_msg):
+    """
+    Yield the messages in [start_msg, end_msg] in id order. Ranges above
+    ENUM_HISTORY_MIN_IDS are read as GetHistory windows, which return only
+    messages that exist, so deleted stretches cost nothing
+    """
+    if end_msg - start_msg < config.ENUM_HISTORY_MIN_IDS:
+        return iter_ids(client, source_id, range(start_msg, end_msg + 1))
+
+    def history(first, last):
+        # min_id/max_id are exclusive; Telethon pages the window by offset_id
+        return client.get_messages(
+            source_id, min_id=first - 1, max_id=last + 1,
+            limit=None, reverse=True, wait_time=0
+        )
+
+    window = config.ENUM_HISTORY_WINDOW
+    return _iter_batches(
+        (first, partial(history, first, min(first + window - 1, end_msg)))
+        for first in range(start_msg, end_msg + 1, window)
+    )
+
+async def build_manifest(client, source_id, start_msg, end_msg, settings):
+    """Scan a range's metadata into a Manifest; no media is downloaded"""
+    manifest = Manifest(source_id, start_msg, end_msg)
+    with tracing.span('plan', tracing.ENUM_TID, first=start_msg, last=end_msg):
+        async for message in iter_range(client, source_id, start_msg, end_msg):
+            entry = entry_for(message, settings)
+            if entry is not None:
+                manifest.add(entry)
+    config.logger.info(
+        f"🗺️ Planned {start_msg}-{end_msg}: {len(manifest)} messages, "
+        f"{human_readable_size(manifest.total_bytes)}"
+    )
+    return manifest
+
+def plan_speed():
+    """
+    Throughput to estimate a plan with: recent whole-transfer speed, or
+    else one file's speed times the files transferred at once
+    """
+    return tuner.transfer_speed or tuner.upload_speed * pipeline_window()
+
+def pipeline_window():
+    """
+    Number of files prepared concurrently. Limited both by PIPELINE_FILES
+    and by how many per-file stream buffers fit in PIPELINE_MEMORY_BYTES.
+    """
+    per_file = tuner.inflight_bytes + tuner.upload_workers * MAX_PART_KB * 1024
+    return max(1, min(config.PIPELINE_FILES, config.PIPELINE_MEMORY_BYTES // per_file))
+
+async def prepare_message(message, source_id, thumb_task, user_client, bot_client, settings, reporter, copy_state, reuse=True):
+    """
+    Download and upload one message's media. Returns what the posting
+    stage needs to send it, or None if there is nothing to send.
+    `thumb_task` is the already running in-memory thumbnail fetch.
+    Unless `reuse` is off, files already uploaded before ('cached') or
+    reusable as-is ('copy') skip the transfer and are sent by reference.
+    """
+    # Handle text-only messages
+    if not message.media or not message.file:
+        if message.text:
+            return {'kind': 'text', 'text': apply_caption_manipulations(message.text, settings)}
+        return None
+
+    # Get file info
+    file_name, mime_type, is_video_mode = get_target_info(message)
+
+    if not file_name:
+        thumb_task.cancel()
+        return None
+
+    # Apply manipulations
+    file_name = apply_filename_manipulations(file_name, settings)
+    file_name = sanitize_filename(file_name)
+
+    # Prepare media object
+    media_obj = (message.media.document
+                if hasattr(message.media, 'document')
+                else message.media.photo)
+
+    cache_key = upload_cache.make_key(media_obj, message.file.size, file_name, not is_video_mode)
+    cached = upload_cache.get(cache_key) if reuse else None
+    if cached:
+        thumb_task.cancel()
+        media, owner = cached
+        return {
+            'kind': 'cached',
+            'media': media,
+            'client': bot_pool.by_owner(owner, bot_client),
+            'cache_key': cache_key,
+            'file_name': file_name,
+            'caption': apply_caption_manipulations(message.text, settings),
+            'size': message.file.size,
+            'start_time': time.time()
+        }
+
+    if reuse and copy_state['enabled'] and can_copy_by_reference(message, file_name):
+        thumb_task.cancel()
+        return {
+            'kind': 'copy',
+            'media': message.document,
+            'file_name': file_name,
+            'caption': apply_caption_manipulations(message.text, settings),
+            'size': message.file.size,
+            'start_time': time.time()
+        }
+
+    reporter.note = f"⬇️ Downloading: `{file_name[:35]}...`"
+
+    start_time = time.time()
+    attributes = build_attributes(message, file_name)
+
+    # Stream, range and part spans land on this file's trace track
+    track = tracing.track(tracing.file_tid(message.id), f"{message.id} {file_name}")
+
+    # Large files are striped over every healthy account, others go to
+    # the least busy one
+    sources = await account_pool.sources(
+        user_client, source_id, message, message.file.size >= config.PARALLEL_MIN_SIZE
+    )
+
+    # The least loaded bot uploads this file and later posts it
+    bot = await bot_pool.acquire(bot_client)
+    account_pool.begin(sources)
+
+    # CREATE STREAM
+    stream_file = ExtremeBufferedStream(
+        sources[0][0],
+        sources[0][1],
+        message.file.size,
+        file_name,
+        start_time,
+        reporter,
+        sources
+    )
+
+    try:
+        reporter.note = f"⬆️ Uploading: `{file_name[:35]}...`"
+
+        # Parts are retried inside the uploader
+        uploader = ParallelUploader(
+            bot.client,
+            stream_file,
+            message.file.size,
+            file_name
+        )
+        with tracing.span('upload', size=message.file.size):
+            input_file = await uploader.upload()
+
+        # Fetched in the background while earlier files were transferring
+        with tracing.span('thumbnail wait'):
+            thumb = await thumb_task
+        elapsed = time.time() - start_time
+        tuner.record(stream_file, elapsed, uploader.floods)
+
+        if stream_file.download_done and elapsed > 0:
+            metrics.throughput.observe(
+                stream_file.current_bytes / max(stream_file.download_done - start_time, 1e-3),
+                direction='download'
+            )
+            metrics.throughput.observe(stream_file.current_bytes / elapsed, direction='upload')
+
+    except BaseException:
+        # The upload failed, so nothing will wait for its thumbnail
+        thumb_task.cancel()
+        raise
+
+    finally:
+        # CRITICAL: Always close stream
+        try:
+            await stream_file.close()
+        except:
+            pass
+        bot_pool.release(bot)
+        account_pool.end(sources)
+        tracing.untrack(track)
+
+    return {
+        'kind': 'file',
+        'file': input_file,
+        'client': bot.client,
+        'file_name': file_name,
+        'caption': apply_caption_manipulations(message.text, settings),
+        'attributes': attributes,
+        'thumb': thumb,
+        'force_document': not is_video_mode,
+        'size': message.file.size,
+        'start_time': start_time,
+        'cache_key': cache_key
+    }
+
+async def send_with_retries(send, client, reporter, where, fatal=()):
+    """
+    Await `send()` until it succeeds. FloodWaits are slept out and cool
+    the bot down, other errors are retried after a pause; either is
+    raised once MAX_RETRIES is used up. Errors in `fatal` are raised at once.
+    """
+    retry_count = 0
+    while True:
+        try:
+            return await send()
+
+        except fatal:
+            raise
+
+        except errors.FloodWaitError as e:
+            config.logger.warning(f"⏳ FloodWait {e.seconds}s")
+            metrics.floodwait(e.seconds, where)
+            bot_pool.flood(client, e.seconds)
+            retry_count += 1
+            if retry_count >= config.MAX_RETRIES:
+                raise
+            reporter.note = f"⏳ **Cooling Down...** `{e.seconds}s`"
+            await asyncio.sleep(e.seconds)
+
+        except Exception as e:
+            config.logger.error(f"Upload error: {e}")
+            retry_count += 1
+            metrics.retries.inc(where=where)
+            if retry_count >= config.MAX_RETRIES:
+                raise
+            await asyncio.sleep(2)
+
+async def post_by_reference(payload, dest_id, user_client, bot_client, copy_state, reporter):
+    """
+    Re-send a document by reference: source documents as the user,
+    cached uploads as the bot that uploaded them. Returns False when
+    Telegram rejects the reference itself, so the caller can fall back
+    to streaming; FloodWaits and transient errors are retried instead.
+    """
+    client = user_client if payload['kind'] == 'copy' else payload['client']
+    try:
+        await send_with_retries(
+            lambda: client.send_file(
+                dest_id,
+                file=payload['media'],
+                caption=payload['caption']
+            ),
+            client, reporter, 'post_reference',
+            fatal=COPY_FORBIDDEN_ERRORS + REFERENCE_REJECTED_ERRORS
+        )
+        return True
+
+    except COPY_FORBIDDEN_ERRORS as e:
+        if payload['kind'] == 'copy':
+            config.logger.warning(f"📋 Copy mode disabled for this transfer: {e}")
+            copy_state['enabled'] = False
+        else:
+            config.logger.warning(f"📋 Cached send rejected, streaming instead: {e}")
+
+    except REFERENCE_REJECTED_ERRORS as e:
+        config.logger.warning(f"📋 Reference send rejected, streaming instead: {e}")
+        if payload['kind'] == 'cached':
+            upload_cache.discard(payload['cache_key'])
+
+    return False
+
+async def post_prepared(payload, dest_id, bot_client, reporter):
+    """Send an already uploaded file (or text) to the destination"""
+    if payload['kind'] == 'text':
+        return await bot_pool.pick(bot_client).send_message(dest_id, payload['text'])
+
+    # Uploaded parts belong to the bot that sent them
+    bot_client = payload['client']
+
+    # SEND WITH RETRY LOGIC
+    return await send_with_retries(
+        lambda: bot_client.send_file(
+            dest_id,
+            file=payload['file'],
+            caption=payload['caption'],
+            attributes=payload['attributes'],
+            thumb=payload['thumb'],
+            supports_streaming=True,
+            force_document=payload['force_document']
+        ),
+        bot_client, reporter, 'post'
+    )
+
+async def transfer_process(event, user_client, bot_client, source_id, dest_id, start_msg, end_msg, session_id, job):
+    """
+    Main transfer process with all features.
+    Up to pipeline_window() files are downloaded and uploaded at once;
+    posting to the destination always happens in source message order.
+    Every finished message is journaled so the range can be resumed;
+    `event` is None when resuming without a triggering message.
+    `job` is the scheduler job whose stop flag ends the transfer.
+    """
+
+    session = config.active_sessions.get(session_id, {})
+    settings = session.get('settings', {})
+    trace = tracing.start(session_id)
+
+    start_text = (
         f"🚀 **Starting Transfer...**\n"
         f"⚡ Optimized for Render Free Tier\n"
-        f"💾 Buffer: 16MB (8MB × 2)\n"
-        f"📍 Source: `{source_id}` → Dest: `{dest_id}`",
-        buttons=get_progress_keyboard()
+        f"💾 Buffer: {human_readable_size(tuner.inflight_bytes)} per file × {pipeline_window()} files\n"
+        f"📍 Source: `{source_id}` → Dest: `{dest_id}`\n"
+        f"📍 Range: `{start_msg}` → `{end_msg}`"
     )
-    
-    config.status_message = status_message
-    total_processed = 0
-    total_success = 0
-    total_size = 0
-    total_skipped = 0
+    if event is not None:
+        status_message = await event.respond(start_text, buttons=get_progress_keyboard(session_id))
+    else:
+        status_message = await bot_client.send_message(
+            session['chat_id'], start_text, buttons=get_progress_keyboard(session_id)
+        )
+
+    if session:
+        journal.start(session_id, session, start_msg, end_msg)
+    outcome = None
+
+    total = end_msg - start_msg + 1
+    stats = {'processed': 0, 'success': 0, 'size': 0, 'skipped': 0, 'copied': 0}
+    copy_state = {'enabled': config.COPY_MODE}
     overall_start = time.time()
-    
+    pending = deque()
+    reporter = ProgressReporter(status_message, stats, total, session_id)
+    job.reporter = reporter
+    reporter.start()
+    thumbs = ThumbnailPrefetcher(user_client)
+
+    async def post_next():
+        """Wait for the oldest in-flight message and post it"""
+        idx, message, task = pending.popleft()
+
+        paced = False
+
+        try:
+            payload = await task
+            paced = payload is not None and payload['kind'] == 'file'
+
+            posted = time.monotonic()
+            if payload and payload['kind'] in ('copy', 'cached'):
+                with tracing.span('post by reference', tid=tracing.file_tid(message.id)):
+                    by_reference = await post_by_reference(
+                        payload, dest_id, user_client, bot_client, copy_state, reporter
+                    )
+                if by_reference:
+                    stats['copied'] += 1
+                else:
+                    # Fall back to download + re-upload for this message
+                    paced = True
+                    payload = await prepare_message(
+                        message, source_id, thumbs.prefetch(message), user_client, bot_client, settings, reporter,
+                        copy_state, reuse=False
+                    )
+                    posted = time.monotonic()
+
+            if payload:
+                if payload['kind'] not in ('copy', 'cached'):
+                    with tracing.span('post', tid=tracing.file_tid(message.id)):
+                        sent = await post_prepared(payload, dest_id, bot_client, reporter)
+                    if payload['kind'] == 'file':
+                        upload_cache.put(
+                            payload['cache_key'], getattr(sent, 'document', None),
+                            bot_pool.owner(payload['client'])
+                        )
+                metrics.stage.observe(time.monotonic() - posted, stage='post')
+                stats['success'] += 1
+
+                if payload['kind'] == 'file':
+                    elapsed = time.time() - payload['start_time']
+                    speed = payload['size'] / elapsed / (1024*1024) if elapsed > 0 else 0
+                    stats['size'] += payload['size']
+                    reporter.note = (
+                        f"✅ **Sent:** `{payload['file_name'][:30]}...` "
+                        f"({speed:.1f} MB/s in {elapsed:.1f}s)"
+                    )
+
+        except MemoryError:
+            paced = True
+            config.logger.error("💥 RAM LIMIT! Skipping file...")
+            reporter.note = f"⚠️ **RAM Overflow - Skipped** msg `{message.id}`"
+            stats['skipped'] += 1
+            await asyncio.sleep(2)
+
+        except Exception as e:
+            paced = True
+            config.logger.error(f"❌ Error on msg {message.id}: {e}")
+            stats['skipped'] += 1
+            reporter.note = f"❌ **Failed - Skipping** msg `{message.id}`: `{str(e)[:30]}...`"
+            await asyncio.sleep(1)
+
+        stats['processed'] += 1
+        reporter.position = idx
+        if message.file:
+            reporter.bytes_done += message.file.size or 0
+        journal.progress(session_id, message.id)
+
+        # Memory management: Small pause every 3 files
+        if paced and stats['processed'] % 3 == 0:
+            await asyncio.sleep(1)
+
+    def summary():
+        overall_time = time.time() - overall_start
+        avg_speed = stats['size'] / overall_time / (1024*1024) if overall_time > 0 else 0
+        return (
+            f"{'🛑 **Transfer Stopped!**' if job.stop_requested else '🏁 **Transfer Complete!**'}\n"
+            f"━━━━━━━━━━━━━━━━━━━━\n"
+            f"✅ Success: `{stats['success']}`\n"
+            f"📋 Copied: `{stats['copied']}`\n"
+            f"⏭️ Skipped: `{stats['skipped']}`\n"
+            f"📦 Total Size: `{human_readable_size(stats['size'])}`\n"
+            f"⚡ Avg Speed: `{avg_speed:.1f} MB/s`\n"
+            f"⏱️ Time: `{time_formatter(overall_time)}`"
+        )
+
     try:
-        messages = []
-        async for message in user_client.iter_messages(
-            source_id, 
-            min_id=start_msg-1, 
-            max_id=end_msg+1, 
-            reverse=True
-        ):
-            messages.append(message)
-        
-        config.logger.info(f"📋 Total messages to process: {len(messages)}")
-        
-        for idx, message in enumerate(messages, 1):
+        # A plan from /plan fetches only its own ids. Otherwise the range
+        # is streamed as before and the manifest is filled in as it goes,
+        # so the first file never waits for the whole range to be scanned
+        manifest, job.manifest = job.manifest, None
+        planned = manifest is not None and (manifest.start, manifest.end) == (start_msg, end_msg)
+        window = pipeline_window()
+        if planned:
+            reporter.total_bytes = manifest.total_bytes
+            reporter.total_final = True
+            messages = iter_ids(user_client, source_id, manifest.ids())
+            config.logger.info(
+                f"📋 Planned messages to send: {len(manifest)} of {total} ids, "
+                f"{human_readable_size(manifest.total_bytes)} (pipeline: {window})"
+            )
+        else:
+            manifest = Manifest(source_id, start_msg, end_msg)
+            messages = iter_range(user_client, source_id, start_msg, end_msg)
+            config.logger.info(f"📋 Message ids to process: {total} (pipeline: {window})")
+
+        async for message in messages:
+            idx = message.id - start_msg + 1
+
             # Check stop flag
-            if config.stop_flag or not config.is_running:
-                await status_message.edit(
-                    "🛑 **Transfer Stopped!**\n"
-                    f"✅ Success: {total_success}\n"
-                    f"⏭️ Skipped: {total_skipped}\n"
-                    f"📊 Total: {total_processed}"
-                )
+            if job.stop_requested:
                 break
 
+            if not planned:
+                entry = entry_for(message, settings)
+                if entry is not None:
+                    manifest.add(entry)
+                    reporter.total_bytes = manifest.total_bytes
+
             # Skip service messages
-            if getattr(message, 'action', None): 
+            if getattr(message, 'action', None):
                 continue
 
-            stream_file = None
-            
-            try:
-                # Handle text-only messages
-                if not message.media or not message.file:
-                    if message.text:
-                        modified_text = apply_caption_manipulations(message.text, settings)
-                        await bot_client.send_message(dest_id, modified_text)
-                        total_success += 1
-                    total_processed += 1
-                    continue
-
-                # Get file info
-                file_name, mime_type, is_video_mode = get_target_info(message)
-                
-                if not file_name:
-                    total_processed += 1
-                    continue
-                
-                # Apply manipulations
-                file_name = apply_filename_manipulations(file_name, settings)
-                file_name = sanitize_filename(file_name)
-
-                await status_message.edit(
-                    f"⬇️ **Downloading...**\n"
-                    f"📂 `{file_name[:35]}...`\n"
-                    f"📊 File {idx}/{len(messages)}\n"
-                    f"✅ Success: {total_success} | ⏭️ Skip: {total_skipped}",
-                    buttons=get_progress_keyboard()
-                )
-
-                start_time = time.time()
-                
-                # Prepare attributes
-                attributes = [DocumentAttributeFilename(file_name=file_name)]
-                
-                if hasattr(message, 'document') and message.document:
-                    for attr in message.document.attributes:
-                        if isinstance(attr, DocumentAttributeVideo):
-                            attributes.append(DocumentAttributeVideo(
-                                duration=attr.duration,
-                                w=attr.w,
-                                h=attr.h,
-                                supports_streaming=True
-                            ))
-                        elif isinstance(attr, DocumentAttributeAudio):
-                            attributes.append(attr)
-
-                # Download thumbnail
-                thumb = None
-                try:
-                    thumb = await user_client.download_media(message, thumb=-1)
-                except:
-                    pass
-                
-                # Prepare media object
-                media_obj = (message.media.document 
-                            if hasattr(message.media, 'document') 
-                            else message.media.photo)
-                
-                # CREATE STREAM
-                stream_file = ExtremeBufferedStream(
-                    user_client, 
-                    media_obj,
-                    message.file.size,
-                    file_name,
-                    start_time,
-                    status_message
-                )
-                
-                # Apply caption manipulations
-                modified_caption = apply_caption_manipulations(message.text, settings)
-                
-                # Update status before upload
-                await status_message.edit(
-                    f"⬆️ **Uploading...**\n"
-                    f"📂 `{file_name[:35]}...`\n"
-                    f"📊 File {idx}/{len(messages)}\n"
-                    f"✅ Success: {total_success} | ⏭️ Skip: {total_skipped}",
-                    buttons=get_progress_keyboard()
-                )
-                
-                # UPLOAD WITH RETRY LOGIC
-                retry_count = 0
-                uploaded = False
-                
-                while retry_count < config.MAX_RETRIES and not uploaded:
-                    try:
-                        await bot_client.send_file(
-                            dest_id,
-                            file=stream_file,
-                            caption=modified_caption,
-                            attributes=attributes,
-                            thumb=thumb,
-                            supports_streaming=True,
-                            file_size=message.file.size,
-                            force_document=not is_video_mode,
-                            part_size_kb=config.UPLOAD_PART_SIZE
-                        )
-                        uploaded = True
-                        
-                    except errors.FloodWaitError as e:
-                        config.logger.warning(f"⏳ FloodWait {e.seconds}s")
-                        await status_message.edit(
-                            f"⏳ **Cooling Down...**\n"
-                            f"Waiting: `{e.seconds}s`\n"
-                            f"Then resuming...",
-                            buttons=get_progress_keyboard()
-                        )
-                        await asyncio.sleep(e.seconds)
-                        retry_count += 1
-                        
-                    except Exception as e:
-                        config.logger.error(f"Upload error: {e}")
-                        retry_count += 1
-                        if retry_count < config.MAX_RETRIES:
-                            await asyncio.sleep(2)
-                        else:
-                            raise
-                
-                # Cleanup thumbnail
-                if thumb and os.path.exists(thumb): 
-                    try:
-                        os.remove(thumb)
-                    except:
-                        pass
-                
-                elapsed = time.time() - start_time
-                speed = message.file.size / elapsed / (1024*1024) if elapsed > 0 else 0
-                total_size += message.file.size
-                total_success += 1
-                
-                await status_message.edit(
-                    f"✅ **Sent:** `{file_name[:30]}...`\n"
-                    f"⚡ {speed:.1f} MB/s in {elapsed:.1f}s\n"
-                    f"📊 Progress: {idx}/{len(messages)}\n"
-                    f"✅ Success: {total_success} | ⏭️ Skip: {total_skipped}",
-                    buttons=get_progress_keyboard()
-                )
-
-            except MemoryError:
-                config.logger.error("💥 RAM LIMIT! Skipping file...")
-                await status_message.edit(
-                    f"⚠️ **RAM Overflow - Skipped!**\n"
-                    f"File: `{file_name[:30] if 'file_name' in locals() else 'Unknown'}...`\n"
-                    f"Continuing with next...",
-                    buttons=get_progress_keyboard()
-                )
-                total_skipped += 1
-                await asyncio.sleep(2)
-            
-            except Exception as e:
-                config.logger.error(f"❌ Error on msg {message.id}: {e}")
-                total_skipped += 1
-                await status_message.edit(
-                    f"❌ **Failed - Skipping**\n"
-                    f"Error: `{str(e)[:30]}...`\n"
-                    f"Progress: {idx}/{len(messages)}",
-                    buttons=get_progress_keyboard()
-                )
-                await asyncio.sleep(1)
-            
-            finally:
-                # CRITICAL: Always close stream
-                if stream_file:
-                    try:
-                        await stream_file.close()
-                    except:
-                        pass
-            
-            total_processed += 1
-            
-            # Memory management: Small pause every 3 files
-            if total_processed % 3 == 0:
-                await asyncio.sleep(1)
-
-        # Final summary
-        if config.is_running or config.stop_flag:
-            overall_time = time.time() - overall_start
-            avg_speed = total_size / overall_time / (1024*1024) if overall_time > 0 else 0
-            
-            await status_message.edit(
-                f"🏁 **Transfer Complete!**\n"
-                f"━━━━━━━━━━━━━━━━━━━━\n"
-                f"✅ Success: `{total_success}`\n"
-                f"⏭️ Skipped: `{total_skipped}`\n"
-                f"📦 Total Size: `{human_readable_size(total_size)}`\n"
-                f"⚡ Avg Speed: `{avg_speed:.1f} MB/s`\n"
-                f"⏱️ Time: `{time_formatter(overall_time)}`"
-            )
+            # The thumbnail downloads while earlier files are still in flight
+            thumb_task = thumbs.prefetch(message)
+
+            while len(pending) >= window:
+                await post_next()
+
+            pending.append((idx, message, asyncio.create_task(prepare_message(
+                message, source_id, thumb_task, user_client, bot_client, settings, reporter, copy_state
+            ))))
+
+        while pending and not job.stop_requested:
+            await post_next()
+
+        if not job.stop_requested:
+            outcome = 'done'
+            tuner.record_transfer(stats['size'], time.time() - overall_start)
+
+        await reporter.finish(summary())
+
+    except asyncio.CancelledError:
+        # /stop cancels the job mid-file; anything else is a real cancel
+        if not job.stop_requested:
+            raise
+        await reporter.finish(summary())
 
     except Exception as e:
-        await status_message.edit(f"💥 **Critical Error:**\n`{str(e)[:100]}`")
+        await reporter.finish(f"💥 **Critical Error:**\n`{str(e)[:100]}`")
         config.logger.error(f"Transfer crashed: {e}", exc_info=True)
-    
+
     finally:
-        config.is_running = False
-        config.stop_flag = False
-        config.status_message = None
+        reporter.stop()
+        tracing.finish(trace)
+
+        # A crash leaves the session 'running' so it resumes at startup
+        if outcome is None and job.stop_requested:
+            outcome = 'stopped'
+        if outcome:
+            journal.finish(session_id, outcome)
+
+        # Abandon files that were still in flight when stopped
+        for _, _, task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*(task for _, _, task in pending), return_exceptions=True)
+        # Only once no prepare can start another thumbnail fetch
+        await thumbs.close()
+
         if session_id in config.active_sessions:
             del config.active_sessions[session_id]
         config.logger.info("✅ Transfer process cleanup complete")
@@ -0,0 +1,165 @@
+import time
+from collections import deque
+import config
+from utils import human_readable_size, current_rss
+
+# Telegram protocol limits
+MIN_REQUEST_SIZE = 4 * 1024  # GetFile limit must be a multiple of 4KB...
+MAX_REQUEST_SIZE = 512 * 1024  # ...at most 512KB, and divide 1MB
+MIN_PART_KB = 8
+MAX_PART_KB = 512  # Upload parts must divide 512KB
+MAX_UPLOAD_PARTS = 4000  # Parts per file (2GB at 512KB)
+
+def _pow2_at_least(n, lowest, highest):
+    size = lowest
+    while size < n and size < highest:
+        size *= 2
+    return size
+
+class AutoTuner:
+    """
+    Adjusts download concurrency, the in-flight byte budget and upload
+    concurrency between files, based on how each finished file behaved:
+    whether the uploader was starved (download-bound) or never waited
+    (upload-bound), whether either side hit FloodWait, and how close RSS
+    is to MEMORY_CEILING_BYTES. The side left idle drifts back to its
+    configured worker count; FloodWait and RSS pressure cut further.
+    Request and part sizes are derived per file and always kept within
+    Telegram's limits.
+    """
+    def __init__(self):
+        self.download_workers = config.DOWNLOAD_WORKERS
+        self.upload_workers = config.UPLOAD_WORKERS
+        self.inflight_bytes = config.DOWNLOAD_INFLIGHT_BYTES
+
+        self.download_speed = 0
+        self.upload_speed = 0
+        self.transfer_speed = 0  # Whole transfers, every file in flight together
+        self.rss = 0
+        self.files = 0
+        self.reasons = deque(maxlen=5)
+
+        # Last sizes handed out, for describe()
+        self.last_request_size = MAX_REQUEST_SIZE
+        self.last_part_kb = MAX_PART_KB
+
+    def request_size(self, file_size):
+        """GetFile request size: 512KB, or the smallest valid size for tiny files"""
+        self.last_request_size = _pow2_at_least(file_size, MIN_REQUEST_SIZE, MAX_REQUEST_SIZE)
+        return self.last_request_size
+
+    def part_size_kb(self, file_size):
+        """
+        Upload part size giving every upload worker a few parts to send,
+        but never so small that the file needs more than MAX_UPLOAD_PARTS
+        """
+        busy = file_size / (self.upload_workers * 4) / 1024
+        needed = file_size / MAX_UPLOAD_PARTS / 1024
+        self.last_part_kb = _pow2_at_least(max(busy, needed), MIN_PART_KB, MAX_PART_KB)
+        return self.last_part_kb
+
+    def _note(self, reason):
+        self.reasons.append(f"{time.strftime('%H:%M:%S')} {reason}")
+        config.logger.info(f"🎛️ Tuner: {reason}")
+
+    def record(self, stream, elapsed, upload_floods=0):
+        """
+        Learn from a finished file's stream and total transfer time;
+        `upload_floods` is how many FloodWaits its upload hit
+        """
+        if not config.TUNER_ENABLED:
+            return
+
+        size = stream.current_bytes
+        # Tiny files say nothing about sustained throughput
+        if elapsed <= 0 or size < config.TUNER_MIN_SAMPLE_BYTES:
+            return
+
+        download_time = (stream.download_done or time.time()) - stream.start_time
+        if download_time > 0:
+            self._smooth('download_speed', size / download_time)
+        self._smooth('upload_speed', size / elapsed)
+        self.rss = current_rss()
+        self.files += 1
+
+        # Share of the transfer the uploader spent waiting for data
+        starved = stream.read_wait / elapsed
+        self._adjust(starved, stream.floods, upload_floods)
+
+    def record_transfer(self, size, elapsed):
+        """Learn the overall speed of a finished transfer, for plan ETAs"""
+        if elapsed > 0 and size >= config.TUNER_MIN_SAMPLE_BYTES:
+            self._smooth('transfer_speed', size / elapsed)
+
+    def _smooth(self, name, value):
+        old = getattr(self, name)
+        setattr(self, name, value if not old else old * 0.7 + value * 0.3)
+
+    def _adjust(self, starved, download_floods=0, upload_floods=0):
+        ceiling = config.MEMORY_CEILING_BYTES
+        floor = MAX_REQUEST_SIZE * max(1, self.download_workers) * 2
+
+        # Telegram is pushing back: fewer requests in flight on that side,
+        # and no growth from this sample
+        if download_floods or upload_floods:
+            if download_floods and self.download_workers > 1:
+                self.download_workers -= 1
+                self._note(f"download FloodWait ×{download_floods} → {self.download_workers} download workers")
+            if upload_floods and self.upload_workers > 1:
+                self.upload_workers -= 1
+                self._note(f"upload FloodWait ×{upload_floods} → {self.upload_workers} upload workers")
+
+        elif self.rss > ceiling * 0.85:
+            if self.inflight_bytes > floor:
+                self.inflight_bytes = max(floor, self.inflight_bytes // 2)
+                self._note(
+                    f"RSS {human_readable_size(self.rss)} near ceiling → "
+                    f"buffer {human_readable_size(self.inflight_bytes)}"
+                )
+            elif self.upload_workers > 1:
+                self.upload_workers -= 1
+                self._note(f"RSS {human_readable_size(self.rss)} near ceiling → {self.upload_workers} upload workers")
+            elif self.download_workers > 1:
+                self.download_workers -= 1
+                self._note(f"RSS {human_readable_size(self.rss)} near ceiling → {self.download_workers} download workers")
+
+        elif starved > 0.3:
+            if self.download_workers < config.TUNER_MAX_WORKERS:
+                self.download_workers += 1
+                self._note(f"download-bound ({starved:.0%} waiting) → {self.download_workers} download workers")
+            elif self.rss < ceiling * 0.6 and self.inflight_bytes * 2 <= ceiling // 4:
+                self.inflight_bytes *= 2
+                self._note(f"download-bound, RAM free → buffer {human_readable_size(self.inflight_bytes)}")
+            # Upload workers sit idle waiting for data
+            if self.upload_workers > config.UPLOAD_WORKERS:
+                self.upload_workers -= 1
+                self._note(f"uploader starved → {self.upload_workers} upload workers")
+
+        elif starved < 0.05:
+            if self.upload_workers < config.TUNER_MAX_WORKERS:
+                self.upload_workers += 1
+                self._note(f"upload-bound ({starved:.0%} waiting) → {self.upload_workers} upload workers")
+            # Downloads finish early and wait on the uploader
+            if self.download_workers > config.DOWNLOAD_WORKERS:
+                self.download_workers -= 1
+                self._note(f"downloads idle → {self.download_workers} download workers")
+
+    def describe(self):
+        """Current settings and the latest decisions, for /stats"""
+        text = (
+            f"⬇️ Download: **{self.download_workers}** workers × "
+            f"**{human_readable_size(self.last_request_size)}** requests\n"
+            f"💾 Buffer: **{human_readable_size(self.inflight_bytes)}** per file\n"
+            f"⬆️ Upload: **{self.upload_workers}** parts in flight "
+            f"× **{self.last_part_kb}KB** (sized per file)\n"
+            f"📈 Speeds: ⬇️ `{human_readable_size(self.download_speed)}/s` "
+            f"⬆️ `{human_readable_size(self.upload_speed)}/s` "
+            f"🚚 `{human_readable_size(self.transfer_speed)}/s`\n"
+            f"🧠 RSS: `{human_readable_size(current_rss())}` / "
+            f"`{human_readable_size(config.MEMORY_CEILING_BYTES)}`"
+        )
+        if self.reasons:
+            text += "\n🎛️ **Tuning:**\n" + "\n".join(f"• `{r}`" for r in self.reasons)
+        return text
+
+tuner = AutoTuner()
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import time
+from telethon import errors, helpers
+from telethon.tl import functions, types
+from telethon.tl.custom import InputSizedFile
+import config
+from utils import human_readable_size
+from tuner import tuner
+from metrics import metrics
+from bots import bot_pool
+import tracing
+
+class ParallelUploader:
+    """
+    Uploads a stream as SaveFilePart/SaveBigFilePart requests with
+    several parts in flight at once. Parts are read in order from the
+    stream, sent concurrently and retried individually. Acknowledged parts
+    are remembered, so when the stream breaks or a part fails for good
+    the upload resumes from the first missing part, with the stream
+    re-seeked there. The result is an InputFile/InputFileBig that can be
+    passed straight to send_file.
+    """
+    def __init__(self, client, stream, file_size, file_name):
+        self.client = client
+        self.stream = stream
+        self.file_size = file_size
+        self.file_name = file_name
+
+        self.part_size = tuner.part_size_kb(file_size) * 1024
+        self.part_count = max(1, (file_size + self.part_size - 1) // self.part_size)
+        self.workers = max(1, tuner.upload_workers)
+
+        # Telegram distinguishes small and big files at 10MB
+        self.is_big = file_size > 10 * 1024 * 1024
+        self.file_id = helpers.generate_random_long()
+        self.hash_md5 = hashlib.md5()
+        self.acked = set()  # Parts the server has confirmed
+        self.floods = 0  # FloodWaits hit by this upload
+
+    def _make_request(self, index, part):
+        if self.is_big:
+            return functions.upload.SaveBigFilePartRequest(
+                self.file_id, index, self.part_count, part)
+        return functions.upload.SaveFilePartRequest(self.file_id, index, part)
+
+    async def _send_part(self, index, part):
+        """Send one part, retrying it alone on failure"""
+        attempt = 0
+        while True:
+            try:
+                with tracing.span('part', overlap=True, index=index, attempt=attempt):
+                    ok = await self.client(self._make_request(index, part))
+                if ok:
+                    self.acked.add(index)
+                    metrics.bytes_uploaded.inc(len(part))
+                    return
+                raise RuntimeError(f"Server rejected part {index}")
+
+            except errors.FloodWaitError as e:
+                config.logger.warning(f"⏳ Part {index} FloodWait {e.seconds}s")
+                metrics.floodwait(e.seconds, 'upload_part')
+                self.floods += 1
+                bot_pool.flood(self.client, e.seconds)
+                await asyncio.sleep(e.seconds)
+
+            except Exception as e:
+                attempt += 1
+                if attempt >= config.MAX_RETRIES:
+                    raise
+                config.logger.warning(f"🔁 Part {index} retry {attempt}: {e}")
+                metrics.retries.inc(where='upload_part')
+                await asyncio.sleep(attempt)
+
+    def _first_missing(self):
+        for index in range(self.part_count):
+            if index not in self.acked:
+                return index
+        return self.part_count
+
+    async def _upload_parts(self, first):
+        """Read parts `first`.. from the stream and send the unacknowledged ones"""
+        slots = asyncio.Semaphore(self.workers)
+        pending = set()
+
+        try:
+            for index in range(first, self.part_count):
+                await slots.acquire()
+
+                # Stop reading as soon as any part has failed for good
+                for task in [t for t in pending if t.done()]:
+                    pending.discard(task)
+                    task.result()
+
+                part = await self.stream.read(self.part_size)
+                if len(part) != self.part_size and index < self.part_count - 1:
+                    raise ValueError(
+                        f"Stream ended early at part {index}/{self.part_count}"
+                    )
+                if not part:
+                    raise ValueError("Stream returned no data")
+
+                if not self.is_big:
+                    self.hash_md5.update(part)
+
+                if index in self.acked:
+                    slots.release()
+                    continue
+
+                task = asyncio.create_task(self._send_part(index, part))
+                task.add_done_callback(lambda _: slots.release())
+                pending.add(task)
+
+            await asyncio.gather(*pending)
+
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+    async def upload(self):
+        """Upload every part and return the resulting InputFile"""
+        config.logger.info(
+            f"📤 Uploading {self.file_name}: {self.part_count} parts of "
+            f"{human_readable_size(self.part_size)} × {self.workers} in flight"
+        )
+
+        started = time.monotonic()
+        first = 0
+        resumes = 0
+        while True:
+            try:
+                await self._upload_parts(first)
+                break
+
+            except Exception as e:
+                resumes += 1
+                if resumes >= config.MAX_RETRIES or not hasattr(self.stream, 'seek'):
+                    raise
+
+                # Small files are sent with an MD5 of the whole content,
+                # so they are read again from the start
+                first = self._first_missing() if self.is_big else 0
+                if not self.is_big:
+                    self.hash_md5 = hashlib.md5()
+                config.logger.warning(
+                    f"🔁 Resuming {self.file_name} at part {first}/{self.part_count} "
+                    f"({len(self.acked)} acknowledged): {e}"
+                )
+                metrics.retries.inc(where='upload_resume')
+                await self.stream.seek(first * self.part_size)
+
+        metrics.stage.observe(time.monotonic() - started, stage='upload')
+        if self.is_big:
+            return types.InputFileBig(self.file_id, self.part_count, self.file_name)
+        return InputSizedFile(
+            self.file_id, self.part_count, self.file_name,
+            md5=self.hash_md5, size=self.file_size
+        )
@@ -1,6 +1,7 @@
 import os
 import mimetypes
 from telethon.tl.types import MessageMediaWebPage
+from rules import compile_rules, session_rules
 
 def human_readable_size(size):
     """Convert bytes to human readable format"""
@@ -18,6 +19,20 @@ def time_formatter(seconds):
     if hours > 0: return f"{hours}h {minutes}m {seconds}s"
     return f"{minutes}m {seconds}s"
 
+def current_rss():
+    """Resident memory of this process in bytes (0 if unknown)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak rather than current, but the best available off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
 def get_target_info(message):
     """
     Smart format detection and conversion
@@ -72,18 +87,11 @@ def get_target_info(message):
     return final_name, target_mime, force_video
 
 def apply_filename_manipulations(filename, settings):
-    """Apply find/replace operations on filename"""
+    """Apply the session's filename rules in one pass"""
     if not settings:
         return filename
     
-    # Find and Replace in filename
-    if settings.get('find_name') and settings.get('replace_name'):
-        filename = filename.replace(
-            settings['find_name'], 
-            settings['replace_name']
-        )
-    
-    return filename
+    return compile_rules(session_rules(settings, 'name')).apply(filename)
 
 def apply_caption_manipulations(original_caption, settings):
     """Apply caption manipulations"""
@@ -92,12 +100,8 @@ def apply_caption_manipulations(original_caption, settings):
     
     caption = original_caption or ""
     
-    # Find and Replace in caption
-    if settings.get('find_cap') and settings.get('replace_cap'):
-        caption = caption.replace(
-            settings['find_cap'], 
-            settings['replace_cap']
-        )
+    # Caption rules, all applied in one pass
+    caption = compile_rules(session_rules(settings, 'cap')).apply(caption)
     
     # Add extra caption
     if settings.get('extra_cap'):
@@ -108,9 +112,9 @@ def apply_caption_manipulations(original_caption, settings):
     
     return caption
 
+# Characters not allowed in filenames, all mapped to '_'
+_INVALID_FILENAME_CHARS = str.maketrans({char: '_' for char in '<>:"/\\|?*'})
+
 def sanitize_filename(filename):
     """Remove invalid characters from filename"""
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        filename = filename.replace(char, '_')
-    return filename
+    return filename.translate(_INVALID_FILENAME_CHARS)